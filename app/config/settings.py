@@ -159,6 +159,32 @@ CORS_ALLOW_CREDENTIALS = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Хранилище чанков и записей (services/storage.py): 'local' (MEDIA_ROOT) или 's3' (S3/MinIO, нужен boto3).
+# Ключи доступа boto3 берет из стандартных AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+STORAGE_S3_BUCKET = os.environ.get('STORAGE_S3_BUCKET', '')
+STORAGE_S3_PREFIX = os.environ.get('STORAGE_S3_PREFIX', '')
+STORAGE_S3_ENDPOINT_URL = os.environ.get('STORAGE_S3_ENDPOINT_URL', '')  # e.g. http://minio:9000
+STORAGE_S3_REGION = os.environ.get('STORAGE_S3_REGION', '')
+STORAGE_S3_PART_SIZE_MB = int(os.environ.get('STORAGE_S3_PART_SIZE_MB', 8))  # multipart part size, >= 5
+
+# Архивация готовых записей: 'flac' (без потерь), 'opus' или '' (оставить WAV)
+AUDIO_ARCHIVE_FORMAT = os.environ.get('AUDIO_ARCHIVE_FORMAT', 'flac')
+AUDIO_ARCHIVE_OPUS_BITRATE = os.environ.get('AUDIO_ARCHIVE_OPUS_BITRATE', '64k')
+
+# Playback: '' - Django отдает файл сам (sendfile через wsgi.file_wrapper),
+# 'x-accel' - nginx (X-Accel-Redirect), 'x-sendfile' - Apache/lighttpd
+RECORDINGS_SENDFILE_MODE = os.environ.get('RECORDINGS_SENDFILE_MODE', '')
+RECORDINGS_ACCEL_PREFIX = os.environ.get('RECORDINGS_ACCEL_PREFIX', '/protected-media/')
+
+# Audio ingest: метаданные чанков пишутся в БД пачками
+AUDIO_CHUNK_FLUSH_SIZE = int(os.environ.get('AUDIO_CHUNK_FLUSH_SIZE', 10))
+AUDIO_CHUNK_FLUSH_INTERVAL = float(os.environ.get('AUDIO_CHUNK_FLUSH_INTERVAL', 5.0))  # seconds
+# Пакетная загрузка чанков по HTTP (POST /api/upload-chunks): предел одного кадра
+AUDIO_UPLOAD_MAX_CHUNK_SIZE = int(os.environ.get('AUDIO_UPLOAD_MAX_CHUNK_SIZE', 16 * 1024 * 1024))  # bytes
+# Сколько ждать переподключения после обрыва WebSocket, прежде чем отправить запись в обработку
+SESSION_RESUME_GRACE = int(os.environ.get('SESSION_RESUME_GRACE', 120))  # seconds
+
 # CSRF exemption for extension
 CSRF_TRUSTED_ORIGINS = ['chrome-extension://*']
 
@@ -172,9 +198,83 @@ CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes max for ML tasks
 
+# Обслуживание MEDIA_ROOT (services/janitor.py), интервалы в секундах, квоты в MB (0 - без квоты)
+MEDIA_SWEEP_INTERVAL = int(os.environ.get('MEDIA_SWEEP_INTERVAL', 60 * 60))
+MEDIA_ORPHAN_GRACE = int(os.environ.get('MEDIA_ORPHAN_GRACE', 6 * 60 * 60))  # files without a Session row
+MEDIA_ABANDONED_AFTER = int(os.environ.get('MEDIA_ABANDONED_AFTER', 6 * 60 * 60))  # 'active' without new chunks
+MEDIA_FAILED_RETENTION = int(os.environ.get('MEDIA_FAILED_RETENTION', 7 * 24 * 60 * 60))  # chunks of failed sessions
+MEDIA_ORPHAN_RECORDING_GRACE = int(os.environ.get('MEDIA_ORPHAN_RECORDING_GRACE', 7 * 24 * 60 * 60))
+MEDIA_TENANT_QUOTA_MB = int(os.environ.get('MEDIA_TENANT_QUOTA_MB', 0))  # per Session.ip_address
+MEDIA_GLOBAL_QUOTA_MB = int(os.environ.get('MEDIA_GLOBAL_QUOTA_MB', 0))
+
+# Range-партиционирование recordings_audiochunk / recordings_utterance по месяцам (services/partitioning.py, только Postgres)
+DB_PARTITIONING = os.environ.get('DB_PARTITIONING', 'False') == 'True'
+PARTITION_PREMAKE_MONTHS = int(os.environ.get('PARTITION_PREMAKE_MONTHS', 3))
+PARTITION_MAINTENANCE_INTERVAL = int(os.environ.get('PARTITION_MAINTENANCE_INTERVAL', 24 * 3600))  # seconds
+AUDIO_CHUNK_RETENTION_MONTHS = int(os.environ.get('AUDIO_CHUNK_RETENTION_MONTHS', 2))  # 0 = keep forever
+UTTERANCE_RETENTION_MONTHS = int(os.environ.get('UTTERANCE_RETENTION_MONTHS', 0))  # 0 = keep forever
+
+# Периодические задачи (celery beat)
+CELERY_BEAT_SCHEDULE = {
+    'sweep-media': {
+        'task': 'app.recordings.tasks.janitor.sweep_media_task',
+        'schedule': MEDIA_SWEEP_INTERVAL,
+    },
+    'maintain-partitions': {
+        'task': 'app.recordings.tasks.janitor.maintain_partitions_task',
+        'schedule': PARTITION_MAINTENANCE_INTERVAL,
+    },
+}
+
+# Cross-session speaker matching (services/speakers.py)
+SPEAKER_MATCH_THRESHOLD = float(os.environ.get('SPEAKER_MATCH_THRESHOLD', 0.6))  # cosine similarity
+SPEAKER_MIN_SPEECH = float(os.environ.get('SPEAKER_MIN_SPEECH', 3.0))  # seconds of speech to register a speaker
+
+# Adaptive time limits for process_audio_task (services/scheduling.py)
+PROCESSING_QUEUE = os.environ.get('PROCESSING_QUEUE', 'celery')
+PROCESSING_LONG_QUEUE = os.environ.get('PROCESSING_LONG_QUEUE', 'processing_long')
+PROCESSING_DEFAULT_RTF = float(os.environ.get('PROCESSING_DEFAULT_RTF', 1.0))  # until measured
+PROCESSING_OVERHEAD = int(os.environ.get('PROCESSING_OVERHEAD', 120))  # seconds: model load, concatenation
+PROCESSING_TIME_LIMIT_MARGIN = float(os.environ.get('PROCESSING_TIME_LIMIT_MARGIN', 1.5))
+PROCESSING_MIN_TIME_LIMIT = int(os.environ.get('PROCESSING_MIN_TIME_LIMIT', 5 * 60))
+PROCESSING_HARD_LIMIT_GRACE = int(os.environ.get('PROCESSING_HARD_LIMIT_GRACE', 60))
+PROCESSING_MAX_TIME_LIMIT = CELERY_TASK_TIME_LIMIT  # capacity of the regular queue
+PROCESSING_LONG_MAX_TIME_LIMIT = int(os.environ.get('PROCESSING_LONG_MAX_TIME_LIMIT', 6 * 60 * 60))
+
+# Whisper: прогноз по RTF проверяется после стольких 30-секундных окон
+WHISPER_PROGRESS_MIN_WINDOWS = int(os.environ.get('WHISPER_PROGRESS_MIN_WINDOWS', 2))
+
+# Язык распознавания: определяется по первым 30 секундам речи (services/language.py)
+WHISPER_DEFAULT_LANGUAGE = os.environ.get('WHISPER_DEFAULT_LANGUAGE', 'ru')
+LANGUAGE_DETECTION_MIN_PROBABILITY = float(os.environ.get('LANGUAGE_DETECTION_MIN_PROBABILITY', 0.5))
+LANGUAGE_DETECTION_SCAN_SECONDS = int(os.environ.get('LANGUAGE_DETECTION_SCAN_SECONDS', 300))  # where to look for speech
+
+# Локальный реестр моделей (manage.py build_model_registry): воркер стартует без HuggingFace Hub.
+# MODEL_REGISTRY_VERSION пустой — берется версия из <MODEL_REGISTRY_DIR>/CURRENT
+MODEL_REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR', str(BASE_DIR / 'models'))
+MODEL_REGISTRY_VERSION = os.environ.get('MODEL_REGISTRY_VERSION', '')
+MODEL_REGISTRY_VERIFY = os.environ.get('MODEL_REGISTRY_VERIFY', 'False') == 'True'  # sha256 at worker start
+
+# Бюджет холодного старта web/ASGI-процессов (manage.py check_import_budget)
+STARTUP_IMPORT_BUDGET_MS = float(os.environ.get('STARTUP_IMPORT_BUDGET_MS', 1500))
+STARTUP_RSS_BUDGET_MB = float(os.environ.get('STARTUP_RSS_BUDGET_MB', 150))
+
 # Redis Configuration
 REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
 
+# Cache (общий для всех процессов: экспорты транскриптов и т.п.)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'sonar',
+    },
+}
+
+# Экспорт транскриптов (SRT/VTT/TXT/DOCX): кешируются по версии транскрипта
+TRANSCRIPT_EXPORT_CACHE_TIMEOUT = int(os.environ.get('TRANSCRIPT_EXPORT_CACHE_TIMEOUT', 24 * 60 * 60))
+TRANSCRIPT_EXPORT_CACHE_MAX_BYTES = int(os.environ.get('TRANSCRIPT_EXPORT_CACHE_MAX_BYTES', 5 * 1024 * 1024))
+
 # Logging Configuration
 LOGGING = {
     'version': 1,
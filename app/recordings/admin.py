@@ -1,9 +1,42 @@
+import uuid
+
 from django.contrib import admin
-from .models import Session, AudioChunk, Transcript, Utterance
+from django.db.models import Q
+
+from app.core.utils.pagination import EstimatedCountPaginator
+from .models import Session, AudioChunk, Speaker, Transcript, Utterance
+from .services.search import filter_utterances
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    # Без COUNT(*) по всей таблице: оценка из статистики Postgres, без "N всего" при фильтрах
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+def parse_uuid(value):
+    try:
+        return uuid.UUID(value.strip())
+    except ValueError:
+        return None
+
+
+class SessionSearchAdmin(LargeTableAdmin):
+    # Поиск по UUID сессии: session_id = <uuid> по индексу, без приведения
+    # колонки к тексту (ILIKE/UPPER — полный проход); не-UUID ничего не находит
+    search_fields = ('=session__id',)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        session_id = parse_uuid(search_term)
+        if session_id is None:
+            return queryset.none(), False
+        return queryset.filter(session_id=session_id), False
 
 
 @admin.register(Session)
-class SessionAdmin(admin.ModelAdmin):
+class SessionAdmin(LargeTableAdmin):
     list_display = ('id', 'started_at', 'status', 'total_chunks', 'tab_title', 'tab_url_short')
     list_filter = ('status', 'started_at')
     search_fields = ('id', 'tab_url', 'tab_title', 'ip_address')
@@ -17,13 +50,16 @@ class SessionAdmin(admin.ModelAdmin):
             'fields': ('tab_url', 'tab_title', 'tab_favicon', 'browser_info')
         }),
         ('Запись', {
-            'fields': ('total_chunks', 'total_duration', 'audio_file', 'file_size')
+            'fields': ('total_chunks', 'total_duration', 'total_bytes', 'sample_rate', 'channels', 'audio_file', 'file_size')
         }),
         ('Служебная информация', {
             'fields': ('user_agent', 'ip_address')
         }),
         ('Обработка', {
-            'fields': ('processing_started_at', 'processing_completed_at', 'processing_error')
+            'fields': (
+                'processing_started_at', 'processing_completed_at', 'processing_error',
+                'language', 'language_probability', 'num_speakers', 'min_speakers', 'max_speakers'
+            )
         }),
     )
 
@@ -35,25 +71,62 @@ class SessionAdmin(admin.ModelAdmin):
 
 
 @admin.register(AudioChunk)
-class AudioChunkAdmin(admin.ModelAdmin):
+class AudioChunkAdmin(SessionSearchAdmin):
     list_display = ('id', 'session', 'chunk_number', 'chunk_size', 'received_at')
     list_filter = ('received_at',)
-    search_fields = ('session__id',)
+    list_select_related = ('session',)
+    raw_id_fields = ('session',)
+    # Совпадает с индексом по received_at
+    ordering = ('-received_at',)
+
+
+@admin.register(Speaker)
+class SpeakerAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'total_sessions', 'total_speech', 'updated_at')
+    search_fields = ('name',)
+    readonly_fields = ('id', 'embedding_dim', 'total_sessions', 'total_speech', 'created_at', 'updated_at')
+    exclude = ('embedding',)
 
 
 @admin.register(Transcript)
-class TranscriptAdmin(admin.ModelAdmin):
+class TranscriptAdmin(SessionSearchAdmin):
     list_display = ('id', 'session', 'language', 'total_speakers', 'total_utterances', 'created_at')
     list_filter = ('language', 'created_at')
-    search_fields = ('session__id', 'full_text')
+    list_select_related = ('session',)
     readonly_fields = ('created_at',)
+    raw_id_fields = ('session',)
+    ordering = ('-created_at',)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        # Текст ищем через полнотекстовый индекс реплик вместо ILIKE по full_text;
+        # условия добавляются к queryset, чтобы не терять фильтры списка
+        matching = filter_utterances(Utterance.objects.all(), search_term).values('transcript_id')
+        condition = Q(id__in=matching)
+        session_id = parse_uuid(search_term)
+        if session_id is not None:
+            condition |= Q(session_id=session_id)
+        return queryset.filter(condition), False
 
 
 @admin.register(Utterance)
-class UtteranceAdmin(admin.ModelAdmin):
+class UtteranceAdmin(LargeTableAdmin):
     list_display = ('id', 'transcript', 'speaker', 'text_short', 'start_time', 'end_time', 'confidence')
-    list_filter = ('speaker',)
-    search_fields = ('text', 'speaker')
+    # Фильтр по speaker убран: варианты строились SELECT DISTINCT по всей таблице,
+    # точный поиск по спикеру доступен через search (=speaker)
+    list_select_related = ('transcript',)
+    search_fields = ('=speaker',)
+    raw_id_fields = ('transcript', 'global_speaker')
+    # Совпадает с индексом (transcript, sequence_number)
+    ordering = ('transcript', 'sequence_number')
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        # Точный спикер или полнотекстовый индекс вместо ILIKE '%...%' по text
+        matching = filter_utterances(self.model.objects.all(), search_term).values('id')
+        return queryset.filter(Q(speaker=search_term.strip()) | Q(id__in=matching)), False
 
     def text_short(self, obj):
         return obj.text[:100] + '...' if len(obj.text) > 100 else obj.text
@@ -1,264 +1,260 @@
 import os
 import uuid
-import subprocess
+import base64
 import logging
 from datetime import datetime
-from pathlib import Path
 from typing import Optional
 
 from django.conf import settings
-from django.http import FileResponse, HttpResponse, JsonResponse
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
 from ninja import Router, File, Form
 from ninja.files import UploadedFile
 
+from app.recordings.api.streaming import range_response
+from app.recordings.models import Session, Transcript
+from app.recordings.services.chunks import store_chunk, store_chunk_batch
+from app.recordings.services.frames import iter_frames
+from app.recordings.services.janitor import purge_session
+from app.recordings.services.sessions import create_session, finish_recording
+from app.recordings.services.storage import get_storage, recording_filename, recording_key
+
 logger = logging.getLogger(__name__)
 
 router = Router()
 
-# Store active recording sessions
-active_recordings = {}
+AUDIO_CONTENT_TYPES = {
+    '.wav': 'audio/wav',
+    '.flac': 'audio/flac',
+    '.opus': 'audio/ogg; codecs=opus',
+    '.ogg': 'audio/ogg',
+    '.mp3': 'audio/mpeg',
+    '.webm': 'audio/webm',
+}
 
+# REST recording path: state lives in Session/AudioChunk rows and the storage
+# backend, so start/upload/stop may land on any worker process or node
 
-@router.post("/start-recording")
-def start_recording(request):
-    session_id = str(uuid.uuid4())
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"recording_{timestamp}_{session_id[:8]}.wav"
 
-    # Create directory for this session's chunks
-    chunks_dir = os.path.join(settings.MEDIA_ROOT, "chunks", session_id)
-    os.makedirs(chunks_dir, exist_ok=True)
+def get_active_session(session_id):
+    try:
+        session_id = uuid.UUID(session_id)
+    except ValueError:
+        return None
+    return Session.objects.filter(pk=session_id, status='active').first()
 
-    # Final file location
-    filepath = os.path.join(settings.MEDIA_ROOT, "recordings", filename)
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
 
-    active_recordings[session_id] = {
-        'filepath': filepath,
-        'filename': filename,
-        'chunks_dir': chunks_dir,
-        'chunk_count': 0,
-        'started_at': datetime.now().isoformat()
-    }
+@router.post("/start-recording")
+def start_recording(request):
+    session = create_session()
 
     return {
-        'session_id': session_id,
-        'filename': filename,
+        'session_id': str(session.id),
+        'filename': recording_filename(session),
         'status': 'started'
     }
 
 
 @router.post("/upload-chunk/{session_id}")
 def upload_chunk(request, session_id: str, chunk: UploadedFile = File(...), chunk_number: int = Form(...)):
-    if session_id not in active_recordings:
+    session = get_active_session(session_id)
+    if session is None:
         return JsonResponse({'error': 'Invalid session_id'}, status=404)
 
-    recording_info = active_recordings[session_id]
-    chunks_dir = recording_info['chunks_dir']
+    audio_data = b''.join(chunk.chunks())
+    audio_chunk, created = store_chunk(session, chunk_number, audio_data)
 
-    # Save chunk with zero-padded number for proper sorting
-    chunk_filename = f"chunk_{chunk_number:04d}.wav"
-    chunk_filepath = os.path.join(chunks_dir, chunk_filename)
+    logger.debug(f"WAV Chunk {chunk_number} {'saved' if created else 'already stored'}: {len(audio_data)} bytes")
 
-    # Write chunk to file
-    with open(chunk_filepath, 'wb') as f:
-        for chunk_data in chunk.chunks():
-            f.write(chunk_data)
+    return {
+        'status': 'chunk_received',
+        'session_id': session_id,
+        'chunk_number': chunk_number,
+        'duplicate': not created
+    }
 
-    # Update chunk count
-    recording_info['chunk_count'] = max(recording_info['chunk_count'], chunk_number)
 
-    logger.debug(f"WAV Chunk {chunk_number} saved: {chunk_filename} ({os.path.getsize(chunk_filepath)} bytes)")
+@router.post("/upload-chunks/{session_id}")
+def upload_chunks(request, session_id: str):
+    """
+    Batch upload: the raw body is a stream of frames
+    (uint32 LE chunk_number, uint32 LE length, WAV bytes), see services/frames.py.
+    Frames are parsed as the body arrives and appended to one file.
+    """
+    session = get_active_session(session_id)
+    if session is None:
+        return JsonResponse({'error': 'Invalid session_id'}, status=404)
 
-    return {
-        'status': 'chunk_received',
+    frames = iter_frames(request, settings.AUDIO_UPLOAD_MAX_CHUNK_SIZE)
+    acks, error = store_chunk_batch(session, frames)
+
+    logger.debug(f"Batch for {session_id}: {len(acks)} chunks acked{f', stopped at: {error}' if error else ''}")
+
+    payload = {
+        'status': 'chunks_received' if error is None else 'partial',
         'session_id': session_id,
-        'chunk_number': chunk_number
+        'acks': acks,
     }
+    if error is not None:
+        # Chunks acked before the broken frame are stored; the client resends the rest
+        payload['error'] = error
+        return JsonResponse(payload, status=400)
+
+    return payload
 
 
 @router.post("/stop-recording/{session_id}")
 def stop_recording(request, session_id: str):
-    if session_id not in active_recordings:
+    session = get_active_session(session_id)
+    if session is None:
         return JsonResponse({'error': 'Invalid session_id'}, status=404)
 
-    recording_info = active_recordings.pop(session_id)
-    chunks_dir = recording_info['chunks_dir']
-    final_file = recording_info['filepath']
-    chunk_count = recording_info['chunk_count']
-
-    logger.info(f"Stopping recording, concatenating {chunk_count} WAV chunks...")
+    # Same Celery pipeline as the WebSocket path: concatenation happens in process_audio_task
+    if not finish_recording(session.id, session.resume_count, statuses=('active',)):
+        return JsonResponse({'error': 'Recording is already stopped'}, status=409)
 
-    try:
-        # Get all chunk files sorted by number
-        chunk_files = sorted([
-            os.path.join(chunks_dir, f)
-            for f in os.listdir(chunks_dir)
-            if f.startswith('chunk_') and f.endswith('.wav')
-        ])
-
-        if not chunk_files:
-            logger.warning("No chunks found, creating empty file")
-            open(final_file, 'wb').close()
-        elif len(chunk_files) == 1:
-            # Only one chunk, just copy it
-            logger.info("Only one chunk, copying directly...")
-            import shutil
-            shutil.copy2(chunk_files[0], final_file)
-        else:
-            # Multiple chunks - concatenate WAV files
-            logger.info(f"Concatenating {len(chunk_files)} WAV chunks...")
-            concatenate_wav_files(chunk_files, final_file)
-            logger.info(f"Successfully concatenated {len(chunk_files)} WAV chunks")
-
-        # Cleanup chunks directory
-        import shutil
-        shutil.rmtree(chunks_dir)
-        logger.info(f"Cleaned up chunks directory")
-
-    except Exception as e:
-        logger.error(f"Error processing chunks: {str(e)}", exc_info=True)
-        # Try to create at least something from first chunk if available
-        chunk_files = [f for f in os.listdir(chunks_dir) if f.endswith('.wav')]
-        if chunk_files:
-            import shutil
-            shutil.copy2(os.path.join(chunks_dir, chunk_files[0]), final_file)
+    session.refresh_from_db(fields=['total_chunks', 'total_duration'])
+    logger.info(f"Recording {session.id} stopped via REST, {session.total_chunks} chunks queued for processing")
 
     return {
         'status': 'stopped',
         'session_id': session_id,
-        'filename': recording_info['filename'],
-        'filepath': final_file,
-        'chunks_processed': chunk_count
+        'filename': recording_filename(session),
+        'chunks_processed': session.total_chunks,
+        'total_duration': round(session.total_duration, 3),
+        'processing': 'queued'
     }
 
 
-def concatenate_wav_files(input_files, output_file):
-    with open(input_files[0], 'rb') as f:
-        header = bytearray(f.read(44))
+RECORDINGS_PAGE_SIZE = 50
+RECORDINGS_MAX_PAGE_SIZE = 200
+
+# Columns needed for the listing; everything else on Session stays deferred
+RECORDING_LIST_FIELDS = (
+    'id', 'started_at', 'ended_at', 'status', 'total_duration', 'audio_file', 'file_size',
+    'tab_url', 'tab_title',
+    'transcript__id', 'transcript__language', 'transcript__total_speakers', 'transcript__total_utterances',
+)
+
 
-    # Collect all PCM data
-    pcm_data = bytearray()
-    for wav_file in input_files:
-        with open(wav_file, 'rb') as f:
-            f.read(44)  # Skip WAV header
-            pcm_data.extend(f.read())
+def encode_cursor(session):
+    raw = f"{session.started_at.isoformat()}|{session.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
 
-    # Update file size in header
-    # Total file size = 36 + data size
-    import struct
-    total_size = 36 + len(pcm_data)
-    struct.pack_into('<I', header, 4, total_size)
 
-    # Update data chunk size
-    struct.pack_into('<I', header, 40, len(pcm_data))
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    started_at, session_id = raw.split('|', 1)
+    return datetime.fromisoformat(started_at), uuid.UUID(session_id)
 
-    # Write final file
-    with open(output_file, 'wb') as f:
-        f.write(header)
-        f.write(pcm_data)
 
-    logger.debug(f"Created WAV file: {len(pcm_data)} bytes PCM data")
+def serialize_recording(session):
+    filename = os.path.basename(session.audio_file) if session.audio_file else None
+
+    try:
+        transcript = session.transcript
+    except Transcript.DoesNotExist:
+        transcript = None
+
+    return {
+        'session_id': str(session.id),
+        'filename': filename,
+        'size': session.file_size,
+        'duration': session.total_duration,
+        'status': session.status,
+        'created_at': session.started_at.isoformat(),
+        'ended_at': session.ended_at.isoformat() if session.ended_at else None,
+        'tab_url': session.tab_url,
+        'tab_title': session.tab_title,
+        'url': f"/api/play/{filename}" if filename else None,
+        'transcript': {
+            'language': transcript.language,
+            'total_speakers': transcript.total_speakers,
+            'total_utterances': transcript.total_utterances,
+        } if transcript else None,
+    }
 
 
 @router.get("/recordings")
-def list_recordings(request):
-    recordings_dir = os.path.join(settings.MEDIA_ROOT, "recordings")
-
-    if not os.path.exists(recordings_dir):
-        return {'recordings': []}
-
-    recordings = []
-    for filename in os.listdir(recordings_dir):
-        if filename.endswith(('.wav', '.webm', '.mp3')):
-            filepath = os.path.join(recordings_dir, filename)
-            stat = os.stat(filepath)
-            recordings.append({
-                'filename': filename,
-                'size': stat.st_size,
-                'created_at': datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                'url': f"/media/recordings/{filename}"
-            })
-
-    recordings.sort(key=lambda x: x['created_at'], reverse=True)
-    return {'recordings': recordings}
-
-
-from django.http import StreamingHttpResponse
-import mimetypes
-
-def range_response(request, filepath, content_type):
-    file_size = os.path.getsize(filepath)
-    range_header = request.META.get('HTTP_RANGE', '').strip()
-    range_match = None
-
-    if range_header:
-        import re
-        range_match = re.match(r'bytes=(\d+)-(\d*)', range_header)
-
-    if range_match:
-        # Partial content request
-        start = int(range_match.group(1))
-        end = int(range_match.group(2)) if range_match.group(2) else file_size - 1
-        length = end - start + 1
-
-        def file_iterator(start, length):
-            with open(filepath, 'rb') as f:
-                f.seek(start)
-                remaining = length
-                chunk_size = 8192
-                while remaining > 0:
-                    chunk = f.read(min(chunk_size, remaining))
-                    if not chunk:
-                        break
-                    remaining -= len(chunk)
-                    yield chunk
-
-        response = StreamingHttpResponse(
-            file_iterator(start, length),
-            status=206,
-            content_type=content_type
+def list_recordings(
+    request,
+    cursor: Optional[str] = None,
+    limit: int = RECORDINGS_PAGE_SIZE,
+    status: Optional[str] = None,
+    started_after: Optional[datetime] = None,
+    started_before: Optional[datetime] = None,
+    tab_url: Optional[str] = None,
+):
+    limit = max(1, min(limit, RECORDINGS_MAX_PAGE_SIZE))
+
+    sessions = (
+        Session.objects
+        .select_related('transcript')
+        .only(*RECORDING_LIST_FIELDS)
+        .order_by('-started_at', '-id')
+    )
+
+    if status:
+        sessions = sessions.filter(status=status)
+    if started_after:
+        sessions = sessions.filter(started_at__gte=started_after)
+    if started_before:
+        sessions = sessions.filter(started_at__lt=started_before)
+    if tab_url:
+        # Prefix match: a site or page URL also matches its deeper pages
+        sessions = sessions.filter(tab_url__startswith=tab_url)
+
+    if cursor:
+        try:
+            cursor_started_at, cursor_id = decode_cursor(cursor)
+        except (ValueError, UnicodeDecodeError):
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+        # Keyset pagination: (started_at, id) strictly after the cursor in sort order
+        sessions = sessions.filter(
+            Q(started_at__lt=cursor_started_at)
+            | Q(started_at=cursor_started_at, id__lt=cursor_id)
         )
-        response['Content-Length'] = length
-        response['Content-Range'] = f'bytes {start}-{end}/{file_size}'
-        response['Accept-Ranges'] = 'bytes'
 
-    else:
-        # Full file request
-        response = FileResponse(
-            open(filepath, 'rb'),
-            content_type=content_type,
-            as_attachment=False
-        )
-        response['Content-Length'] = file_size
-        response['Accept-Ranges'] = 'bytes'
+    page = list(sessions[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
 
-    return response
+    return {
+        'recordings': [serialize_recording(session) for session in page],
+        'next_cursor': encode_cursor(page[-1]) if has_more else None,
+    }
 
 
 @router.get("/play/{filename}", include_in_schema=True)
 def play_recording(request, filename: str):
-    filepath = os.path.join(settings.MEDIA_ROOT, "recordings", filename)
+    name = get_storage().name_for(recording_key(filename))
 
-    if not os.path.exists(filepath):
+    if not get_storage().exists(name):
         return HttpResponse("File not found", status=404)
 
     # Determine content type
-    content_type = 'audio/webm'
-    if filename.endswith('.wav'):
-        content_type = 'audio/wav'
-    elif filename.endswith('.mp3'):
-        content_type = 'audio/mpeg'
+    content_type = AUDIO_CONTENT_TYPES.get(os.path.splitext(filename)[1].lower(), 'audio/webm')
 
-    return range_response(request, filepath, content_type)
+    return range_response(request, name, content_type)
 
 
 @router.delete("/delete/{filename}")
 def delete_recording(request, filename: str):
-    filepath = os.path.join(settings.MEDIA_ROOT, "recordings", filename)
+    storage = get_storage()
+    name = storage.name_for(recording_key(filename))
 
-    if not os.path.exists(filepath):
+    session = Session.objects.filter(audio_file=name).first()
+
+    if session is None and not storage.exists(name):
         return JsonResponse({'error': 'File not found'}, status=404)
 
-    os.remove(filepath)
-    return {'status': 'deleted', 'filename': filename}
+    session_id = str(session.id) if session else None
+
+    if session is not None:
+        # Removes the session row with its transcript, chunks and cached media
+        purge_session(session)
+    else:
+        storage.delete(name)
+
+    return {'status': 'deleted', 'filename': filename, 'session_id': session_id}
@@ -1,6 +1,8 @@
 from ninja import Router
-from app.recordings.api import recordings
+from app.recordings.api import recordings, search, transcripts
 
 router = Router()
 
 router.add_router("", recordings.router, tags=["recordings"])
+router.add_router("", transcripts.router, tags=["transcripts"])
+router.add_router("", search.router, tags=["search"])
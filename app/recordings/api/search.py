@@ -0,0 +1,67 @@
+import os
+import uuid
+import logging
+from typing import Optional
+
+from django.http import JsonResponse
+from ninja import Router
+
+from app.recordings.models import Utterance
+from app.recordings.services.search import filter_utterances
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+
+@router.get("/search")
+def search_utterances(
+    request,
+    q: str,
+    session_id: Optional[uuid.UUID] = None,
+    speaker: Optional[str] = None,
+    language: Optional[str] = None,
+    limit: int = SEARCH_PAGE_SIZE,
+):
+    query = q.strip()
+    if not query:
+        return JsonResponse({'error': 'Empty query'}, status=400)
+
+    limit = max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+
+    utterances = Utterance.objects.all()
+    if session_id:
+        utterances = utterances.filter(transcript__session_id=session_id)
+    if speaker:
+        utterances = utterances.filter(speaker=speaker)
+
+    hits = (
+        filter_utterances(utterances, query, language)
+        .order_by('-rank', 'transcript_id', 'sequence_number')
+        .values(
+            'id', 'speaker', 'text', 'start_time', 'end_time', 'rank',
+            'transcript_id', 'transcript__session_id', 'transcript__session__audio_file',
+        )[:limit]
+    )
+
+    results = []
+    for hit in hits:
+        audio_file = hit['transcript__session__audio_file']
+        filename = os.path.basename(audio_file) if audio_file else None
+        results.append({
+            'utterance_id': str(hit['id']),
+            'session_id': str(hit['transcript__session_id']),
+            'transcript_id': str(hit['transcript_id']),
+            'speaker': hit['speaker'],
+            'text': hit['text'],
+            'start': hit['start_time'],
+            'end': hit['end_time'],
+            'rank': hit['rank'],
+            # Media fragment: плеер сразу перематывает на начало реплики
+            'play_url': f"/api/play/{filename}#t={hit['start_time']:.2f}" if filename else None,
+        })
+
+    return {'query': query, 'results': results}
@@ -0,0 +1,212 @@
+"""
+Range-aware serving of recordings playback from the configured storage
+"""
+import os
+import re
+import uuid
+import logging
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+from app.recordings.services.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+RANGE_SPEC_RE = re.compile(r'^(\d*)-(\d*)$')
+
+# More ranges than this (after merging) are ignored and the whole file is sent
+MAX_RANGES = 16
+
+# Block size for the non-sendfile fallback (runserver, Daphne)
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+def parse_range_header(range_header, file_size):
+    """
+    Parse a `Range: bytes=...` header into a list of (start, end) pairs.
+
+    Returns None when the header should be ignored (malformed, not in bytes
+    or too many ranges) and an empty list when none of the ranges is
+    satisfiable. The result is sorted with overlapping ranges merged.
+    """
+    units, _, ranges = range_header.partition('=')
+    if units.strip().lower() != 'bytes' or not ranges:
+        return None
+
+    result = []
+    for spec in ranges.split(','):
+        match = RANGE_SPEC_RE.match(spec.strip())
+        if not match or match.group(1) == match.group(2) == '':
+            return None
+
+        first, last = match.groups()
+        if first == '':
+            # Suffix range: last N bytes
+            length = int(last)
+            if length == 0:
+                continue
+            start, end = max(0, file_size - length), file_size - 1
+        else:
+            start = int(first)
+            end = min(int(last), file_size - 1) if last else file_size - 1
+            if start > end:
+                if last and int(last) < start:
+                    return None
+                continue
+
+        result.append((start, end))
+
+    # Overlapping and adjacent ranges are coalesced so `bytes=0-,0-,...` cannot
+    # make us stream the file many times over (RFC 9110 §14.2)
+    result = merge_ranges(result)
+    if len(result) > MAX_RANGES:
+        return None
+
+    return result
+
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def opaque_tag(etag):
+    # Weak comparison (RFC 9110): W/ prefix is ignored for If-None-Match
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def is_not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or opaque_tag(etag) in {opaque_tag(e) for e in etags}
+
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(last_modified) <= if_modified_since
+
+
+def if_range_matches(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE', '').strip()
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    if_range_date = parse_http_date_safe(if_range)
+    return if_range_date is not None and int(last_modified) <= if_range_date
+
+
+def accel_response(filepath, content_type):
+    # Hand the whole request (ranges, conditionals) over to the front proxy
+    mode = settings.RECORDINGS_SENDFILE_MODE
+    response = HttpResponse(content_type=content_type)
+
+    if mode == 'x-accel':
+        relpath = os.path.relpath(filepath, settings.MEDIA_ROOT).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = settings.RECORDINGS_ACCEL_PREFIX.rstrip('/') + '/' + relpath
+    else:
+        response['X-Sendfile'] = os.fspath(filepath)
+
+    return response
+
+
+def iter_blocks(file):
+    try:
+        for block in iter(lambda: file.read(STREAM_BLOCK_SIZE), b''):
+            yield block
+    finally:
+        file.close()
+
+
+def multipart_ranges_response(storage, name, ranges, file_size, content_type):
+    boundary = uuid.uuid4().hex
+    part_headers = [
+        (
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n"
+        ).encode('ascii')
+        for start, end in ranges
+    ]
+    closing = f"\r\n--{boundary}--\r\n".encode('ascii')
+
+    def parts_iterator():
+        for header, (start, end) in zip(part_headers, ranges):
+            yield header
+            yield from iter_blocks(storage.open_range(name, start, end - start + 1))
+        yield closing
+
+    response = StreamingHttpResponse(
+        parts_iterator(),
+        status=206,
+        content_type=f'multipart/byteranges; boundary={boundary}'
+    )
+    response['Content-Length'] = (
+        sum(len(h) for h in part_headers)
+        + sum(end - start + 1 for start, end in ranges)
+        + len(closing)
+    )
+    return response
+
+
+def range_response(request, name, content_type):
+    storage = get_storage()
+
+    if settings.RECORDINGS_SENDFILE_MODE and storage.is_local:
+        return accel_response(storage.path(name), content_type)
+
+    stat = storage.stat(name)
+    file_size = stat.size
+    etag = stat.etag
+    last_modified = stat.modified
+
+    if is_not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+    else:
+        range_header = request.META.get('HTTP_RANGE', '').strip()
+        ranges = None
+        if range_header and if_range_matches(request, etag, last_modified):
+            ranges = parse_range_header(range_header, file_size)
+
+        if ranges == []:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{file_size}'
+
+        elif ranges and len(ranges) > 1:
+            response = multipart_ranges_response(storage, name, ranges, file_size, content_type)
+
+        else:
+            start, end = ranges[0] if ranges else (0, file_size - 1)
+            length = max(0, end - start + 1)
+
+            window = storage.open_range(name, start, length)
+            if storage.is_local:
+                # FileWindow exposes fileno(): gunicorn sends the window with sendfile()
+                response = FileResponse(
+                    window,
+                    status=206 if ranges else 200,
+                    content_type=content_type,
+                    as_attachment=False
+                )
+                response.block_size = STREAM_BLOCK_SIZE
+            else:
+                # Streamed ranged GET from object storage
+                response = StreamingHttpResponse(
+                    iter_blocks(window),
+                    status=206 if ranges else 200,
+                    content_type=content_type
+                )
+            response['Content-Length'] = length
+            if ranges:
+                response['Content-Range'] = f'bytes {start}-{end}/{file_size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
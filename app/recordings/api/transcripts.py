@@ -0,0 +1,229 @@
+import json
+import uuid
+import logging
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from ninja import Router
+
+from app.recordings.models import Transcript, Utterance
+from app.recordings.services.diarization_cache import has_cache
+from app.recordings.services.exports import EXPORT_FORMATS
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+
+# Rows fetched per round-trip when streaming utterances
+UTTERANCE_FETCH_SIZE = 2000
+
+UTTERANCE_FIELDS = ('id', 'speaker', 'global_speaker_id', 'text', 'start_time', 'end_time', 'confidence', 'sequence_number')
+
+
+def get_transcript(session_id):
+    return (
+        Transcript.objects
+        .select_related('session')
+        .only(
+            'id', 'language', 'full_text', 'total_speakers', 'total_utterances', 'confidence_avg',
+            'whisper_model', 'diarization_model', 'created_at',
+            'session__id', 'session__status', 'session__started_at', 'session__total_duration',
+        )
+        .get(session_id=session_id)
+    )
+
+
+def utterance_rows(transcript, start=None, end=None, speaker=None):
+    # Walks the (transcript, sequence_number) index; time bounds are applied
+    # as filters on that ordered range scan
+    utterances = Utterance.objects.filter(transcript=transcript)
+
+    if start is not None:
+        utterances = utterances.filter(end_time__gt=start)
+    if end is not None:
+        utterances = utterances.filter(start_time__lt=end)
+    if speaker:
+        utterances = utterances.filter(speaker=speaker)
+
+    return (
+        utterances
+        .order_by('sequence_number')
+        .values_list(*UTTERANCE_FIELDS)
+        .iterator(chunk_size=UTTERANCE_FETCH_SIZE)
+    )
+
+
+def iter_utterances_json(rows):
+    separator = ''
+    for utterance_id, speaker, speaker_id, text, start_time, end_time, confidence, sequence_number in rows:
+        yield separator + json.dumps({
+            'id': str(utterance_id),
+            'speaker': speaker,
+            'speaker_id': str(speaker_id) if speaker_id else None,
+            'text': text,
+            'start': start_time,
+            'end': end_time,
+            'confidence': confidence,
+            'sequence_number': sequence_number,
+        }, ensure_ascii=False)
+        separator = ','
+
+
+def serialize_transcript(transcript, include_text):
+    session = transcript.session
+    data = {
+        'id': str(transcript.id),
+        'language': transcript.language,
+        'total_speakers': transcript.total_speakers,
+        'total_utterances': transcript.total_utterances,
+        'confidence_avg': transcript.confidence_avg,
+        'whisper_model': transcript.whisper_model,
+        'diarization_model': transcript.diarization_model,
+        'created_at': transcript.created_at.isoformat(),
+        'session': {
+            'id': str(session.id),
+            'status': session.status,
+            'started_at': session.started_at.isoformat(),
+            'duration': session.total_duration,
+        },
+    }
+    if include_text:
+        data['full_text'] = transcript.full_text
+    return data
+
+
+def transcript_not_found(session_id):
+    return JsonResponse({'error': 'Transcript not found', 'session_id': str(session_id)}, status=404)
+
+
+@router.get("/sessions/{session_id}/transcript")
+def get_session_transcript(
+    request,
+    session_id: uuid.UUID,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    speaker: Optional[str] = None,
+    include_text: bool = False,
+):
+    try:
+        transcript = get_transcript(session_id)
+    except Transcript.DoesNotExist:
+        return transcript_not_found(session_id)
+
+    header = json.dumps(serialize_transcript(transcript, include_text), ensure_ascii=False)
+
+    def stream():
+        # Transcript metadata first, then utterances one by one without
+        # materialising the list in memory
+        yield header[:-1] + ', "utterances": ['
+        yield from iter_utterances_json(utterance_rows(transcript, start, end, speaker))
+        yield ']}'
+
+    return StreamingHttpResponse(stream(), content_type='application/json')
+
+
+@router.get("/sessions/{session_id}/transcript/utterances")
+def list_session_utterances(
+    request,
+    session_id: uuid.UUID,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    speaker: Optional[str] = None,
+):
+    transcript_id = Transcript.objects.filter(session_id=session_id).values_list('id', flat=True).first()
+    if transcript_id is None:
+        return transcript_not_found(session_id)
+
+    def stream():
+        yield '['
+        yield from iter_utterances_json(utterance_rows(transcript_id, start, end, speaker))
+        yield ']'
+
+    return StreamingHttpResponse(stream(), content_type='application/json')
+
+
+def cached_export_stream(rendered, cache_key):
+    # Отдаем байты по мере рендера и копим их для кеша, пока укладываемся в лимит
+    parts = []
+    size = 0
+
+    for part in rendered:
+        data = part.encode('utf-8') if isinstance(part, str) else part
+        if parts is not None:
+            size += len(data)
+            if size <= settings.TRANSCRIPT_EXPORT_CACHE_MAX_BYTES:
+                parts.append(data)
+            else:
+                parts = None
+        yield data
+
+    if parts is not None:
+        cache.set(cache_key, b''.join(parts), settings.TRANSCRIPT_EXPORT_CACHE_TIMEOUT)
+
+
+@router.get("/sessions/{session_id}/transcript/export")
+def export_session_transcript(request, session_id: uuid.UUID, format: str = 'srt'):
+    if format not in EXPORT_FORMATS:
+        return JsonResponse({'error': f"Unsupported format, use one of: {', '.join(EXPORT_FORMATS)}"}, status=400)
+
+    transcript = Transcript.objects.filter(session_id=session_id).values('id', 'version').first()
+    if transcript is None:
+        return transcript_not_found(session_id)
+
+    renderer, content_type, extension = EXPORT_FORMATS[format]
+    cache_key = f"transcript-export:{transcript['id']}:v{transcript['version']}:{format}"
+
+    cached = cache.get(cache_key)
+    if cached is not None:
+        response = HttpResponse(cached, content_type=content_type)
+    else:
+        rows = (
+            Utterance.objects
+            .filter(transcript_id=transcript['id'])
+            .order_by('sequence_number')
+            .values_list('speaker', 'text', 'start_time', 'end_time')
+            .iterator(chunk_size=UTTERANCE_FETCH_SIZE)
+        )
+        response = StreamingHttpResponse(
+            cached_export_stream(renderer(rows), cache_key),
+            content_type=content_type
+        )
+
+    response['Content-Disposition'] = f'attachment; filename="transcript_{str(session_id)[:8]}.{extension}"'
+    return response
+
+
+@router.post("/sessions/{session_id}/transcript/recluster")
+def recluster_session_transcript(
+    request,
+    session_id: uuid.UUID,
+    num_speakers: Optional[int] = None,
+    min_speakers: Optional[int] = None,
+    max_speakers: Optional[int] = None,
+    clustering_threshold: Optional[float] = None,
+):
+    # Re-runs only the clustering step on the cached segmentation/embeddings
+    from app.recordings.tasks.diarization import recluster_session_task
+
+    if not Transcript.objects.filter(session_id=session_id).exists():
+        return transcript_not_found(session_id)
+
+    if not has_cache(session_id):
+        return JsonResponse({'error': 'Diarization cache not available for this session'}, status=409)
+
+    if any(value is not None and value < 1 for value in (num_speakers, min_speakers, max_speakers)):
+        return JsonResponse({'error': 'Speaker counts must be positive'}, status=400)
+    if min_speakers and max_speakers and min_speakers > max_speakers:
+        return JsonResponse({'error': 'min_speakers must not exceed max_speakers'}, status=400)
+
+    task = recluster_session_task.delay(
+        str(session_id),
+        num_speakers=num_speakers,
+        min_speakers=min_speakers,
+        max_speakers=max_speakers,
+        clustering_threshold=clustering_threshold
+    )
+
+    return JsonResponse({'status': 'queued', 'session_id': str(session_id), 'task_id': task.id}, status=202)
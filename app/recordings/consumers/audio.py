@@ -1,14 +1,21 @@
+import asyncio
 import base64
 import json
-import os
+import time
 import logging
+from urllib.parse import parse_qs
 
+from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.conf import settings
-from django.utils import timezone
 
-from app.recordings.models import Session, AudioChunk
+from app.recordings.services.chunks import build_chunk, flush_chunk_batch, inspect_chunk
+from app.recordings.services.sessions import (
+    ResumeError, create_session, finish_recording, interrupt_session, resume_session,
+)
+from app.recordings.services.speaker_hints import HINT_FIELDS, speaker_hints_from_metadata
+from app.recordings.services.storage import chunk_key, get_storage
 
 logger = logging.getLogger(__name__)
 
@@ -16,25 +23,77 @@ logger = logging.getLogger(__name__)
 class AudioConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         try:
-            # Создаем новую сессию записи
-            self.session = await self.create_session()
+            # ?session_id=&token=&last_chunk= - переподключение к прерванной записи
+            params = parse_qs(self.scope.get('query_string', b'').decode())
+            resume_id = params.get('session_id', [None])[0]
+            last_chunk = 0
+
+            if resume_id:
+                try:
+                    self.session, last_chunk = await database_sync_to_async(resume_session)(
+                        resume_id, params.get('token', [None])[0]
+                    )
+                except ResumeError as e:
+                    # Клиент по коду закрытия понимает, что нужно начать новую сессию
+                    logger.info(f"Resume of session {resume_id} rejected: {e}")
+                    await self.accept()
+                    await self.send(text_data=json.dumps({'type': 'error', 'message': str(e)}))
+                    await self.close(code=e.close_code)
+                    return
+            else:
+                # Создаем новую сессию записи
+                self.session = await database_sync_to_async(create_session)()
+
             self.session_id = str(self.session.id)
-            self.chunk_counter = 0
+            # Поколение соединения: устаревший консьюмер не трогает возобновленную сессию
+            self.generation = self.session.resume_count
+            self.stopped = False
+
+            # Чанки с номерами до resumed_from уже сохранены, повторы только подтверждаем
+            self.resumed_from = last_chunk
+            self.chunk_counter = last_chunk
 
-            # Создаем директорию для чанков
-            self.chunks_dir = os.path.join(settings.MEDIA_ROOT, "chunks", self.session_id)
-            os.makedirs(self.chunks_dir, exist_ok=True)
+            # Буфер метаданных чанков, сбрасывается в БД пачками
+            self.pending_chunks = []
+            self.last_flush_at = time.monotonic()
+
+            # Формат потока и накопительные итоги, считаются по заголовкам чанков
+            self.wav_info = None
+            self.total_duration = self.session.total_duration
+            self.total_bytes = self.session.total_bytes
 
             await self.accept()
 
-            # Отправляем session_id клиенту
-            await self.send(text_data=json.dumps({
-                'type': 'session_started',
-                'session_id': self.session_id,
-                'status': 'connected'
-            }))
+            self.flush_task = asyncio.ensure_future(self.flush_periodically())
+
+            if resume_id:
+                client_last_chunk = params.get('last_chunk', ['0'])[0]
+                if client_last_chunk.isdigit() and int(client_last_chunk) > last_chunk:
+                    logger.warning(
+                        f"Session {self.session_id}: client acked chunk {client_last_chunk}, "
+                        f"server has {last_chunk}"
+                    )
+
+                # Клиент досылает все чанки после last_chunk
+                await self.send(text_data=json.dumps({
+                    'type': 'session_resumed',
+                    'session_id': self.session_id,
+                    'last_chunk': last_chunk,
+                    'total_duration': round(self.total_duration, 3),
+                    'status': 'connected'
+                }))
+
+                logger.info(f"Session resumed: {self.session_id} (last chunk {last_chunk})")
+            else:
+                # Отправляем session_id и токен возобновления клиенту
+                await self.send(text_data=json.dumps({
+                    'type': 'session_started',
+                    'session_id': self.session_id,
+                    'resume_token': self.session.resume_token,
+                    'status': 'connected'
+                }))
 
-            logger.info(f"New session started: {self.session_id}")
+                logger.info(f"New session started: {self.session_id}")
 
         except Exception as e:
             logger.error(f"Error in connect: {e}", exc_info=True)
@@ -46,11 +105,20 @@ class AudioConsumer(AsyncWebsocketConsumer):
             if hasattr(self, 'session') and hasattr(self, 'session_id'):
                 logger.info(f"Session {self.session_id} disconnecting (code: {close_code})")
 
-                await self.finalize_session(close_code)
+                if hasattr(self, 'flush_task'):
+                    self.flush_task.cancel()
+
+                if self.stopped:
+                    return
+
+                await self.flush_chunks()
 
-                # Запускаем обработку аудио в Celery
-                from app.recordings.tasks.processing import process_audio_task
-                process_audio_task.delay(self.session_id)
+                if close_code == 1000:
+                    # Нормальное закрытие без 'stop' (старые клиенты) - запись завершена
+                    await database_sync_to_async(finish_recording)(self.session_id, self.generation)
+                else:
+                    # Обрыв: ждем переподключения, обработку запустит grace-таймаут
+                    await database_sync_to_async(interrupt_session)(self.session_id, self.generation)
             else:
                 logger.warning(f"WebSocket disconnected before session was created (code: {close_code})")
 
@@ -72,6 +140,10 @@ class AudioConsumer(AsyncWebsocketConsumer):
                     # Обновляем метаданные сессии
                     await self.update_metadata(data)
 
+                elif message_type == 'stop':
+                    # Явное завершение записи - сразу в обработку
+                    await self.stop_recording()
+
             elif bytes_data:
                 # Прямая передача бинарных данных
                 await self.handle_binary_chunk(bytes_data)
@@ -91,14 +163,16 @@ class AudioConsumer(AsyncWebsocketConsumer):
             audio_data = base64.b64decode(data.get('audio_data', ''))
             chunk_number = data.get('chunk_number', self.chunk_counter)
 
-            # Сохраняем чанк
-            chunk_path = await self.save_chunk(audio_data, chunk_number)
+            # Сохраняем чанк (повторно присланный после переподключения - только подтверждаем)
+            if chunk_number > self.resumed_from:
+                await self.save_chunk(audio_data, chunk_number)
 
             # Отправляем подтверждение
             await self.send(text_data=json.dumps({
                 'type': 'chunk_received',
                 'chunk_number': chunk_number,
-                'size': len(audio_data)
+                'size': len(audio_data),
+                'total_duration': round(self.total_duration, 3)
             }))
 
             logger.debug(f"Chunk {chunk_number} received: {len(audio_data)} bytes")
@@ -112,13 +186,14 @@ class AudioConsumer(AsyncWebsocketConsumer):
             self.chunk_counter += 1
 
             # Сохраняем чанк
-            chunk_path = await self.save_chunk(bytes_data, self.chunk_counter)
+            await self.save_chunk(bytes_data, self.chunk_counter)
 
             # Отправляем подтверждение
             await self.send(text_data=json.dumps({
                 'type': 'chunk_received',
                 'chunk_number': self.chunk_counter,
-                'size': len(bytes_data)
+                'size': len(bytes_data),
+                'total_duration': round(self.total_duration, 3)
             }))
 
             logger.debug(f"Binary chunk {self.chunk_counter} received: {len(bytes_data)} bytes")
@@ -127,35 +202,73 @@ class AudioConsumer(AsyncWebsocketConsumer):
             logger.error(f"Error handling binary chunk: {e}", exc_info=True)
             raise
 
-    @database_sync_to_async
-    def create_session(self):
-        session = Session.objects.create(
-            status='active',
-            started_at=timezone.now()
-        )
-        return session
+    async def stop_recording(self):
+        if hasattr(self, 'flush_task'):
+            self.flush_task.cancel()
+
+        await self.flush_chunks()
+        self.stopped = True
+        queued = await database_sync_to_async(finish_recording)(self.session_id, self.generation)
+
+        await self.send(text_data=json.dumps({
+            'type': 'session_stopped',
+            'session_id': self.session_id,
+            'status': 'queued' if queued else 'superseded',
+            'total_duration': round(self.total_duration, 3)
+        }))
+        await self.close(code=1000)
+
+        logger.info(f"Session {self.session_id} stopped by client")
+
+    async def save_chunk(self, audio_data, chunk_number):
+        chunk_filepath = await sync_to_async(self.write_chunk_file)(audio_data, chunk_number)
+
+        # Метаданные копим в памяти: файл уже на диске, поэтому несброшенное
+        # окно восстанавливается из директории чанков при обработке
+        wav_info = inspect_chunk(audio_data)
+        if wav_info and self.wav_info is None:
+            self.wav_info = wav_info
+            logger.info(
+                f"Session {self.session_id} stream format: "
+                f"{wav_info.sample_rate} Hz, {wav_info.channels} ch, {wav_info.bits_per_sample} bit"
+            )
+
+        chunk = build_chunk(self.session, chunk_number, len(audio_data), chunk_filepath, wav_info)
+        self.pending_chunks.append(chunk)
+        self.total_duration += chunk.duration
+        self.total_bytes += chunk.chunk_size
+
+        if (len(self.pending_chunks) >= settings.AUDIO_CHUNK_FLUSH_SIZE
+                or time.monotonic() - self.last_flush_at >= settings.AUDIO_CHUNK_FLUSH_INTERVAL):
+            await self.flush_chunks()
 
-    @database_sync_to_async
-    def save_chunk(self, audio_data, chunk_number):
-        chunk_filename = f"chunk_{chunk_number:04d}.wav"
-        chunk_filepath = os.path.join(self.chunks_dir, chunk_filename)
+        return chunk_filepath
 
-        with open(chunk_filepath, 'wb') as f:
-            f.write(audio_data)
+    def write_chunk_file(self, audio_data, chunk_number):
+        # Локальный диск или объектное хранилище (STORAGE_BACKEND)
+        return get_storage().save(chunk_key(self.session_id, chunk_number), audio_data)
 
-        # Сохраняем запись в БД
-        AudioChunk.objects.create(
-            session=self.session,
-            chunk_number=chunk_number,
-            chunk_size=len(audio_data),
-            file_path=chunk_filepath
-        )
+    async def flush_chunks(self):
+        self.last_flush_at = time.monotonic()
 
-        # Обновляем счетчик чанков в сессии
-        self.session.total_chunks = chunk_number
-        self.session.save(update_fields=['total_chunks'])
+        if not self.pending_chunks:
+            return
 
-        return chunk_filepath
+        chunks, self.pending_chunks = self.pending_chunks, []
+
+        await database_sync_to_async(flush_chunk_batch)(self.session, chunks, self.wav_info)
+
+    async def flush_periodically(self):
+        # Сбрасываем буфер по таймеру, даже если клиент перестал присылать чанки
+        try:
+            while True:
+                await asyncio.sleep(settings.AUDIO_CHUNK_FLUSH_INTERVAL)
+                if time.monotonic() - self.last_flush_at >= settings.AUDIO_CHUNK_FLUSH_INTERVAL:
+                    await self.flush_chunks()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error flushing chunks for session {self.session_id}: {e}", exc_info=True)
 
     @database_sync_to_async
     def update_metadata(self, data):
@@ -179,21 +292,17 @@ class AudioConsumer(AsyncWebsocketConsumer):
         if 'browser_info' in metadata:
             self.session.browser_info = metadata['browser_info']
 
-        self.session.save()
+        # Подсказки числа спикеров для диаризации. Обновление без них (например,
+        # только смена вкладки) сохраненные не стирает, а выведенные по домену
+        # берутся, лишь пока подсказок у сессии нет
+        hints = speaker_hints_from_metadata(metadata, self.session.tab_url)
+        provided = any(name in metadata for name in (*HINT_FIELDS, 'participants'))
+        if not any(hints.values()) or (not provided and self.session.speaker_hints):
+            hints = {}
+        for name, value in hints.items():
+            setattr(self.session, name, value)
+
+        self.session.save(update_fields=[
+            'tab_url', 'tab_title', 'tab_favicon', 'user_agent', 'ip_address', 'browser_info', *hints
+        ])
         logger.info(f"Session {self.session_id} metadata updated successfully")
-
-    @database_sync_to_async
-    def finalize_session(self, close_code):
-        self.session.ended_at = timezone.now()
-
-        # Определяем статус в зависимости от кода закрытия
-        if close_code == 1000:
-            # Нормальное закрытие
-            self.session.status = 'completed'
-        else:
-            # Аварийное закрытие
-            self.session.status = 'failed'
-
-        self.session.save()
-
-        logger.info(f"Session {self.session_id} finalized with status: {self.session.status}")
\ No newline at end of file
@@ -0,0 +1,58 @@
+import logging
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from app.recordings.models import Session
+from app.recordings.services.progress import session_group_name
+
+logger = logging.getLogger(__name__)
+
+
+class StatusConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Только чтение: отдает клиенту прогресс обработки сессии,
+    который process_audio_task публикует в группу session_<id>.
+    """
+
+    async def connect(self):
+        self.session_id = self.scope['url_route']['kwargs']['session_id']
+
+        session = await self.get_session()
+        if session is None:
+            await self.close(code=4404)
+            return
+
+        self.group_name = session_group_name(self.session_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        # Текущее состояние сразу, чтобы клиенту не ждать следующего события
+        await self.send_json({
+            'type': 'status',
+            'session_id': self.session_id,
+            'status': session.status,
+            'stage': session.processing_stage,
+            'percent': session.processing_progress,
+        })
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        # Клиент ничего не отправляет, кроме ping
+        if content.get('type') == 'ping':
+            await self.send_json({'type': 'pong'})
+
+    async def processing_progress(self, event):
+        await self.send_json({**event, 'type': 'progress'})
+
+    @database_sync_to_async
+    def get_session(self):
+        return (
+            Session.objects
+            .only('id', 'status', 'processing_stage', 'processing_progress')
+            .filter(id=self.session_id)
+            .first()
+        )
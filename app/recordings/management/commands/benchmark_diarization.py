@@ -0,0 +1,121 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.mp3', '.ogg', '.opus')
+
+
+def collect_audio_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(AUDIO_EXTENSIONS)
+            )
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            raise CommandError(f"Not found: {path}")
+    return files
+
+
+def load_reference(audio_path):
+    # Эталонная разметка: <name>.rttm рядом с аудио
+    rttm_path = os.path.splitext(audio_path)[0] + '.rttm'
+    if not os.path.exists(rttm_path):
+        return None
+
+    from pyannote.core import Annotation, Segment
+
+    reference = Annotation()
+    with open(rttm_path) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 8 or fields[0] != 'SPEAKER':
+                continue
+            start, duration = float(fields[3]), float(fields[4])
+            reference[Segment(start, start + duration)] = fields[7]
+    return reference
+
+
+def error_rate(reference, segments):
+    try:
+        from pyannote.core import Annotation, Segment
+        from pyannote.metrics.diarization import DiarizationErrorRate
+    except ImportError:
+        return None
+
+    hypothesis = Annotation()
+    for segment in segments:
+        hypothesis[Segment(segment['start'], segment['end'])] = segment['speaker']
+    return DiarizationErrorRate()(reference, hypothesis)
+
+
+class Command(BaseCommand):
+    help = "Сравнивает время и качество диаризации без подсказок и с подсказками числа спикеров"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="Audio files or directories (<name>.rttm next to audio = reference)")
+        parser.add_argument('--num-speakers', type=int)
+        parser.add_argument('--min-speakers', type=int)
+        parser.add_argument('--max-speakers', type=int)
+        parser.add_argument(
+            '--from-reference', action='store_true',
+            help="Use the reference speaker count as num_speakers"
+        )
+        parser.add_argument('--repeat', type=int, default=1, help="Runs per variant, best time is reported")
+
+    def handle(self, *args, **options):
+        files = collect_audio_files(options['paths'])
+        if not files:
+            raise CommandError("No audio files found")
+
+        fixed_hints = {
+            name: options[name] for name in ('num_speakers', 'min_speakers', 'max_speakers')
+            if options[name]
+        }
+        if not fixed_hints and not options['from_reference']:
+            raise CommandError("Pass --num-speakers/--min-speakers/--max-speakers or --from-reference")
+
+        from app.recordings.services.processor import get_ml_processor
+        processor = get_ml_processor()
+        if not processor.diarization_pipeline:
+            raise CommandError("Diarization pipeline not available (check HF_TOKEN)")
+
+        totals = {'no hints': 0.0, 'hints': 0.0}
+        self.stdout.write(f"{'file':<40} {'variant':<10} {'time, s':>8} {'speakers':>8} {'DER':>7}  hints")
+
+        for audio_path in files:
+            reference = load_reference(audio_path)
+
+            hints = dict(fixed_hints)
+            if options['from_reference']:
+                if reference is None:
+                    self.stderr.write(f"No reference for {audio_path}, skipping")
+                    continue
+                hints = {'num_speakers': len(reference.labels())}
+
+            for variant, variant_hints in (('no hints', {}), ('hints', hints)):
+                best = None
+                for _ in range(options['repeat']):
+                    started_at = time.perf_counter()
+                    segments = processor.diarize_audio(audio_path, **variant_hints)
+                    elapsed = time.perf_counter() - started_at
+                    best = elapsed if best is None else min(best, elapsed)
+
+                totals[variant] += best
+                der = error_rate(reference, segments) if reference is not None else None
+
+                self.stdout.write(
+                    f"{os.path.basename(audio_path)[:40]:<40} {variant:<10} {best:>8.2f} "
+                    f"{len(set(s['speaker'] for s in segments)):>8} "
+                    f"{'-' if der is None else f'{der:.1%}':>7}  {variant_hints or ''}"
+                )
+
+        if totals['hints']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Total: {totals['no hints']:.2f}s without hints, {totals['hints']:.2f}s with hints "
+                f"({totals['no hints'] / totals['hints']:.2f}x)"
+            ))
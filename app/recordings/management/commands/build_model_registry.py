@@ -0,0 +1,158 @@
+import os
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.recordings.services.model_registry import CURRENT_FILE, MANIFEST_FILE, ModelRegistry, file_sha256
+
+# Параметры pipeline pyannote, которые ссылаются на модели Hub
+CHECKPOINT_PARAMS = ('segmentation', 'embedding')
+
+# Из снапшотов берем только конфиги и веса (без README, примеров и т.п.)
+SNAPSHOT_PATTERNS = ['*.yaml', '*.json', '*.bin', '*.ckpt', '*.safetensors']
+
+
+def describe_files(root, relpaths):
+    return {
+        relpath: {
+            'sha256': file_sha256(os.path.join(root, relpath)),
+            'size': os.path.getsize(os.path.join(root, relpath)),
+        }
+        for relpath in relpaths
+    }
+
+
+def snapshot_files(root, directory):
+    relpaths = []
+    for dirpath, _, filenames in os.walk(os.path.join(root, directory)):
+        if '.cache' in dirpath.split(os.sep):
+            continue
+        relpaths.extend(os.path.relpath(os.path.join(dirpath, name), root) for name in filenames)
+    return sorted(relpaths)
+
+
+class Command(BaseCommand):
+    help = "Собирает версионированный локальный реестр моделей Whisper и pyannote для офлайн-старта воркера"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--registry-version', help="Registry version name (default: timestamp)")
+        parser.add_argument('--whisper-model', default='base')
+        parser.add_argument('--diarization-model', default='pyannote/speaker-diarization-3.1')
+        parser.add_argument('--revision', default='main', help="Hub revision of the diarization pipeline to pin")
+        parser.add_argument('--no-activate', action='store_true', help="Do not point CURRENT at the new version")
+
+    def handle(self, *args, **options):
+        registry_dir = settings.MODEL_REGISTRY_DIR
+        version = options['registry_version'] or timezone.now().strftime('%Y%m%d_%H%M%S')
+        target = os.path.join(registry_dir, version)
+
+        if os.path.exists(target):
+            raise CommandError(f"Registry version already exists: {target}")
+
+        os.makedirs(registry_dir, exist_ok=True)
+        # Собираем во временном каталоге рядом и переименовываем целиком
+        staging = tempfile.mkdtemp(prefix=f'.{version}.', dir=registry_dir)
+
+        try:
+            models = {
+                'whisper': self.build_whisper(staging, options['whisper_model']),
+                'diarization': self.build_diarization(staging, options['diarization_model'], options['revision']),
+            }
+
+            with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+                json.dump({
+                    'version': version,
+                    'created_at': timezone.now().isoformat(),
+                    'models': models,
+                }, f, indent=2)
+
+            os.replace(staging, target)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        ModelRegistry(target).verify(full=True)
+
+        if not options['no_activate']:
+            current_tmp = os.path.join(registry_dir, CURRENT_FILE + '.tmp')
+            with open(current_tmp, 'w') as f:
+                f.write(version + '\n')
+            os.replace(current_tmp, os.path.join(registry_dir, CURRENT_FILE))
+
+        total = sum(info['size'] for model in models.values() for info in model['files'].values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Registry {version} built in {target} ({total / 1024 / 1024:.0f} MB)"
+            + ("" if options['no_activate'] else ", activated")
+        ))
+
+    def build_whisper(self, root, name):
+        import whisper
+
+        if name not in whisper._MODELS:
+            raise CommandError(f"Unknown Whisper model: {name}")
+
+        # URL чекпоинта содержит его sha256, _download его проверяет
+        url = whisper._MODELS[name]
+        self.stdout.write(f"Whisper {name}: {url}")
+        os.makedirs(os.path.join(root, 'whisper'))
+        downloaded = whisper._download(url, os.path.join(root, 'whisper'), in_memory=False)
+
+        checkpoint = os.path.relpath(downloaded, root)
+        return {
+            'name': name,
+            'source': url,
+            'checkpoint': checkpoint,
+            'files': describe_files(root, [checkpoint]),
+        }
+
+    def build_diarization(self, root, repo_id, revision):
+        import yaml
+        from huggingface_hub import HfApi, snapshot_download
+
+        token = os.environ.get('HF_TOKEN')
+        api = HfApi(token=token)
+
+        def download(repo, repo_revision):
+            # Фиксируем ревизию коммитом, а не веткой
+            commit = api.model_info(repo, revision=repo_revision).sha
+            # Каталог внутри pyannote/: pyannote выбирает свой загрузчик эмбеддингов по подстроке 'pyannote' в пути
+            directory = os.path.join('pyannote', repo.split('/')[-1])
+            snapshot_download(
+                repo,
+                revision=commit,
+                token=token,
+                local_dir=os.path.join(root, directory),
+                allow_patterns=SNAPSHOT_PATTERNS
+            )
+            self.stdout.write(f"{repo}@{commit[:12]}")
+            return directory, commit
+
+        directory, commit = download(repo_id, revision)
+        config = os.path.join(directory, 'config.yaml')
+        with open(os.path.join(root, config)) as f:
+            params = yaml.safe_load(f)['pipeline'].get('params', {})
+
+        checkpoints = {}
+        dependencies = {}
+        for param in CHECKPOINT_PARAMS:
+            value = params.get(param)
+            if not isinstance(value, str) or os.path.exists(value):
+                continue
+            dependency_dir, dependency_commit = download(value, 'main')
+            dependencies[value] = dependency_commit
+            checkpoints[param] = os.path.join(dependency_dir, 'pytorch_model.bin')
+            if not os.path.exists(os.path.join(root, checkpoints[param])):
+                raise CommandError(f"{value} has no pytorch_model.bin")
+
+        return {
+            'name': repo_id,
+            'revision': commit,
+            'config': config,
+            'checkpoints': checkpoints,
+            'dependencies': dependencies,
+            'files': describe_files(root, snapshot_files(root, 'pyannote')),
+        }
@@ -0,0 +1,108 @@
+import os
+import re
+import sys
+import json
+import subprocess
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Модули ML-стека, которые не должны попадать в web/ASGI-процессы
+FORBIDDEN_MODULES = (
+    'torch',
+    'torchaudio',
+    'whisper',
+    'pyannote.audio',
+    'speechbrain',
+    'transformers',
+    'lightning',
+    'pytorch_lightning',
+)
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+# Выполняется в отдельном интерпретаторе с -X importtime: поднимает Django,
+# импортирует точки входа и URLConf (как первый запрос), печатает RSS и модули
+PROBE = """
+import sys, json, importlib, resource
+import django
+django.setup()
+for module in {modules!r}:
+    importlib.import_module(module)
+from django.urls import get_resolver
+get_resolver().url_patterns
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'rss_kb': rss // 1024 if sys.platform == 'darwin' else rss, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def parse_importtime(stderr):
+    # Собственное время импорта (мкс) по пакетам верхнего уровня
+    per_package = defaultdict(int)
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, _, _, name = match.groups()
+            per_package[name.split('.')[0]] += int(self_us)
+    return per_package
+
+
+class Command(BaseCommand):
+    help = "Проверяет время импорта и RSS при старте web/ASGI-процессов (python -X importtime)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--module', action='append', dest='modules',
+            help="Entry point to import (repeatable, default: config.asgi and config.wsgi)"
+        )
+        parser.add_argument('--max-import-ms', type=float, default=settings.STARTUP_IMPORT_BUDGET_MS)
+        parser.add_argument('--max-rss-mb', type=float, default=settings.STARTUP_RSS_BUDGET_MB)
+        parser.add_argument('--top', type=int, default=15, help="Show N slowest top-level packages")
+
+    def handle(self, *args, **options):
+        modules = options['modules'] or ['config.asgi', 'config.wsgi']
+
+        env = dict(os.environ)
+        env['DJANGO_SETTINGS_MODULE'] = settings.SETTINGS_MODULE
+        env['PYTHONPATH'] = os.pathsep.join(path for path in sys.path if path)
+
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE.format(modules=modules)],
+            capture_output=True, text=True, env=env
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Startup probe failed:\n{result.stderr[-4000:]}")
+
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        per_package = parse_importtime(result.stderr)
+
+        import_ms = sum(per_package.values()) / 1000
+        rss_mb = probe['rss_kb'] / 1024
+        loaded = set(probe['modules'])
+        forbidden = [
+            module for module in FORBIDDEN_MODULES
+            if module in loaded or any(name.startswith(module + '.') for name in loaded)
+        ]
+
+        self.stdout.write(f"Entry points: {', '.join(modules)}")
+        self.stdout.write(f"Modules loaded: {len(loaded)}")
+        self.stdout.write(f"Import time: {import_ms:.0f} ms (budget {options['max_import_ms']:.0f} ms)")
+        self.stdout.write(f"Peak RSS: {rss_mb:.0f} MB (budget {options['max_rss_mb']:.0f} MB)")
+
+        self.stdout.write("Slowest packages (self time):")
+        for package, self_us in sorted(per_package.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"  {self_us / 1000:>8.1f} ms  {package}")
+
+        errors = []
+        if forbidden:
+            errors.append(f"ML modules imported by web processes: {', '.join(forbidden)}")
+        if import_ms > options['max_import_ms']:
+            errors.append(f"import time {import_ms:.0f} ms exceeds {options['max_import_ms']:.0f} ms")
+        if rss_mb > options['max_rss_mb']:
+            errors.append(f"peak RSS {rss_mb:.0f} MB exceeds {options['max_rss_mb']:.0f} MB")
+
+        if errors:
+            raise CommandError("Startup budget exceeded: " + "; ".join(errors))
+
+        self.stdout.write(self.style.SUCCESS("Startup budget OK"))
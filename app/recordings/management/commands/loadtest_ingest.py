@@ -0,0 +1,359 @@
+import asyncio
+import base64
+import io
+import json
+import math
+import resource
+import statistics
+import threading
+import time
+import wave
+from array import array
+from contextlib import ExitStack
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def synthetic_wav(sample_rate, channels, seconds=1.0):
+    # Тон 440 Гц: заголовок и размер как у чанков расширения (16 bit PCM)
+    frames = int(sample_rate * seconds)
+    samples = array('h', (
+        int(8000 * math.sin(2 * math.pi * 440 * (i // channels) / sample_rate))
+        for i in range(frames * channels)
+    ))
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class QueryCounter:
+    """
+    Считает запросы всех соединений с БД, включая соединения потоков
+    database_sync_to_async. Хук остается на соединении после выхода (объект
+    соединения живет в потоке executor'а дольше одного прогона) и без
+    активного счетчика ничего не делает.
+    """
+
+    active = []
+    lock = threading.Lock()
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    @classmethod
+    def hook(cls, execute, sql, params, many, context):
+        if not cls.active:
+            return execute(sql, params, many, context)
+
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            with cls.lock:
+                for counter in cls.active:
+                    counter.count += 1
+                    counter.duration += elapsed
+
+    @classmethod
+    def install(cls, connection, **kwargs):
+        if cls.hook not in connection.execute_wrappers:
+            connection.execute_wrappers.append(cls.hook)
+
+    def __enter__(self):
+        connection_created.connect(QueryCounter.install)
+        for connection in connections.all(initialized_only=True):
+            QueryCounter.install(connection)
+        QueryCounter.active.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        QueryCounter.active.remove(self)
+
+
+class InProcessTransport:
+    def __init__(self, application, path='/ws/audio/'):
+        from channels.testing import WebsocketCommunicator
+        self.communicator = WebsocketCommunicator(application, path)
+
+    async def connect(self):
+        connected, _ = await self.communicator.connect()
+        if not connected:
+            raise ConnectionError("Handshake rejected")
+
+    async def send(self, text=None, data=None):
+        await self.communicator.send_to(text_data=text, bytes_data=data)
+
+    async def receive(self, timeout):
+        message = await self.communicator.receive_output(timeout)
+        if message['type'] == 'websocket.close':
+            raise ConnectionError(f"Closed by server ({message.get('code')})")
+        return json.loads(message['text'])
+
+    async def close(self, code):
+        await self.communicator.disconnect(code=code)
+
+
+class RemoteTransport:
+    def __init__(self, url):
+        self.url = url
+        self.websocket = None
+
+    async def connect(self):
+        import websockets
+        self.websocket = await websockets.connect(self.url, max_size=None)
+
+    async def send(self, text=None, data=None):
+        await self.websocket.send(text if text is not None else data)
+
+    async def receive(self, timeout):
+        return json.loads(await asyncio.wait_for(self.websocket.recv(), timeout))
+
+    async def close(self, code):
+        await self.websocket.close(code=code)
+
+
+class Client:
+    """Одна вкладка: шлет чанки по расписанию и меряет задержку подтверждений."""
+
+    def __init__(self, transport, mode, chunk, chunks, interval, ack_timeout):
+        self.transport = transport
+        self.mode = mode
+        self.chunk = chunk
+        self.chunk_b64 = base64.b64encode(chunk).decode()
+        self.chunks = chunks
+        self.interval = interval
+        self.ack_timeout = ack_timeout
+
+        self.sent = 0
+        self.sent_at = {}
+        self.latencies = []
+        self.errors = []
+        self.session_id = None
+
+    async def run(self, finish):
+        await self.transport.connect()
+        started = await self.transport.receive(self.ack_timeout)
+        self.session_id = started.get('session_id')
+
+        receiver = asyncio.ensure_future(self.receive_acks())
+        start = time.perf_counter()
+
+        for number in range(1, self.chunks + 1):
+            # Расписание от старта, чтобы задержки отправки не накапливались
+            delay = start + (number - 1) * self.interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            binary = self.mode == 'binary' or (self.mode == 'mixed' and number % 2 == 0)
+            self.sent_at[number] = time.perf_counter()
+            if binary:
+                await self.transport.send(data=self.chunk)
+            else:
+                await self.transport.send(text=json.dumps({
+                    'type': 'audio_chunk',
+                    'chunk_number': number,
+                    'audio_data': self.chunk_b64,
+                }))
+            self.sent += 1
+
+        try:
+            await asyncio.wait_for(receiver, self.ack_timeout)
+        except asyncio.TimeoutError:
+            self.errors.append(f"{self.chunks - len(self.latencies)} acks missing")
+
+        if finish == 'stop':
+            await self.transport.send(text=json.dumps({'type': 'stop'}))
+            try:
+                await self.transport.receive(self.ack_timeout)
+            except Exception:
+                pass
+
+        await self.transport.close(1000 if finish != 'drop' else 4000)
+
+    async def receive_acks(self):
+        while len(self.latencies) < self.chunks:
+            message = await self.transport.receive(self.ack_timeout)
+            if message.get('type') == 'chunk_received':
+                # Номера совпадают для обоих форматов: бинарным сервер присваивает свой счетчик
+                sent_at = self.sent_at.pop(message['chunk_number'], None)
+                if sent_at is not None:
+                    self.latencies.append(time.perf_counter() - sent_at)
+            elif message.get('type') == 'error':
+                self.errors.append(message.get('message'))
+
+
+class Command(BaseCommand):
+    help = "Нагрузочный тест приема аудио: N одновременных вкладок шлют 1-секундные WAV-чанки в AudioConsumer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=10, help="Concurrent simulated tabs")
+        parser.add_argument('--chunks', type=int, default=30, help="Chunks per connection")
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="Seconds between chunks per connection (1.0 = real time, 0 = as fast as possible)")
+        parser.add_argument('--ramp-up', type=float, default=1.0, help="Seconds over which connections are opened")
+        parser.add_argument('--mode', choices=['json', 'binary', 'mixed'], default='json',
+                            help="Chunk framing: JSON/base64, raw binary or alternating")
+        parser.add_argument('--sample-rate', type=int, default=48000)
+        parser.add_argument('--channels', type=int, default=2)
+        parser.add_argument('--url', help="ws:// URL of a running server (default: in-process AudioConsumer)")
+        parser.add_argument('--finish', choices=['stop', 'close', 'drop'], default='stop',
+                            help="How connections end: 'stop' message, close 1000 or abnormal close")
+        parser.add_argument('--dispatch', action='store_true',
+                            help="In-process: really queue processing / grace tasks (needs a Celery broker)")
+        parser.add_argument('--keep-sessions', action='store_true',
+                            help="In-process: keep created sessions and chunk files")
+        parser.add_argument('--ack-timeout', type=float, default=30.0)
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        if options['connections'] < 1 or options['chunks'] < 1:
+            raise CommandError("--connections and --chunks must be positive")
+
+        if options['url']:
+            try:
+                import websockets  # noqa: F401
+            except ImportError:
+                raise CommandError("Remote mode needs the 'websockets' package: pip install websockets")
+
+        chunk = synthetic_wav(options['sample_rate'], options['channels'])
+        in_process = not options['url']
+
+        with ExitStack() as stack:
+            counter = None
+            if in_process:
+                # Без Redis: consumer работает с InMemoryChannelLayer
+                stack.enter_context(override_settings(
+                    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+                ))
+                if not options['dispatch']:
+                    # Синтетические записи не отправляем в обработку
+                    stack.enter_context(mock.patch('app.recordings.services.sessions.queue_processing'))
+                    stack.enter_context(mock.patch(
+                        'app.recordings.tasks.sessions.finalize_interrupted_session_task.apply_async'
+                    ))
+                counter = stack.enter_context(QueryCounter())
+
+            wall_started = time.perf_counter()
+            cpu_started = time.process_time()
+            clients = asyncio.run(self.run_clients(chunk, options))
+            wall = time.perf_counter() - wall_started
+            cpu = time.process_time() - cpu_started
+
+        if in_process and not options['keep_sessions']:
+            self.cleanup(clients)
+
+        report = self.build_report(clients, chunk, options, wall, cpu, counter)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    async def run_clients(self, chunk, options):
+        if options['url']:
+            transports = [RemoteTransport(options['url']) for _ in range(options['connections'])]
+        else:
+            from app.recordings.consumers.audio import AudioConsumer
+            application = AudioConsumer.as_asgi()
+            transports = [InProcessTransport(application) for _ in range(options['connections'])]
+
+        clients = [
+            Client(transport, options['mode'], chunk, options['chunks'],
+                   options['interval'], options['ack_timeout'])
+            for transport in transports
+        ]
+
+        async def start(index, client):
+            await asyncio.sleep(options['ramp_up'] * index / len(clients))
+            try:
+                await client.run(options['finish'])
+            except Exception as e:
+                client.errors.append(f"{type(e).__name__}: {e}")
+
+        await asyncio.gather(*(start(index, client) for index, client in enumerate(clients)))
+        return clients
+
+    def cleanup(self, clients):
+        from app.recordings.models import Session
+        from app.recordings.services.janitor import purge_session
+
+        for session in Session.objects.filter(id__in=[c.session_id for c in clients if c.session_id]):
+            purge_session(session)
+
+    def build_report(self, clients, chunk, options, wall, cpu, counter):
+        latencies = [latency for client in clients for latency in client.latencies]
+        acked = len(latencies)
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+
+        report = {
+            'target': options['url'] or 'in-process',
+            'mode': options['mode'],
+            'connections': len(clients),
+            'failed_connections': sum(1 for client in clients if client.errors),
+            'chunks_sent': sum(client.sent for client in clients),
+            'chunks_acked': acked,
+            'wall_seconds': round(wall, 3),
+            'chunks_per_second': round(acked / wall, 1) if wall else None,
+            'mb_per_second': round(acked * len(chunk) / wall / 2 ** 20, 2) if wall else None,
+            'latency_ms': {
+                f'p{pct}': round(percentile(latencies, pct) * 1000, 1) if latencies else None
+                for pct in PERCENTILES
+            },
+            # Подтверждение позже интервала отправки = консьюмер не успевает
+            'lagging_acks': sum(1 for latency in latencies if options['interval'] and latency > options['interval']),
+            'cpu_percent': round(cpu / wall * 100, 1) if wall else None,
+            'max_rss_mb': round(usage.ru_maxrss / 1024, 1),
+            'errors': sorted({error for client in clients for error in client.errors})[:10],
+        }
+        report['latency_ms']['mean'] = round(statistics.fmean(latencies) * 1000, 1) if latencies else None
+        report['latency_ms']['max'] = round(max(latencies) * 1000, 1) if latencies else None
+
+        if counter is not None:
+            report['db_queries'] = counter.count
+            report['db_queries_per_chunk'] = round(counter.count / acked, 2) if acked else None
+            report['db_time_seconds'] = round(counter.duration, 3)
+
+        return report
+
+    def print_report(self, report):
+        latency = report['latency_ms']
+        self.stdout.write(
+            f"{report['connections']} connections ({report['mode']}) -> {report['target']}, "
+            f"{report['wall_seconds']} s"
+        )
+        self.stdout.write(f"  chunks acked: {report['chunks_acked']}/{report['chunks_sent']}, "
+                          f"{report['chunks_per_second']} chunks/s, {report['mb_per_second']} MB/s")
+        self.stdout.write("  ack latency ms: " + ", ".join(f"{name} {value}" for name, value in latency.items()))
+        self.stdout.write(f"  lagging acks (> interval): {report['lagging_acks']}")
+        self.stdout.write(f"  CPU: {report['cpu_percent']}% of one core"
+                          f"{'' if report['target'] == 'in-process' else ' (load generator only)'}, "
+                          f"max RSS {report['max_rss_mb']} MB")
+        if 'db_queries' in report:
+            self.stdout.write(f"  DB: {report['db_queries']} queries ({report['db_queries_per_chunk']} per chunk), "
+                              f"{report['db_time_seconds']} s")
+
+        for error in report['errors']:
+            self.stdout.write(self.style.WARNING(f"  error: {error}"))
+
+        style = self.style.ERROR if report['failed_connections'] or report['lagging_acks'] else self.style.SUCCESS
+        self.stdout.write(style(f"Failed connections: {report['failed_connections']}"))
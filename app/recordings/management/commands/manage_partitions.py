@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app.recordings.services.partitioning import (
+    PARTITIONED_TABLES, expired_partitions, is_partitioned, is_supported, list_partitions,
+    maintain_partitions, partition_table, retention_months,
+)
+
+
+class Command(BaseCommand):
+    help = "Создает будущие месячные секции и удаляет/отсоединяет устаревшие (Postgres)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--list', action='store_true', help="Only list partitions and what would be removed")
+        parser.add_argument('--detach', action='store_true',
+                            help="Detach expired partitions instead of dropping them (for archiving)")
+        parser.add_argument('--convert', action='store_true',
+                            help="Convert still unpartitioned tables (locks them while copying)")
+
+    def handle(self, *args, **options):
+        if not is_supported(connection):
+            self.stdout.write(f"Partitioning is not supported on {connection.vendor}, nothing to do")
+            return
+
+        if options['convert']:
+            if not settings.DB_PARTITIONING:
+                raise CommandError("Set DB_PARTITIONING=True before converting tables")
+            for table, column in PARTITIONED_TABLES.items():
+                if partition_table(table, column):
+                    self.stdout.write(self.style.SUCCESS(f"Partitioned {table} by {column}"))
+
+        if options['list']:
+            for table in PARTITIONED_TABLES:
+                if not is_partitioned(table):
+                    self.stdout.write(f"{table}: not partitioned")
+                    continue
+                expired = {p.name for p in expired_partitions(table, retention_months(table))}
+                self.stdout.write(f"{table}:")
+                for partition in list_partitions(table):
+                    mark = '  (expired)' if partition.name in expired else ''
+                    self.stdout.write(f"  {partition.name}{mark}")
+            return
+
+        report = maintain_partitions(drop=not options['detach'])
+        if not report:
+            self.stdout.write("No partitioned tables (DB_PARTITIONING is off or migrations were run without it)")
+            return
+
+        for table, changes in report.items():
+            self.stdout.write(f"{table}: created {len(changes['created'])}, "
+                              f"{'detached' if options['detach'] else 'dropped'} {len(changes['removed'])}")
+            for name in changes['removed']:
+                self.stdout.write(f"  - {name}")
+        self.stdout.write(self.style.SUCCESS("Partitions are up to date"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.recordings.services.janitor import MB, sweep_media
+
+
+class Command(BaseCommand):
+    help = "Удаляет осиротевшие и устаревшие медиафайлы и применяет дисковые квоты"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be removed without deleting")
+
+    def handle(self, *args, **options):
+        report = sweep_media(dry_run=options['dry_run'])
+        if report is None:
+            raise CommandError("Another media sweep is running")
+
+        for category, size in sorted(report.reclaimed_bytes.items()):
+            self.stdout.write(f"  {category:<22} {report.removed[category]:>6} items  {size / MB:>10.1f} MB")
+
+        self.stdout.write(f"Abandoned sessions: {report.abandoned_sessions} (finished {report.finished_sessions})")
+        self.stdout.write(f"Evicted sessions: {report.evicted_sessions}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would reclaim' if report.dry_run else 'Reclaimed'} {report.total_bytes / MB:.1f} MB"
+        ))
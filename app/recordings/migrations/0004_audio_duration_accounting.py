@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recordings', '0003_rename_recordingsession_to_session'),
+    ]
+
+    operations = [
+        migrations.RenameIndex(
+            model_name='session',
+            new_name='recordings__started_1c204e_idx',
+            old_name='recordings__started_51359c_idx',
+        ),
+        migrations.RenameIndex(
+            model_name='session',
+            new_name='recordings__status_9298e7_idx',
+            old_name='recordings__status_8e15d2_idx',
+        ),
+        migrations.AddField(
+            model_name='audiochunk',
+            name='duration',
+            field=models.FloatField(default=0.0, help_text='Duration in seconds (from WAV header)'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='channels',
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='sample_rate',
+            field=models.IntegerField(blank=True, help_text='Sample rate in Hz', null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='total_bytes',
+            field=models.BigIntegerField(default=0, help_text='Received audio bytes'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS recordings_utterance_search_gin "
+            "ON recordings_utterance USING GIN (search_vector)"
+        )
+
+    elif connection.vendor == 'sqlite':
+        # FTS5 может отсутствовать в сборке SQLite - тогда поиск работает без индекса
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS recordings_utterance_fts "
+                "USING fts5(text, utterance_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except Exception:
+            pass
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+
+    if connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS recordings_utterance_search_gin")
+
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS recordings_utterance_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recordings', '0005_session_status_started_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='utterance',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recordings', '0006_utterance_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcript',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
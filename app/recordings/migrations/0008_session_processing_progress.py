@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recordings', '0007_transcript_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='processing_progress',
+            field=models.FloatField(default=0.0, help_text='Прогресс обработки, %'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='processing_stage',
+            field=models.CharField(blank=True, help_text='Текущий этап обработки', max_length=32, null=True),
+        ),
+    ]
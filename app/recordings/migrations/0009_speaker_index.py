@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:23
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recordings', '0008_session_processing_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Speaker',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(blank=True, help_text='Имя, заданное пользователем', max_length=200)),
+                ('embedding', models.BinaryField()),
+                ('embedding_dim', models.PositiveSmallIntegerField()),
+                ('total_sessions', models.PositiveIntegerField(default=0)),
+                ('total_speech', models.FloatField(default=0.0, help_text='Speech duration in seconds')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Спикер',
+                'verbose_name_plural': 'Спикеры',
+                'ordering': ['-updated_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='utterance',
+            name='global_speaker',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='utterances', to='recordings.speaker'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recordings', '0009_speaker_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='max_speakers',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='min_speakers',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='num_speakers',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Точное число спикеров', null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recordings', '0010_session_speaker_hints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='language',
+            field=models.CharField(blank=True, max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='language_probability',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recordings', '0011_session_language'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='audiochunk',
+            index=models.Index(fields=['received_at'], name='recordings__receive_61865f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transcript',
+            index=models.Index(fields=['created_at'], name='recordings__created_67dba8_idx'),
+        ),
+    ]
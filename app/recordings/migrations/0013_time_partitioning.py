@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:37
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+from app.recordings.services.partitioning import PARTITIONED_TABLES, partition_table, unpartition_table
+
+
+def backfill_utterance_created_at(apps, schema_editor):
+    # Реплики относятся ко времени создания транскрипта, а не к моменту миграции
+    Utterance = apps.get_model('recordings', 'Utterance')
+    Transcript = apps.get_model('recordings', 'Transcript')
+
+    Utterance.objects.using(schema_editor.connection.alias).update(
+        created_at=Subquery(Transcript.objects.filter(pk=OuterRef('transcript_id')).values('created_at')[:1])
+    )
+
+
+def partition_tables(apps, schema_editor):
+    connection = schema_editor.connection
+
+    # Только Postgres и только по явному флагу; на SQLite таблицы остаются обычными
+    if connection.vendor != 'postgresql' or not settings.DB_PARTITIONING:
+        return
+
+    for table, column in PARTITIONED_TABLES.items():
+        partition_table(table, column, connection=connection)
+
+
+def unpartition_tables(apps, schema_editor):
+    connection = schema_editor.connection
+
+    if connection.vendor != 'postgresql':
+        return
+
+    for table in PARTITIONED_TABLES:
+        unpartition_table(table, connection=connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recordings', '0012_admin_list_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='utterance',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_utterance_created_at, migrations.RunPython.noop),
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recordings', '0013_time_partitioning'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='interrupted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='resume_count',
+            field=models.PositiveIntegerField(default=0, help_text='Сколько раз запись возобновлялась'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='resume_token',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='session',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('interrupted', 'Interrupted'), ('completed', 'Completed'), ('failed', 'Failed'), ('processing', 'Processing')], default='active', max_length=20),
+        ),
+    ]
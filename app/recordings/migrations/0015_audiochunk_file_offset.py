@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recordings', '0014_session_resume'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiochunk',
+            name='file_offset',
+            field=models.BigIntegerField(default=0, help_text='Offset of the chunk in file_path'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recordings', '0015_audiochunk_file_offset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcript',
+            name='speaker_contributions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -1,11 +1,13 @@
 from .session import Session
 from .chunk import AudioChunk
+from .speaker import Speaker
 from .transcript import Transcript
 from .utterance import Utterance
 
 __all__ = [
     'Session',
     'AudioChunk',
+    'Speaker',
     'Transcript',
     'Utterance',
 ]
@@ -11,7 +11,10 @@ class AudioChunk(models.Model):
 
     chunk_number = models.IntegerField()
     chunk_size = models.IntegerField(help_text="Size in bytes")
+    duration = models.FloatField(default=0.0, help_text="Duration in seconds (from WAV header)")
     file_path = models.CharField(max_length=500)
+    # Пакетная загрузка пишет несколько чанков подряд в один файл
+    file_offset = models.BigIntegerField(default=0, help_text="Offset of the chunk in file_path")
 
     received_at = models.DateTimeField(default=timezone.now)
 
@@ -22,6 +25,7 @@ class AudioChunk(models.Model):
         unique_together = [['session', 'chunk_number']]
         indexes = [
             models.Index(fields=['session', 'chunk_number']),
+            models.Index(fields=['received_at']),
         ]
 
     def __str__(self):
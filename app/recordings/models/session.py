@@ -6,6 +6,7 @@ import uuid
 class Session(models.Model):
     STATUS_CHOICES = [
         ('active', 'Active'),
+        ('interrupted', 'Interrupted'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
         ('processing', 'Processing'),
@@ -17,8 +18,16 @@ class Session(models.Model):
     ended_at = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
 
+    # Возобновление записи после обрыва WebSocket (services/sessions.py)
+    resume_token = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    resume_count = models.PositiveIntegerField(default=0, help_text="Сколько раз запись возобновлялась")
+    interrupted_at = models.DateTimeField(null=True, blank=True)
+
     total_chunks = models.IntegerField(default=0)
     total_duration = models.FloatField(default=0.0, help_text="Duration in seconds")
+    total_bytes = models.BigIntegerField(default=0, help_text="Received audio bytes")
+    sample_rate = models.IntegerField(null=True, blank=True, help_text="Sample rate in Hz")
+    channels = models.SmallIntegerField(null=True, blank=True)
 
     audio_file = models.CharField(max_length=500, null=True, blank=True)
     file_size = models.BigIntegerField(default=0, help_text="File size in bytes")
@@ -31,9 +40,20 @@ class Session(models.Model):
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     browser_info = models.JSONField(null=True, blank=True, help_text="Дополнительная информация о браузере")
 
+    # Язык записи (определяется перед распознаванием, см. services.language)
+    language = models.CharField(max_length=10, null=True, blank=True)
+    language_probability = models.FloatField(null=True, blank=True)
+
+    # Подсказки для диаризации: из метаданных расширения или по контексту вкладки
+    num_speakers = models.PositiveSmallIntegerField(null=True, blank=True, help_text="Точное число спикеров")
+    min_speakers = models.PositiveSmallIntegerField(null=True, blank=True)
+    max_speakers = models.PositiveSmallIntegerField(null=True, blank=True)
+
     processing_started_at = models.DateTimeField(null=True, blank=True)
     processing_completed_at = models.DateTimeField(null=True, blank=True)
     processing_error = models.TextField(null=True, blank=True)
+    processing_stage = models.CharField(max_length=32, null=True, blank=True, help_text="Текущий этап обработки")
+    processing_progress = models.FloatField(default=0.0, help_text="Прогресс обработки, %")
 
     class Meta:
         verbose_name = "Сессия"
@@ -42,6 +62,7 @@ class Session(models.Model):
         indexes = [
             models.Index(fields=['-started_at']),
             models.Index(fields=['status']),
+            models.Index(fields=['status', '-started_at']),
         ]
 
     def __str__(self):
@@ -52,3 +73,13 @@ class Session(models.Model):
         minutes = int(self.total_duration // 60)
         seconds = int(self.total_duration % 60)
         return f"{minutes}:{seconds:02d}"
+
+    @property
+    def speaker_hints(self):
+        # Аргументы для pipeline pyannote, только заданные
+        hints = {
+            'num_speakers': self.num_speakers,
+            'min_speakers': self.min_speakers,
+            'max_speakers': self.max_speakers,
+        }
+        return {name: value for name, value in hints.items() if value}
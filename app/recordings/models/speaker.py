@@ -0,0 +1,27 @@
+from django.db import models
+from django.utils import timezone
+import uuid
+
+
+class Speaker(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    name = models.CharField(max_length=200, blank=True, help_text="Имя, заданное пользователем")
+
+    # L2-нормализованный эмбеддинг голоса (float16), см. services.speakers
+    embedding = models.BinaryField()
+    embedding_dim = models.PositiveSmallIntegerField()
+
+    total_sessions = models.PositiveIntegerField(default=0)
+    total_speech = models.FloatField(default=0.0, help_text="Speech duration in seconds")
+
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Спикер"
+        verbose_name_plural = "Спикеры"
+        ordering = ['-updated_at']
+
+    def __str__(self):
+        return self.name or f"Speaker {str(self.id)[:8]}"
@@ -19,6 +19,13 @@ class Transcript(models.Model):
     whisper_model = models.CharField(max_length=50, default='medium')
     diarization_model = models.CharField(max_length=100, default='pyannote/speaker-diarization-3.1')
 
+    # Вклад записи в глобальных спикеров {метка: {speaker, duration, embedding}}:
+    # при перекластеризации или повторной обработке он сначала вычитается
+    speaker_contributions = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Увеличивается при каждом изменении реплик (инвалидирует кеш экспортов)
+    version = models.PositiveIntegerField(default=1)
+
     created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
@@ -26,6 +33,7 @@ class Transcript(models.Model):
         verbose_name_plural = "Транскрипты"
         indexes = [
             models.Index(fields=['session']),
+            models.Index(fields=['created_at']),
         ]
 
     def __str__(self):
@@ -1,6 +1,9 @@
 import uuid
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 
+from .speaker import Speaker
 from .transcript import Transcript
 
 
@@ -9,6 +12,10 @@ class Utterance(models.Model):
     transcript = models.ForeignKey(Transcript, on_delete=models.CASCADE, related_name='utterances')
 
     speaker = models.CharField(max_length=50)
+    # Спикер между сессиями (метка pyannote уникальна только внутри записи)
+    global_speaker = models.ForeignKey(
+        Speaker, on_delete=models.SET_NULL, null=True, blank=True, related_name='utterances'
+    )
     text = models.TextField()
 
     start_time = models.FloatField()
@@ -17,6 +24,12 @@ class Utterance(models.Model):
     confidence = models.FloatField(default=0.0)
     sequence_number = models.IntegerField()
 
+    # Заполняется services.search.index_transcript; GIN-индекс создается миграцией только в Postgres
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Ключ партиционирования при DB_PARTITIONING (services/partitioning.py)
+    created_at = models.DateTimeField(default=timezone.now)
+
     class Meta:
         verbose_name = "Фраза"
         verbose_name_plural = "Фразы"
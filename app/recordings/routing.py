@@ -1,6 +1,8 @@
 from django.urls import re_path
 from app.recordings.consumers.audio import AudioConsumer
+from app.recordings.consumers.status import StatusConsumer
 
 websocket_urlpatterns = [
     re_path(r'ws/audio/$', AudioConsumer.as_asgi()),
-]
\ No newline at end of file
+    re_path(r'ws/sessions/(?P<session_id>[0-9a-f-]{36})/status/$', StatusConsumer.as_asgi()),
+]
@@ -0,0 +1,59 @@
+import os
+import logging
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMATS = {
+    'flac': ('.flac', ['-c:a', 'flac', '-compression_level', '8']),
+    'opus': ('.opus', ['-c:a', 'libopus', '-vbr', 'on', '-application', 'audio']),
+}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def transcode_recording(source_path, archive_format, opus_bitrate='64k'):
+    """
+    Перекодирует WAV в архивный формат (FLAC без потерь или Opus) через ffmpeg.
+    Пишет во временный файл и атомарно переименовывает, исходник не трогает.
+    """
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ArchiveError(f"Unsupported archive format: {archive_format}")
+
+    extension, codec_args = ARCHIVE_FORMATS[archive_format]
+    if archive_format == 'opus':
+        codec_args = codec_args + ['-b:a', opus_bitrate]
+
+    target_path = os.path.splitext(source_path)[0] + extension
+    tmp_path = target_path + '.part'
+
+    command = [
+        'ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+        '-i', source_path,
+        *codec_args,
+        '-f', 'ogg' if archive_format == 'opus' else archive_format,
+        tmp_path,
+    ]
+
+    logger.info(f"Transcoding {source_path} to {archive_format}...")
+
+    try:
+        subprocess.run(command, check=True, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise ArchiveError("ffmpeg not found in PATH")
+    except subprocess.CalledProcessError as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise ArchiveError(f"ffmpeg failed: {e.stderr.strip()}")
+
+    if not os.path.getsize(tmp_path):
+        os.remove(tmp_path)
+        raise ArchiveError("ffmpeg produced an empty file")
+
+    os.replace(tmp_path, target_path)
+
+    logger.info(f"Transcoded to {target_path}: {os.path.getsize(source_path)} -> {os.path.getsize(target_path)} bytes")
+
+    return target_path
@@ -0,0 +1,209 @@
+import os
+import logging
+import tempfile
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from app.recordings.models import Session, AudioChunk
+from app.recordings.services.frames import FrameError
+from app.recordings.services.storage import chunk_batch_key, chunk_key, get_storage, session_chunks_prefix
+from app.recordings.services.wav import WavHeaderError, parse_wav_header
+
+logger = logging.getLogger(__name__)
+
+# Сколько байт читать с диска, чтобы гарантированно захватить заголовок WAV
+WAV_HEADER_READ_SIZE = 4096
+
+
+def inspect_chunk(audio_data, total_size=None):
+    # Возвращает WavInfo или None, если чанк не является корректным WAV
+    try:
+        return parse_wav_header(audio_data, total_size)
+    except WavHeaderError as e:
+        logger.warning(f"Could not parse chunk WAV header: {e}")
+        return None
+
+
+def build_chunk(session, chunk_number, chunk_size, file_path, wav_info, file_offset=0):
+    return AudioChunk(
+        session=session,
+        chunk_number=chunk_number,
+        chunk_size=chunk_size,
+        duration=wav_info.duration if wav_info else 0.0,
+        file_path=file_path,
+        file_offset=file_offset
+    )
+
+
+def flush_chunk_batch(session, chunks, wav_info=None):
+    """
+    Записывает пачку метаданных чанков одним bulk_create и обновляет
+    счетчики сессии (total_chunks, total_duration, total_bytes) в той же
+    транзакции. wav_info — формат потока, фиксируется при первом сбросе.
+    """
+    if not chunks:
+        return 0
+
+    with transaction.atomic():
+        # Блокировка строки сессии сериализует сбросы одной сессии (старый и новый
+        # консьюмер после возобновления, параллельные загрузки), чтобы проверка
+        # ниже не разошлась со вставкой
+        Session.objects.select_for_update().filter(pk=session.pk).first()
+
+        # Уже записанные чанки (восстановленные после возобновления, повторная
+        # загрузка) отсекаем заранее: ignore_conflicts пропустил бы их молча, но
+        # счетчики сессии учли бы их второй раз. В партиционированной таблице
+        # unique включает received_at, и ignore_conflicts их бы даже не отсек
+        known = set(
+            AudioChunk.objects.filter(
+                session=session, chunk_number__in=[chunk.chunk_number for chunk in chunks]
+            ).values_list('chunk_number', flat=True)
+        )
+        chunks = list({chunk.chunk_number: chunk for chunk in chunks if chunk.chunk_number not in known}.values())
+        if not chunks:
+            return 0
+
+        last_chunk_number = max(chunk.chunk_number for chunk in chunks)
+
+        updates = {
+            'total_chunks': Greatest(F('total_chunks'), last_chunk_number),
+            'total_duration': F('total_duration') + sum(chunk.duration for chunk in chunks),
+            'total_bytes': F('total_bytes') + sum(chunk.chunk_size for chunk in chunks),
+        }
+        if wav_info:
+            updates['sample_rate'] = Coalesce(F('sample_rate'), Value(wav_info.sample_rate))
+            updates['channels'] = Coalesce(F('channels'), Value(wav_info.channels))
+
+        AudioChunk.objects.bulk_create(chunks, ignore_conflicts=True)
+        Session.objects.filter(pk=session.pk).update(**updates)
+
+    logger.debug(f"Flushed {len(chunks)} chunks for session {session.pk} (last: {last_chunk_number})")
+
+    return len(chunks)
+
+
+def store_chunk(session, chunk_number, audio_data):
+    """
+    Сохраняет чанк REST-загрузки: файл в хранилище и строку AudioChunk сразу,
+    без буфера консьюмера — следующий запрос может прийти в другой процесс.
+    Повторно присланный чанк только подтверждается. Возвращает (chunk, created).
+    """
+    existing = AudioChunk.objects.filter(session=session, chunk_number=chunk_number).first()
+    if existing is not None:
+        return existing, False
+
+    name = get_storage().save(chunk_key(session.id, chunk_number), audio_data)
+    wav_info = inspect_chunk(audio_data)
+    chunk = build_chunk(session, chunk_number, len(audio_data), name, wav_info)
+    flush_chunk_batch(session, [chunk], wav_info)
+
+    return chunk, True
+
+
+def store_chunk_batch(session, frames):
+    """
+    Сохраняет чанки пакетной загрузки (services/frames.py) одним файлом:
+    данные кадров дописываются подряд во временный файл, который целиком
+    уходит в хранилище, AudioChunk ссылаются на него через file_offset,
+    метаданные пишутся одним flush_chunk_batch.
+
+    Возвращает (acks, error). Если тело оборвалось или кадр некорректен,
+    сохраняются все целые кадры до него, error описывает причину.
+    """
+    storage = get_storage()
+    known = set(
+        AudioChunk.objects.filter(session=session).values_list('chunk_number', flat=True)
+    )
+
+    acks = []
+    chunks = []
+    wav_info = None
+    error = None
+
+    out = tempfile.NamedTemporaryFile(suffix='.upload', dir=settings.FILE_UPLOAD_TEMP_DIR, delete=False)
+    try:
+        with out:
+            end = 0
+            try:
+                for chunk_number, size, blocks in frames:
+                    if chunk_number in known:
+                        # Повтор после неподтвержденной отправки: данные пропускаем
+                        acks.append({'chunk_number': chunk_number, 'size': size, 'duplicate': True})
+                        continue
+
+                    header = bytearray()
+                    for block in blocks:
+                        if len(header) < WAV_HEADER_READ_SIZE:
+                            header += block[:WAV_HEADER_READ_SIZE - len(header)]
+                        out.write(block)
+
+                    info = inspect_chunk(bytes(header), size)
+                    wav_info = wav_info or info
+                    known.add(chunk_number)
+                    chunks.append(build_chunk(session, chunk_number, size, None, info, file_offset=end))
+                    acks.append({'chunk_number': chunk_number, 'size': size, 'duplicate': False})
+                    end = out.tell()
+            except FrameError as e:
+                # Недописанный кадр отрезаем
+                error = str(e)
+                out.truncate(end)
+
+        if chunks:
+            first, last = min(c.chunk_number for c in chunks), max(c.chunk_number for c in chunks)
+            name = storage.save_file(chunk_batch_key(session.id, first, last), out.name)
+            for chunk in chunks:
+                chunk.file_path = name
+            flush_chunk_batch(session, chunks, wav_info)
+    finally:
+        # Обрыв клиента (OSError), ошибка записи или хранилища: временный файл не остается
+        if os.path.exists(out.name):
+            os.remove(out.name)
+
+    logger.debug(f"Stored batch of {len(chunks)} chunks for session {session.id} ({len(acks)} frames)")
+
+    return acks, error
+
+
+def recover_unflushed_chunks(session):
+    """
+    Дописывает в БД чанки, которые успели попасть в хранилище, но не были
+    сброшены из буфера консьюмера (например, после падения Daphne).
+    """
+    storage = get_storage()
+    stored = storage.list(session_chunks_prefix(session.id))
+
+    if not stored:
+        return 0
+
+    known = set(
+        AudioChunk.objects.filter(session=session).values_list('chunk_number', flat=True)
+    )
+
+    chunks = []
+    wav_info = None
+    for name, size in stored:
+        filename = os.path.basename(name)
+        if not (filename.startswith('chunk_') and filename.endswith('.wav')):
+            continue
+
+        try:
+            chunk_number = int(filename[len('chunk_'):-len('.wav')])
+        except ValueError:
+            continue
+
+        if chunk_number in known:
+            continue
+
+        info = inspect_chunk(storage.read(name, 0, WAV_HEADER_READ_SIZE), size)
+
+        wav_info = wav_info or info
+        chunks.append(build_chunk(session, chunk_number, size, name, info))
+
+    if chunks:
+        logger.warning(f"Recovering {len(chunks)} unflushed chunks for session {session.id}")
+        flush_chunk_batch(session, chunks, wav_info)
+
+    return len(chunks)
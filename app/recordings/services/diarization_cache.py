@@ -0,0 +1,138 @@
+import io
+import os
+import json
+import logging
+
+import numpy as np
+
+from app.recordings.services.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+SEGMENTATION_FILE = 'segmentation.npy'
+EMBEDDINGS_FILE = 'embeddings.npy'
+META_FILE = 'meta.json'
+TRANSCRIPTION_FILE = 'transcription.json'
+
+# Поля сегментов Whisper, нужные merge_transcription_and_diarization
+TRANSCRIPTION_SEGMENT_FIELDS = ('start', 'end', 'text', 'no_speech_prob')
+
+
+CACHE_FILES = (SEGMENTATION_FILE, EMBEDDINGS_FILE, META_FILE, TRANSCRIPTION_FILE)
+
+
+def cache_prefix(session_id):
+    # Кеш лежит в общем хранилище: пишет воркер, проверяет веб-узел (recluster API)
+    return f"diarization/{session_id}/"
+
+
+def cache_key(session_id, name):
+    return cache_prefix(session_id) + name
+
+
+def has_cache(session_id):
+    stored = {os.path.basename(name) for name, _ in get_storage().list(cache_prefix(session_id))}
+    return all(name in stored for name in CACHE_FILES)
+
+
+def save_array(session_id, name, array):
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(array, dtype=np.float32))
+    get_storage().save(cache_key(session_id, name), buffer.getvalue())
+
+
+def load_array(session_id, name):
+    storage = get_storage()
+    stored = storage.name_for(cache_key(session_id, name))
+    if storage.is_local:
+        # mmap (copy-on-write): с диска читаются только используемые страницы
+        return np.load(storage.path(stored), mmap_mode='c')
+    return np.load(io.BytesIO(storage.read(stored)))
+
+
+def save_json(session_id, name, data):
+    get_storage().save(cache_key(session_id, name), json.dumps(data, ensure_ascii=False).encode())
+
+
+def load_json(session_id, name):
+    storage = get_storage()
+    return json.loads(storage.read(storage.name_for(cache_key(session_id, name))))
+
+
+class DiarizationCapture:
+    """
+    Hook для pipeline pyannote: перехватывает промежуточные результаты
+    (оценки сегментации по окнам и эмбеддинги локальных спикеров), чтобы
+    сохранить их в хранилище и потом перекластеризовать без нейросетевого прохода.
+    """
+
+    def __init__(self):
+        self.segmentations = None
+        self.embeddings = None
+
+    def __call__(self, step_name, step_artefact, file=None, total=None, completed=None):
+        if step_artefact is None:
+            return
+        if step_name == 'segmentation':
+            self.segmentations = step_artefact
+        elif step_name == 'embeddings':
+            self.embeddings = step_artefact
+
+    def save(self, session_id, segmentation_threshold=None):
+        if self.segmentations is None or self.embeddings is None:
+            logger.warning(f"Diarization intermediates not captured for session {session_id}")
+            return False
+
+        window = self.segmentations.sliding_window
+        save_array(session_id, SEGMENTATION_FILE, self.segmentations.data)
+        save_array(session_id, EMBEDDINGS_FILE, self.embeddings)
+        save_json(session_id, META_FILE, {
+            'window_start': window.start,
+            'window_duration': window.duration,
+            'window_step': window.step,
+            'segmentation_threshold': segmentation_threshold,
+        })
+
+        logger.info(
+            f"Saved diarization cache for session {session_id}: "
+            f"segmentation {self.segmentations.data.shape}, embeddings {np.shape(self.embeddings)}"
+        )
+        return True
+
+
+def load_diarization(session_id):
+    """
+    Возвращает (segmentations, embeddings, meta). В локальном хранилище массивы
+    открываются через mmap, из S3 скачиваются целиком.
+    """
+    from pyannote.core import SlidingWindow, SlidingWindowFeature
+
+    meta = load_json(session_id, META_FILE)
+
+    window = SlidingWindow(
+        start=meta['window_start'],
+        duration=meta['window_duration'],
+        step=meta['window_step']
+    )
+    segmentations = SlidingWindowFeature(load_array(session_id, SEGMENTATION_FILE), window)
+    embeddings = load_array(session_id, EMBEDDINGS_FILE)
+
+    return segmentations, embeddings, meta
+
+
+def save_transcription(session_id, transcription_result):
+    save_json(session_id, TRANSCRIPTION_FILE, {
+        'language': transcription_result.get('language'),
+        'segments': [
+            {field: segment[field] for field in TRANSCRIPTION_SEGMENT_FIELDS if field in segment}
+            for segment in transcription_result['segments']
+        ],
+    })
+
+
+def load_transcription(session_id):
+    return load_json(session_id, TRANSCRIPTION_FILE)
+
+
+def remove_cache(session_id):
+    get_storage().delete_prefix(cache_prefix(session_id))
@@ -0,0 +1,127 @@
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+# Символы, недопустимые в XML 1.0 (встречаются в выводе Whisper на шуме)
+INVALID_XML_CHARS_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def format_timestamp(seconds, separator='.'):
+    milliseconds = int(round(max(seconds, 0.0) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"
+
+
+def render_srt(rows):
+    for index, (speaker, text, start, end) in enumerate(rows, start=1):
+        yield (
+            f"{index}\n"
+            f"{format_timestamp(start, ',')} --> {format_timestamp(end, ',')}\n"
+            f"{speaker}: {text}\n\n"
+        )
+
+
+def render_vtt(rows):
+    yield "WEBVTT\n\n"
+    for speaker, text, start, end in rows:
+        yield (
+            f"{format_timestamp(start)} --> {format_timestamp(end)}\n"
+            f"<v {escape(speaker)}>{escape(text)}\n\n"
+        )
+
+
+def render_txt(rows):
+    for speaker, text, start, end in rows:
+        minutes, seconds = divmod(int(start), 60)
+        yield f"[{minutes}:{seconds:02d}] {speaker}: {text}\n"
+
+
+class _ZipSink(io.RawIOBase):
+    # Несикабельный приемник: zipfile пишет data descriptors, а мы отдаем байты по мере записи
+
+    def __init__(self):
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+
+DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+DOCX_DOCUMENT_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+)
+
+DOCX_DOCUMENT_END = '<w:sectPr/></w:body></w:document>'
+
+
+def docx_paragraph(speaker, text, start):
+    minutes, seconds = divmod(int(start), 60)
+    label = escape(INVALID_XML_CHARS_RE.sub('', f"[{minutes}:{seconds:02d}] {speaker}: "))
+    body = escape(INVALID_XML_CHARS_RE.sub('', text))
+    return (
+        '<w:p>'
+        f'<w:r><w:rPr><w:b/></w:rPr><w:t xml:space="preserve">{label}</w:t></w:r>'
+        f'<w:r><w:t xml:space="preserve">{body}</w:t></w:r>'
+        '</w:p>'
+    )
+
+
+def render_docx(rows, flush_every=200):
+    """
+    Минимальный DOCX (Office Open XML), собирается в потоке: document.xml
+    пишется в zip по абзацам, готовые байты отдаются каждые flush_every реплик.
+    """
+    sink = _ZipSink()
+
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', DOCX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', DOCX_RELS)
+
+        with archive.open('word/document.xml', 'w', force_zip64=True) as document:
+            document.write(DOCX_DOCUMENT_START.encode())
+            for index, (speaker, text, start, end) in enumerate(rows, start=1):
+                document.write(docx_paragraph(speaker, text, start).encode())
+                if index % flush_every == 0:
+                    yield sink.drain()
+            document.write(DOCX_DOCUMENT_END.encode())
+
+    yield sink.drain()
+
+
+EXPORT_FORMATS = {
+    'srt': (render_srt, 'application/x-subrip; charset=utf-8', 'srt'),
+    'vtt': (render_vtt, 'text/vtt; charset=utf-8', 'vtt'),
+    'txt': (render_txt, 'text/plain; charset=utf-8', 'txt'),
+    'docx': (render_docx, 'application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'docx'),
+}
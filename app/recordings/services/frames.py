@@ -0,0 +1,65 @@
+"""
+Кадры пакетной загрузки чанков (POST /api/upload-chunks/{session_id}).
+
+Тело запроса — последовательность кадров без общего заголовка:
+
+    uint32 LE  chunk_number
+    uint32 LE  length
+    bytes      WAV-чанк длиной length
+
+Тело разбирается потоково: в памяти не больше одного блока чтения.
+"""
+import struct
+
+FRAME_HEADER = struct.Struct('<II')
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class FrameError(ValueError):
+    pass
+
+
+def read_exact(stream, size):
+    data = bytearray()
+    while len(data) < size:
+        block = stream.read(size - len(data))
+        if not block:
+            break
+        data += block
+    return bytes(data)
+
+
+def iter_payload(stream, size):
+    remaining = size
+    while remaining:
+        block = stream.read(min(READ_BLOCK_SIZE, remaining))
+        if not block:
+            raise FrameError(f"Body ended {remaining} bytes before the end of the frame")
+        remaining -= len(block)
+        yield block
+
+
+def iter_frames(stream, max_size):
+    """
+    Отдает (chunk_number, length, blocks). blocks — итератор по данным кадра;
+    если потребитель не дочитал его, остаток пропускается перед следующим кадром.
+    """
+    while True:
+        header = read_exact(stream, FRAME_HEADER.size)
+        if not header:
+            return
+        if len(header) < FRAME_HEADER.size:
+            raise FrameError("Body ended inside a frame header")
+
+        chunk_number, size = FRAME_HEADER.unpack(header)
+        if chunk_number < 1:
+            raise FrameError("chunk_number must be positive")
+        if size > max_size:
+            raise FrameError(f"Chunk {chunk_number} is {size} bytes, limit is {max_size}")
+
+        blocks = iter_payload(stream, size)
+        yield chunk_number, size, blocks
+
+        for _ in blocks:
+            pass
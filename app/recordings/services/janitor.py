@@ -0,0 +1,323 @@
+import time
+import uuid
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from app.recordings.models import AudioChunk, Session, Transcript
+from app.recordings.services.chunks import recover_unflushed_chunks
+from app.recordings.services.diarization_cache import remove_cache
+from app.recordings.services.search import clear_transcript_index
+from app.recordings.services.sessions import RESUMABLE_STATUSES, finish_recording
+from app.recordings.services.storage import get_storage, session_chunks_prefix
+
+logger = logging.getLogger(__name__)
+
+# Сессий на один запрос к БД при сверке каталогов
+SWEEP_BATCH_SIZE = 1000
+
+SWEEP_LOCK_KEY = 'media-sweep-lock'
+
+# Медиа этих сессий не трогаем: идет запись или обработка
+BUSY_STATUSES = ('active', 'interrupted', 'processing')
+
+MB = 1024 * 1024
+
+
+@dataclass
+class SweepReport:
+    dry_run: bool = False
+    reclaimed_bytes: dict = field(default_factory=lambda: defaultdict(int))
+    removed: dict = field(default_factory=lambda: defaultdict(int))
+    abandoned_sessions: int = 0
+    finished_sessions: int = 0
+    evicted_sessions: int = 0
+
+    def add(self, category, size):
+        self.reclaimed_bytes[category] += size
+        self.removed[category] += 1
+
+    @property
+    def total_bytes(self):
+        return sum(self.reclaimed_bytes.values())
+
+    def as_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'reclaimed_bytes': dict(self.reclaimed_bytes),
+            'removed': dict(self.removed),
+            'total_bytes': self.total_bytes,
+            'abandoned_sessions': self.abandoned_sessions,
+            'finished_sessions': self.finished_sessions,
+            'evicted_sessions': self.evicted_sessions,
+        }
+
+
+@dataclass
+class MediaEntry:
+    # path — имя объекта в хранилище, для каталога сессии — префикс ключей
+    path: str
+    size: int
+    mtime: float
+    is_dir: bool
+    session_id: uuid.UUID = None
+
+
+def parse_session_id(name):
+    try:
+        return uuid.UUID(name)
+    except ValueError:
+        return None
+
+
+def scan_session_dirs(storage, kind):
+    # "Каталоги" <kind>/<session_id>/: суммарный размер и время последней записи
+    # (каталоги сессий плоские, в S3 каталогов нет — группируем ключи по префиксу)
+    entries = {}
+    for name, size, mtime in storage.walk(f'{kind}/'):
+        parts = storage.key(name).split('/')
+        if len(parts) != 3:
+            continue
+
+        prefix = f'{kind}/{parts[1]}/'
+        entry = entries.get(prefix)
+        if entry is None:
+            entry = entries[prefix] = MediaEntry(prefix, 0, 0.0, True, parse_session_id(parts[1]))
+        entry.size += size
+        entry.mtime = max(entry.mtime, mtime)
+    return list(entries.values())
+
+
+def scan_files(storage, kind):
+    entries = []
+    for name, size, mtime in storage.walk(f'{kind}/'):
+        if storage.key(name).count('/') == 1:
+            entries.append(MediaEntry(name, size, mtime, False))
+    return entries
+
+
+def batched(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def remove_entry(storage, entry):
+    if entry.is_dir:
+        storage.delete_prefix(entry.path)
+    else:
+        storage.delete(entry.path)
+
+
+def purge_session(session):
+    """
+    Полное удаление записи: файлы (итоговый, чанки, кеш диаризации),
+    строки FTS5 и сама сессия с транскриптом, репликами и чанками (каскадом).
+    """
+    # delete() обнуляет pk, пути считаем заранее
+    session_id, audio_file = session.id, session.audio_file
+
+    with transaction.atomic():
+        transcript = Transcript.objects.filter(session=session).first()
+        if transcript:
+            clear_transcript_index(transcript)
+        session.delete()
+
+    # Аудио, чанки и кеш диаризации — в хранилище (локально или S3)
+    storage = get_storage()
+    if audio_file:
+        storage.delete(audio_file)
+    storage.delete_prefix(session_chunks_prefix(session_id))
+    remove_cache(session_id)
+
+
+class MediaJanitor:
+    """
+    Сверяет хранилище (локальное или S3) с состоянием Session и освобождает место:
+    каталоги чанков без сессии, чанки уже склеенных и давно упавших записей,
+    брошенные активные сессии, несвязанные итоговые файлы; затем выселяет
+    аудио самых старых записей сверх квот (на тенанта — ip_address — и общей).
+    Транскрипты при выселении сохраняются.
+    """
+
+    def __init__(self, dry_run=False, now=None):
+        self.report = SweepReport(dry_run=dry_run)
+        self.storage = get_storage()
+        self.now = now or time.time()
+        # session_id -> {'bytes', 'paths', 'ip_address', 'started_at', 'status'}
+        self.usage = {}
+        self.abandoned = []
+
+    def remove(self, entry, category):
+        if not self.report.dry_run:
+            remove_entry(self.storage, entry)
+        self.report.add(category, entry.size)
+
+    def account(self, session, entry):
+        usage = self.usage.setdefault(session['id'], {
+            'bytes': 0,
+            'paths': [],
+            'ip_address': session['ip_address'],
+            'started_at': session['started_at'],
+            'status': session['status'],
+        })
+        usage['bytes'] += entry.size
+        usage['paths'].append(entry)
+
+    def fetch_sessions(self, **lookup):
+        return Session.objects.filter(**lookup).values(
+            'id', 'status', 'ip_address', 'started_at', 'audio_file', 'processing_completed_at'
+        )
+
+    def sweep_session_dirs(self, kind):
+        entries = scan_session_dirs(self.storage, kind)
+
+        for batch in batched(entries, SWEEP_BATCH_SIZE):
+            ids = [entry.session_id for entry in batch if entry.session_id]
+            sessions = {session['id']: session for session in self.fetch_sessions(id__in=ids)}
+
+            for entry in batch:
+                session = sessions.get(entry.session_id)
+                age = self.now - entry.mtime
+
+                if session is None:
+                    if age > settings.MEDIA_ORPHAN_GRACE:
+                        self.remove(entry, f'orphan_{kind}')
+                    continue
+
+                if kind == 'chunks' and session['status'] != 'processing':
+                    if session['audio_file'] and session['processing_completed_at']:
+                        self.remove(entry, 'concatenated_chunks')
+                        continue
+                    if session['status'] == 'failed' and age > settings.MEDIA_FAILED_RETENTION:
+                        self.remove(entry, 'failed_chunks')
+                        continue
+                    if session['status'] in ('active', 'interrupted') and age > settings.MEDIA_ABANDONED_AFTER:
+                        self.abandoned.append(session['id'])
+
+                self.account(session, entry)
+
+    def sweep_recordings(self):
+        entries = scan_files(self.storage, 'recordings')
+
+        for batch in batched(entries, SWEEP_BATCH_SIZE):
+            paths = [entry.path for entry in batch]
+            sessions = {session['audio_file']: session for session in self.fetch_sessions(audio_file__in=paths)}
+
+            for entry in batch:
+                session = sessions.get(entry.path)
+                age = self.now - entry.mtime
+
+                if session is not None:
+                    self.account(session, entry)
+                elif entry.path.endswith('.part'):
+                    # Недописанный результат ffmpeg (archive_recording_task)
+                    if age > settings.MEDIA_ORPHAN_GRACE:
+                        self.remove(entry, 'partial_files')
+                elif age > settings.MEDIA_ORPHAN_RECORDING_GRACE:
+                    self.remove(entry, 'orphan_recordings')
+
+    def mark_abandoned(self):
+        """
+        Сессия без новых чанков дольше MEDIA_ABANDONED_AFTER: соединение потеряно
+        без finalize. Записанное обрабатывается как обычная запись, в failed
+        уходят только сессии без единого чанка.
+        """
+        if not self.abandoned:
+            return
+        self.report.abandoned_sessions = len(self.abandoned)
+        if self.report.dry_run:
+            return
+
+        for session in Session.objects.filter(id__in=self.abandoned, status__in=RESUMABLE_STATUSES):
+            recover_unflushed_chunks(session)
+
+            if AudioChunk.objects.filter(session=session).exists():
+                if finish_recording(session.id, session.resume_count):
+                    # Чанки нужны обработке: квоты их не выселяют
+                    self.usage[session.id]['status'] = 'processing'
+                    self.report.finished_sessions += 1
+                continue
+
+            failed = Session.objects.filter(
+                pk=session.pk, status__in=RESUMABLE_STATUSES, resume_count=session.resume_count
+            ).update(
+                status='failed',
+                ended_at=timezone.now(),
+                processing_error='Recording abandoned: no chunks received'
+            )
+            if failed:
+                self.usage[session.id]['status'] = 'failed'
+
+    def evict(self, session_id):
+        usage = self.usage.pop(session_id)
+        for entry in usage['paths']:
+            self.remove(entry, 'evicted')
+        self.report.evicted_sessions += 1
+        return usage['bytes']
+
+    def enforce_quota(self, session_ids, quota_bytes):
+        total = sum(self.usage[session_id]['bytes'] for session_id in session_ids)
+        evicted = []
+
+        # Самые старые записи выселяются первыми
+        for session_id in sorted(session_ids, key=lambda session_id: self.usage[session_id]['started_at']):
+            if total <= quota_bytes:
+                break
+            if self.usage[session_id]['status'] in BUSY_STATUSES:
+                continue
+            total -= self.evict(session_id)
+            evicted.append(session_id)
+
+        return evicted
+
+    def enforce_quotas(self):
+        evicted = []
+
+        if settings.MEDIA_TENANT_QUOTA_MB:
+            by_tenant = defaultdict(list)
+            for session_id, usage in self.usage.items():
+                if usage['ip_address']:
+                    by_tenant[usage['ip_address']].append(session_id)
+            for session_ids in by_tenant.values():
+                evicted += self.enforce_quota(session_ids, settings.MEDIA_TENANT_QUOTA_MB * MB)
+
+        if settings.MEDIA_GLOBAL_QUOTA_MB:
+            evicted += self.enforce_quota(list(self.usage), settings.MEDIA_GLOBAL_QUOTA_MB * MB)
+
+        if evicted and not self.report.dry_run:
+            Session.objects.filter(id__in=evicted).update(audio_file=None, file_size=0)
+
+    def run(self):
+        started_at = time.monotonic()
+
+        self.sweep_session_dirs('chunks')
+        self.sweep_session_dirs('diarization')
+        self.sweep_recordings()
+        self.mark_abandoned()
+        self.enforce_quotas()
+
+        logger.info(
+            f"Media sweep{' (dry run)' if self.report.dry_run else ''} finished in "
+            f"{time.monotonic() - started_at:.1f}s: reclaimed {self.report.total_bytes / MB:.1f} MB "
+            f"{dict(self.report.removed)}, abandoned {self.report.abandoned_sessions} "
+            f"(finished {self.report.finished_sessions}), "
+            f"evicted {self.report.evicted_sessions}"
+        )
+        return self.report
+
+
+def sweep_media(dry_run=False):
+    # Один проход за раз, даже если beat и команда запущены одновременно
+    if not cache.add(SWEEP_LOCK_KEY, 1, timeout=settings.MEDIA_SWEEP_INTERVAL):
+        logger.info("Media sweep already running, skipping")
+        return None
+
+    try:
+        return MediaJanitor(dry_run=dry_run).run()
+    finally:
+        cache.delete(SWEEP_LOCK_KEY)
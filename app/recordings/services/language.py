@@ -0,0 +1,106 @@
+import logging
+import subprocess
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Whisper работает с 16 кГц моно, окно распознавания — 30 секунд
+SAMPLE_RATE = 16000
+WINDOW_SECONDS = 30
+
+# VAD по энергии: кадры по 30 мс, речь — уверенно выше шумового фона
+VAD_FRAME_SECONDS = 0.03
+VAD_MIN_SPEECH_SECONDS = 0.3
+VAD_NOISE_PERCENTILE = 10
+VAD_NOISE_MARGIN_DB = 12.0
+VAD_MIN_LEVEL_DB = -45.0
+
+
+class LanguageDetectionError(Exception):
+    pass
+
+
+def load_audio_prefix(audio_path, seconds):
+    # Декодируем только начало записи, а не весь файл, как whisper.load_audio
+    command = [
+        'ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error',
+        '-t', str(seconds),
+        '-i', audio_path,
+        '-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE),
+        '-'
+    ]
+    try:
+        output = subprocess.run(command, check=True, capture_output=True).stdout
+    except FileNotFoundError:
+        raise LanguageDetectionError("ffmpeg not found in PATH")
+    except subprocess.CalledProcessError as e:
+        raise LanguageDetectionError(f"ffmpeg failed: {e.stderr.decode(errors='replace').strip()}")
+
+    return np.frombuffer(output, np.int16).astype(np.float32) / 32768.0
+
+
+def find_speech_start(audio, sample_rate=SAMPLE_RATE):
+    """
+    Начало первого участка речи (в сэмплах) по энергии кадров: порог —
+    шумовой фон записи плюс запас, речь — не короче VAD_MIN_SPEECH_SECONDS
+    подряд. Если речи не нашлось, возвращает 0.
+    """
+    frame = int(sample_rate * VAD_FRAME_SECONDS)
+    frames = len(audio) // frame
+    if not frames:
+        return 0
+
+    rms = np.sqrt(np.mean(audio[:frames * frame].reshape(frames, frame) ** 2, axis=1))
+    level_db = 20 * np.log10(np.maximum(rms, 1e-10))
+
+    threshold = max(np.percentile(level_db, VAD_NOISE_PERCENTILE) + VAD_NOISE_MARGIN_DB, VAD_MIN_LEVEL_DB)
+    voiced = level_db > threshold
+
+    # Первый кадр, с которого идет min_run голосовых кадров подряд
+    min_run = max(1, int(VAD_MIN_SPEECH_SECONDS / VAD_FRAME_SECONDS))
+    runs = np.convolve(voiced.astype(np.int32), np.ones(min_run, dtype=np.int32), mode='valid')
+    candidates = np.flatnonzero(runs == min_run)
+
+    return int(candidates[0]) * frame if len(candidates) else 0
+
+
+def speech_window(audio_path):
+    # Первые 30 секунд, начиная с первой речи (тишина и гудки в начале записи не мешают)
+    audio = load_audio_prefix(audio_path, settings.LANGUAGE_DETECTION_SCAN_SECONDS + WINDOW_SECONDS)
+    start = find_speech_start(audio[:settings.LANGUAGE_DETECTION_SCAN_SECONDS * SAMPLE_RATE])
+    logger.debug(f"Speech starts at {start / SAMPLE_RATE:.1f}s in {audio_path}")
+    return audio[start:start + WINDOW_SECONDS * SAMPLE_RATE]
+
+
+def resolve_session_language(session, detect):
+    """
+    Язык записи для Whisper. Результат определения кешируется на Session,
+    поэтому повторы задачи не запускают его заново. detect() возвращает
+    (код языка, вероятность); при неуверенном результате или ошибке
+    используется WHISPER_DEFAULT_LANGUAGE (после ошибки он не кешируется).
+    """
+    if session.language:
+        return session.language
+
+    language, probability = settings.WHISPER_DEFAULT_LANGUAGE, None
+    try:
+        detected, probability = detect()
+        if probability >= settings.LANGUAGE_DETECTION_MIN_PROBABILITY:
+            language = detected
+        else:
+            logger.info(f"Low confidence language detection ({detected}: {probability:.2f}), using default")
+    except Exception as e:
+        # Сбой может быть временным (ffmpeg, модель): язык по умолчанию не кешируем,
+        # чтобы повтор задачи определил его заново
+        logger.warning(f"Language detection failed for session {session.id}: {e}")
+        return settings.WHISPER_DEFAULT_LANGUAGE
+
+    session.language = language
+    session.language_probability = probability
+    session.save(update_fields=['language', 'language_probability'])
+
+    logger.info(f"Session {session.id} language: {language} (p={probability})")
+
+    return language
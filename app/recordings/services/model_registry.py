@@ -0,0 +1,135 @@
+"""
+Локальный реестр ML-моделей: версионированный каталог с весами Whisper и
+pyannote, собранный командой build_model_registry. Загрузка из реестра не
+обращается к HuggingFace Hub и не требует HF_TOKEN.
+
+    <MODEL_REGISTRY_DIR>/
+        CURRENT                 - имя активной версии
+        <version>/
+            manifest.json       - модели, ревизии, sha256 и размеры файлов
+            whisper/<name>.pt
+            pyannote/<repo>/... - снапшоты pipeline и его моделей
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import importlib
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'CURRENT'
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class ModelRegistryError(Exception):
+    pass
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def active_version(registry_dir):
+    if settings.MODEL_REGISTRY_VERSION:
+        return settings.MODEL_REGISTRY_VERSION
+
+    current_path = os.path.join(registry_dir, CURRENT_FILE)
+    if not os.path.exists(current_path):
+        return None
+    with open(current_path) as f:
+        return f.read().strip() or None
+
+
+class ModelRegistry:
+    def __init__(self, path):
+        self.path = path
+        self.version = os.path.basename(os.path.normpath(path))
+        # Время холодной загрузки каждой модели, секунды
+        self.load_times = {}
+
+        try:
+            with open(os.path.join(path, MANIFEST_FILE)) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ModelRegistryError(f"Invalid model registry {path}: {e}")
+
+    @classmethod
+    def active(cls):
+        # None, если реестр не собран: процессор грузит модели через Hub, как раньше
+        registry_dir = settings.MODEL_REGISTRY_DIR
+        version = active_version(registry_dir) if registry_dir else None
+        if not version:
+            return None
+
+        registry = cls(os.path.join(registry_dir, version))
+        registry.verify(full=settings.MODEL_REGISTRY_VERIFY)
+        return registry
+
+    def resolve(self, relpath):
+        return os.path.join(self.path, relpath)
+
+    def files(self):
+        for model in self.manifest['models'].values():
+            yield from model['files'].items()
+
+    def verify(self, full=False):
+        # Размеры проверяются всегда (дешево), sha256 — по запросу
+        for relpath, info in self.files():
+            path = self.resolve(relpath)
+            if not os.path.exists(path):
+                raise ModelRegistryError(f"Missing registry file: {relpath}")
+            if os.path.getsize(path) != info['size']:
+                raise ModelRegistryError(f"Size mismatch for {relpath}")
+            if full and file_sha256(path) != info['sha256']:
+                raise ModelRegistryError(f"Checksum mismatch for {relpath}")
+
+    def _timed(self, name, loader):
+        started_at = time.perf_counter()
+        model = loader()
+        self.load_times[name] = time.perf_counter() - started_at
+        logger.info(f"⏱️  {name} loaded from registry in {self.load_times[name]:.2f}s")
+        return model
+
+    def load_whisper(self, device):
+        import whisper
+
+        checkpoint = self.resolve(self.manifest['models']['whisper']['checkpoint'])
+        return self._timed('whisper', lambda: whisper.load_model(checkpoint, device=device))
+
+    def load_diarization(self):
+        """
+        Собирает pipeline из config.yaml снапшота, подставляя локальные пути
+        к моделям сегментации и эмбеддингов вместо идентификаторов Hub.
+        """
+        # Все чекпоинты — локальные пути, pyannote читает их с диска без Hub.
+        # Запретить Hub целиком — HF_HUB_OFFLINE=1 в окружении воркера:
+        # huggingface_hub читает его один раз при импорте, из кода уже поздно
+        import yaml
+
+        model = self.manifest['models']['diarization']
+        with open(self.resolve(model['config'])) as f:
+            config = yaml.safe_load(f)
+
+        def build():
+            module_name, class_name = config['pipeline']['name'].rsplit('.', 1)
+            pipeline_class = getattr(importlib.import_module(module_name), class_name)
+
+            params = dict(config['pipeline'].get('params', {}))
+            for param, relpath in model['checkpoints'].items():
+                params[param] = self.resolve(relpath)
+
+            pipeline = pipeline_class(**params)
+            pipeline.instantiate(config['params'])
+            return pipeline
+
+        return self._timed('diarization', build)
@@ -0,0 +1,345 @@
+"""
+Декларативное range-партиционирование по времени (только PostgreSQL).
+
+recordings_audiochunk (по received_at) и recordings_utterance (по created_at)
+разбиваются на месячные секции <table>_pYYYYMM плюс <table>_default для строк
+вне созданных диапазонов. Старые секции удаляются целиком через
+DETACH + DROP вместо DELETE, поэтому очистка не зависит от размера таблицы
+и не оставляет мертвых строк для vacuum.
+
+Ограничение Postgres: первичный ключ и уникальные ограничения должны
+включать ключ партиционирования, поэтому после конвертации PK становится
+(id, received_at), а unique (session_id, chunk_number) — (session_id,
+chunk_number, received_at). Для Django pk остается id.
+
+Конвертацию выполняет миграция 0013 при DB_PARTITIONING=True (или позже
+manage_partitions --convert). На SQLite все функции ничего не делают.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection as default_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Таблица -> колонка-ключ партиционирования
+PARTITIONED_TABLES = {
+    'recordings_audiochunk': 'received_at',
+    'recordings_utterance': 'created_at',
+}
+
+PARTITION_NAME_RE = re.compile(r'_p(\d{4})(\d{2})$')
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    month: datetime | None  # None для default-секции
+
+    @property
+    def upper_bound(self):
+        return add_months(self.month, 1) if self.month else None
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def month_start(value):
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_supported(connection=None):
+    connection = connection or default_connection
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned(table, connection=None):
+    connection = connection or default_connection
+    if not is_supported(connection):
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def list_partitions(table, connection=None):
+    connection = connection or default_connection
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname",
+            [table]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME_RE.search(name)
+        month = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc) if match else None
+        partitions.append(Partition(name=name, month=month))
+    return partitions
+
+
+def create_partition(cursor, table, month):
+    name = partition_name(table, month)
+    # DDL не принимает параметры запроса - границы подставляются литералами
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+    return name
+
+
+def ensure_partitions(table, months_ahead=None, now=None, connection=None):
+    """
+    Создает секции с текущего месяца на months_ahead вперед.
+    Возвращает имена созданных секций (уже существующие пропускаются).
+    """
+    connection = connection or default_connection
+    if months_ahead is None:
+        months_ahead = settings.PARTITION_PREMAKE_MONTHS
+
+    current = month_start(now or datetime.now(dt_timezone.utc))
+    existing = {p.name for p in list_partitions(table, connection)}
+
+    created = []
+    with connection.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if partition_name(table, month) in existing:
+                continue
+            created.append(create_partition(cursor, table, month))
+
+    for name in created:
+        logger.info(f"Created partition {name}")
+    return created
+
+
+def retention_months(table):
+    return {
+        'recordings_audiochunk': settings.AUDIO_CHUNK_RETENTION_MONTHS,
+        'recordings_utterance': settings.UTTERANCE_RETENTION_MONTHS,
+    }[table]
+
+
+def expired_partitions(table, retention, now=None, connection=None):
+    # Секции, целиком лежащие раньше чем retention месяцев назад
+    if not retention:
+        return []
+
+    cutoff = add_months(month_start(now or datetime.now(dt_timezone.utc)), -retention)
+    return [
+        p for p in list_partitions(table, connection)
+        if p.month is not None and p.upper_bound <= cutoff
+    ]
+
+
+def remove_partition(table, name, drop=True, connection=None):
+    # DETACH + DROP: O(1) по объему данных, в отличие от DELETE
+    connection = connection or default_connection
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+        if drop:
+            cursor.execute(f'DROP TABLE "{name}"')
+
+    logger.info(f"{'Dropped' if drop else 'Detached'} partition {name}")
+
+
+def _table_layout(cursor, table):
+    # Индексы, не принадлежащие ограничениям, и сами ограничения (PK, unique, FK)
+    cursor.execute(
+        "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x "
+        "JOIN pg_class i ON i.oid = x.indexrelid "
+        "WHERE x.indrelid = to_regclass(%s) "
+        "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)",
+        [table]
+    )
+    indexes = cursor.fetchall()
+
+    cursor.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u', 'f') "
+        "ORDER BY contype DESC, conname",
+        [table]
+    )
+    constraints = cursor.fetchall()
+
+    return indexes, constraints
+
+
+def _sequence_columns(cursor, table):
+    # Автоинкрементные колонки (identity или serial/nextval): LIKE не переносит
+    # identity, а последовательность удаляется вместе со старой таблицей
+    cursor.execute(
+        "SELECT a.attname FROM pg_attribute a "
+        "LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum "
+        "WHERE a.attrelid = to_regclass(%s) AND a.attnum > 0 AND NOT a.attisdropped "
+        "AND (a.attidentity <> '' OR pg_get_expr(d.adbin, d.adrelid) LIKE 'nextval(%%')",
+        [table]
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _drop_sequence_defaults(cursor, table, columns):
+    # Скопированный LIKE default nextval() ссылается на последовательность старой таблицы
+    for column in columns:
+        cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN "{column}" DROP DEFAULT')
+
+
+def _restore_sequences(cursor, table, columns):
+    # Identity на партиционированной таблице Postgres до 17 не поддерживает:
+    # собственная последовательность + DEFAULT nextval, продолженная с max()
+    for column in columns:
+        sequence = f"{table}_{column}_seq"
+        cursor.execute(f'CREATE SEQUENCE "{sequence}" OWNED BY "{table}"."{column}"')
+        cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN "{column}" SET DEFAULT nextval(\'"{sequence}"\')')
+        cursor.execute(
+            f'SELECT setval(\'"{sequence}"\', COALESCE(max("{column}"), 0) + 1, false) FROM "{table}"'
+        )
+
+
+def _with_partition_key(definition, column):
+    # "PRIMARY KEY (id)" -> "PRIMARY KEY (id, received_at)"
+    head, _, columns = definition.partition('(')
+    columns = columns.rsplit(')', 1)[0]
+    if column in [c.strip().strip('"') for c in columns.split(',')]:
+        return definition
+    return f"{head}({columns}, {column})"
+
+
+def _copy_layout(cursor, source, target, indexes, constraints, column=None):
+    for name, definition in indexes:
+        cursor.execute(f'DROP INDEX "{name}"')
+        definition = re.sub(rf' ON (ONLY )?(\S+\.)?"?{source}"? ', f' ON "{target}" ', definition, count=1)
+        cursor.execute(definition)
+
+    for name, kind, definition in constraints:
+        cursor.execute(f'ALTER TABLE "{source}" DROP CONSTRAINT IF EXISTS "{name}"')
+        if column and kind in ('p', 'u'):
+            definition = _with_partition_key(definition, column)
+        cursor.execute(f'ALTER TABLE "{target}" ADD CONSTRAINT "{name}" {definition}')
+
+
+def partition_table(table, column, months_ahead=None, now=None, connection=None):
+    """
+    Превращает обычную таблицу в партиционированную по column.
+
+    Данные копируются в новую таблицу (одна транзакция, блокирует запись —
+    запускать в окно обслуживания), индексы и ограничения переносятся с теми
+    же именами, чтобы дальнейшие миграции Django находили их.
+    """
+    connection = connection or default_connection
+    if not is_supported(connection) or is_partitioned(table, connection):
+        return False
+
+    legacy = f"{table}_unpartitioned"
+    current = month_start(now or datetime.now(dt_timezone.utc))
+    if months_ahead is None:
+        months_ahead = settings.PARTITION_PREMAKE_MONTHS
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{table}" IN ACCESS EXCLUSIVE MODE')
+        indexes, constraints = _table_layout(cursor, table)
+        sequence_columns = _sequence_columns(cursor, table)
+
+        cursor.execute(f'SELECT min("{column}") FROM "{table}"')
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+        cursor.execute(
+            f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING STORAGE) '
+            f'PARTITION BY RANGE ("{column}")'
+        )
+        _drop_sequence_defaults(cursor, table, sequence_columns)
+        cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+        month = month_start(oldest) if oldest else current
+        last = add_months(current, months_ahead)
+        while month <= last:
+            create_partition(cursor, table, month)
+            month = add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+        _copy_layout(cursor, legacy, table, indexes, constraints, column)
+        cursor.execute(f'DROP TABLE "{legacy}"')
+        _restore_sequences(cursor, table, sequence_columns)
+
+    logger.info(f"Partitioned {table} by {column}")
+    return True
+
+
+def unpartition_table(table, connection=None):
+    # Обратная операция (для отката миграции): все секции сливаются в обычную таблицу
+    connection = connection or default_connection
+    if not is_partitioned(table, connection):
+        return False
+
+    column = PARTITIONED_TABLES.get(table)
+    legacy = f"{table}_partitioned"
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{table}" IN ACCESS EXCLUSIVE MODE')
+        indexes, constraints = _table_layout(cursor, table)
+        # Ключ партиционирования из PK/unique убирается обратно
+        constraints = [
+            (name, kind, _without_column(definition, column) if kind in ('p', 'u') else definition)
+            for name, kind, definition in constraints
+        ]
+        sequence_columns = _sequence_columns(cursor, table)
+
+        cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+        cursor.execute(f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING STORAGE)')
+        _drop_sequence_defaults(cursor, table, sequence_columns)
+        cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+        _copy_layout(cursor, legacy, table, indexes, constraints)
+        cursor.execute(f'DROP TABLE "{legacy}" CASCADE')
+        _restore_sequences(cursor, table, sequence_columns)
+
+    logger.info(f"Converted {table} back to a regular table")
+    return True
+
+
+def _without_column(definition, column):
+    head, _, columns = definition.partition('(')
+    columns = [c.strip() for c in columns.rsplit(')', 1)[0].split(',')]
+    columns = [c for c in columns if c.strip('"') != column]
+    return f"{head}({', '.join(columns)})"
+
+
+def maintain_partitions(drop=True, now=None, connection=None):
+    """
+    Создает будущие секции и убирает секции старше срока хранения
+    (AUDIO_CHUNK_RETENTION_MONTHS / UTTERANCE_RETENTION_MONTHS, 0 — хранить).
+    Возвращает {table: {'created': [...], 'removed': [...]}}.
+    """
+    connection = connection or default_connection
+
+    report = {}
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(table, connection):
+            continue
+
+        created = ensure_partitions(table, now=now, connection=connection)
+        removed = []
+        for partition in expired_partitions(table, retention_months(table), now=now, connection=connection):
+            remove_partition(table, partition.name, drop=drop, connection=connection)
+            removed.append(partition.name)
+
+        report[table] = {'created': created, 'removed': removed}
+
+    return report
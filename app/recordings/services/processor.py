@@ -1,18 +1,26 @@
 import os
+import time
+import inspect
 import logging
-import torch
-import whisper
-from pyannote.audio import Pipeline
 import warnings
-from tqdm import tqdm
+from contextlib import nullcontext
+
+from app.recordings.services.diarization_cache import DiarizationCapture, load_diarization
+from app.recordings.services.language import speech_window
+from app.recordings.services.model_registry import ModelRegistry
+from app.recordings.services.whisper_progress import whisper_progress
 
 warnings.filterwarnings("ignore")
 
 logger = logging.getLogger(__name__)
 
 
+# torch, whisper и pyannote.audio импортируются только внутри MLProcessor:
+# модуль безопасно импортировать из web/ASGI-процессов (см. check_import_budget)
 class MLProcessor:
     def _setup_devices(self):
+        import torch
+
         logger.info("🔧 Настройка устройств для обработки...")
         logger.info(f"   CUDA доступен: {torch.cuda.is_available()}")
         logger.info(f"   MPS доступен: {torch.backends.mps.is_available()}")
@@ -52,6 +60,45 @@ class MLProcessor:
         # Настройка устройств
         self._setup_devices()
 
+        # Время холодной загрузки моделей, секунды
+        self.load_times = {}
+
+        # Локальный реестр моделей (manage.py build_model_registry): старт без HuggingFace Hub
+        self.model_registry = ModelRegistry.active()
+        if self.model_registry:
+            self._load_from_registry()
+        else:
+            self._load_from_hub()
+
+        logger.info("")
+        logger.info("=" * 70)
+        logger.info("✨ ML Processor ready!")
+        for name, seconds in self.load_times.items():
+            logger.info(f"⏱️  {name}: {seconds:.2f}s")
+        logger.info("=" * 70)
+
+    def _load_from_registry(self):
+        registry = self.model_registry
+        logger.info(f"📦 Model registry: {registry.path} (offline)")
+
+        self.whisper_model = registry.load_whisper(device=self.device)
+        logger.info("✅ Whisper model loaded successfully")
+
+        try:
+            self.diarization_pipeline = registry.load_diarization()
+            self._move_diarization_to_device()
+            logger.info("✅ Diarization готова к использованию")
+        except Exception as e:
+            logger.error(f"Ошибка загрузки pyannote из реестра: {e}", exc_info=True)
+            logger.warning("⚠️  Diarization будет отключена")
+            self.diarization_pipeline = None
+
+        self.load_times.update(registry.load_times)
+
+    def _load_from_hub(self):
+        import whisper
+        from pyannote.audio import Pipeline
+
         # Информация о кешировании
         cache_dir = os.path.expanduser("~/.cache")
         whisper_cache = os.path.join(cache_dir, "whisper")
@@ -71,7 +118,9 @@ class MLProcessor:
             logger.info("⏬ Downloading Whisper model... (~150MB)")
             logger.info("💡 Tip: Model will be cached for future use")
 
+        started_at = time.perf_counter()
         self.whisper_model = whisper.load_model("base", device=self.device)
+        self.load_times['whisper'] = time.perf_counter() - started_at
         logger.info("✅ Whisper model loaded successfully")
 
         # Загружаем pyannote модель для диаризации
@@ -98,6 +147,7 @@ class MLProcessor:
             else:
                 # Загружаем модель
                 logger.info("⏬ Загрузка модели pyannote/speaker-diarization-3.1...")
+                started_at = time.perf_counter()
                 try:
                     self.diarization_pipeline = Pipeline.from_pretrained(
                         "pyannote/speaker-diarization-3.1",
@@ -117,26 +167,8 @@ class MLProcessor:
                         logger.error(f"Ошибка загрузки альтернативной модели: {alt_error}")
                         raise download_error
 
-                # КРИТИЧНО: Переносим pipeline на устройство с fallback
-                if self.torch_device != "cpu":
-                    try:
-                        logger.info(f"Переносим diarization на {self.torch_device.upper()}...")
-                        self.diarization_pipeline = self.diarization_pipeline.to(
-                            torch.device(self.torch_device)
-                        )
-                        logger.info(f"✅ Diarization загружена на {self.torch_device.upper()}")
-                    except Exception as e:
-                        logger.warning(f"⚠️  Не удалось переместить на {self.torch_device}: {e}")
-                        logger.info("Используем CPU вместо этого...")
-                        self.diarization_pipeline = self.diarization_pipeline.to(
-                            torch.device("cpu")
-                        )
-                        logger.info("✅ Diarization загружена на CPU")
-                else:
-                    self.diarization_pipeline = self.diarization_pipeline.to(
-                        torch.device("cpu")
-                    )
-                    logger.info("✅ Diarization загружена на CPU")
+                self._move_diarization_to_device()
+                self.load_times['diarization'] = time.perf_counter() - started_at
 
                 logger.info("✅ Diarization готова к использованию")
 
@@ -148,25 +180,66 @@ class MLProcessor:
             logger.warning("⚠️  Diarization будет отключена")
             self.diarization_pipeline = None
 
-        logger.info("")
-        logger.info("=" * 70)
-        logger.info("✨ ML Processor ready!")
-        logger.info("=" * 70)
+    def _move_diarization_to_device(self):
+        import torch
+
+        # КРИТИЧНО: Переносим pipeline на устройство с fallback
+        if self.torch_device != "cpu":
+            try:
+                logger.info(f"Переносим diarization на {self.torch_device.upper()}...")
+                self.diarization_pipeline = self.diarization_pipeline.to(
+                    torch.device(self.torch_device)
+                )
+                logger.info(f"✅ Diarization загружена на {self.torch_device.upper()}")
+            except Exception as e:
+                logger.warning(f"⚠️  Не удалось переместить на {self.torch_device}: {e}")
+                logger.info("Используем CPU вместо этого...")
+                self.diarization_pipeline = self.diarization_pipeline.to(
+                    torch.device("cpu")
+                )
+                logger.info("✅ Diarization загружена на CPU")
+        else:
+            self.diarization_pipeline = self.diarization_pipeline.to(
+                torch.device("cpu")
+            )
+            logger.info("✅ Diarization загружена на CPU")
+
+    def detect_language(self, audio_path):
+        # Language ID по одному 30-секундному окну с речью: (код языка, вероятность)
+        import torch
+        import whisper
+
+        window = speech_window(audio_path)
+        mel = whisper.log_mel_spectrogram(
+            whisper.pad_or_trim(torch.from_numpy(window)),
+            self.whisper_model.dims.n_mels
+        ).to(self.whisper_model.device)
+
+        _, probs = self.whisper_model.detect_language(mel)
+        language = max(probs, key=probs.get)
+
+        logger.info(f"Detected language: {language} ({probs[language]:.2f})")
 
-    def transcribe_audio(self, audio_path, language='ru'):
+        return language, probs[language]
+
+    def transcribe_audio(self, audio_path, language='ru', progress_callback=None):
         logger.info(f"Transcribing audio: {audio_path}")
 
         try:
+            # Прогресс по 30-секундным окнам (см. whisper_progress)
+            hook = whisper_progress(self.whisper_model, progress_callback) if progress_callback else nullcontext()
+
             # Распознаем речь
             # fp16=False критично для стабильности на ARM64 Mac
-            result = self.whisper_model.transcribe(
-                audio_path,
-                language=language,
-                task='transcribe',
-                verbose=False,
-                word_timestamps=True,  # Получаем временные метки для слов
-                fp16=False  # Отключаем fp16 для совместимости с ARM64
-            )
+            with hook:
+                result = self.whisper_model.transcribe(
+                    audio_path,
+                    language=language,
+                    task='transcribe',
+                    verbose=False,
+                    word_timestamps=True,  # Получаем временные метки для слов
+                    fp16=False  # Отключаем fp16 для совместимости с ARM64
+                )
 
             logger.info("Transcription completed successfully")
             logger.info(f"Detected language: {result['language']}")
@@ -179,36 +252,117 @@ class MLProcessor:
             logger.error(f"Transcription error: {e}")
             raise
 
-    def diarize_audio(self, audio_path):
+    def diarize_audio(self, audio_path, return_embeddings=False, cache_session_id=None, **speaker_hints):
+        # return_embeddings=True: возвращает (segments, {метка спикера: эмбеддинг})
+        # cache_session_id: сохранить сегментацию и эмбеддинги для recluster_audio
+        # speaker_hints: num_speakers / min_speakers / max_speakers — сужают перебор числа кластеров
         if not self.diarization_pipeline:
             logger.warning("Diarization pipeline not available, skipping")
-            return []
+            return ([], {}) if return_embeddings else []
 
-        logger.info(f"Diarizing audio: {audio_path}")
+        logger.info(f"Diarizing audio: {audio_path} (hints: {speaker_hints or 'none'})")
 
         try:
+            # Запасной pipeline 2.x (pyannote/speaker-diarization) не принимает
+            # return_embeddings/hook: без них — без эмбеддингов и кеша для recluster
+            supports_embeddings = self._pipeline_accepts('return_embeddings')
+            capture = DiarizationCapture() if cache_session_id and self._pipeline_accepts('hook') else None
+
+            options = dict(speaker_hints)
+            if supports_embeddings:
+                options['return_embeddings'] = True
+            if capture:
+                options['hook'] = capture
+
             # Запускаем диаризацию
-            diarization = self.diarization_pipeline(audio_path)
-
-            # Преобразуем результат в список
-            segments = []
-            for turn, _, speaker in diarization.itertracks(yield_label=True):
-                segments.append({
-                    'start': turn.start,
-                    'end': turn.end,
-                    'speaker': speaker
-                })
+            result = self.diarization_pipeline(audio_path, **options)
+            diarization, embeddings = result if supports_embeddings else (result, None)
 
-            logger.info("Diarization completed successfully")
-            logger.info(f"Found {len(set(s['speaker'] for s in segments))} speakers")
-            logger.info(f"Total segments: {len(segments)}")
+            if capture:
+                segmentation = getattr(self.diarization_pipeline, 'segmentation', None)
+                capture.save(cache_session_id, getattr(segmentation, 'threshold', None))
 
-            return segments
+            segments, speaker_embeddings = self._diarization_result(diarization, embeddings)
+            return (segments, speaker_embeddings) if return_embeddings else segments
 
         except Exception as e:
             logger.error(f"Diarization error: {e}")
             # Не падаем, просто возвращаем пустой список
-            return []
+            return ([], {}) if return_embeddings else []
+
+    def _pipeline_accepts(self, argument):
+        try:
+            return argument in inspect.signature(self.diarization_pipeline.apply).parameters
+        except (AttributeError, TypeError, ValueError):
+            return False
+
+    def recluster_audio(self, session_id, clustering_threshold=None, **speaker_hints):
+        """
+        Повторная кластеризация по сохраненным сегментации и эмбеддингам
+        (см. diarize_audio(cache_session_id=...)): нейросети не запускаются,
+        пересчитываются только кластеры. speaker_hints — num_speakers,
+        min_speakers, max_speakers. Возвращает (segments, embeddings).
+        """
+        if not self.diarization_pipeline:
+            raise RuntimeError("Diarization pipeline not available")
+
+        import torch
+
+        segmentations, embeddings, meta = load_diarization(session_id)
+
+        # Ключи кеша, которые SpeakerDiarization читает в режиме обучения. Аудио
+        # в этом режиме не читается: вместо записи — пустая волна-заглушка,
+        # чтобы не скачивать файл из хранилища
+        file = {
+            'uri': str(session_id),
+            'waveform': torch.zeros(1, 1),
+            'sample_rate': 16000,
+            'training_cache/segmentation': segmentations,
+            'training_cache/embeddings': {
+                'segmentation.threshold': meta['segmentation_threshold'],
+                'embeddings': embeddings,
+            },
+        }
+
+        pipeline = self.diarization_pipeline
+        original_parameters = pipeline.parameters(instantiated=True)
+
+        try:
+            if clustering_threshold is not None:
+                pipeline.instantiate({
+                    **original_parameters,
+                    'clustering': {**original_parameters['clustering'], 'threshold': clustering_threshold},
+                })
+            pipeline.training = True
+
+            logger.info(f"Reclustering session {session_id}: threshold={clustering_threshold}, hints={speaker_hints}")
+            diarization, speaker_embeddings = pipeline(file, return_embeddings=True, **speaker_hints)
+
+        finally:
+            pipeline.training = False
+            if clustering_threshold is not None:
+                pipeline.instantiate(original_parameters)
+
+        return self._diarization_result(diarization, speaker_embeddings)
+
+    def _diarization_result(self, diarization, embeddings):
+        # Преобразуем результат в список
+        segments = []
+        for turn, _, speaker in diarization.itertracks(yield_label=True):
+            segments.append({
+                'start': turn.start,
+                'end': turn.end,
+                'speaker': speaker
+            })
+
+        # Строки embeddings идут в порядке diarization.labels()
+        speaker_embeddings = dict(zip(diarization.labels(), embeddings)) if embeddings is not None else {}
+
+        logger.info("Diarization completed successfully")
+        logger.info(f"Found {len(set(s['speaker'] for s in segments))} speakers")
+        logger.info(f"Total segments: {len(segments)}")
+
+        return segments, speaker_embeddings
 
     def merge_transcription_and_diarization(self, transcription, diarization):
         logger.info("Merging transcription and diarization...")
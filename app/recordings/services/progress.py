@@ -0,0 +1,70 @@
+import time
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from app.recordings.models import Session
+
+logger = logging.getLogger(__name__)
+
+# Минимальный интервал между сообщениями внутри одного этапа, сек
+PUBLISH_INTERVAL = 1.0
+
+
+def session_group_name(session_id):
+    return f"session_{session_id}"
+
+
+class ProgressReporter:
+    """
+    Публикует прогресс обработки сессии в группу channel layer
+    (её слушает StatusConsumer) и сохраняет текущий этап в Session.
+
+    В БД пишем только смену этапа, в канал - не чаще PUBLISH_INTERVAL,
+    кроме смены этапа и финальных сообщений.
+    """
+
+    def __init__(self, session_id):
+        self.session_id = str(session_id)
+        self.started_at = time.monotonic()
+        self.stage = None
+        self.last_published_at = 0.0
+        self.channel_layer = get_channel_layer()
+
+    def eta(self, percent):
+        if percent <= 0 or percent >= 100:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        return round(elapsed * (100 - percent) / percent, 1)
+
+    def publish(self, stage, percent, **extra):
+        percent = round(min(max(percent, 0.0), 100.0), 1)
+        stage_changed = stage != self.stage
+        now = time.monotonic()
+
+        if stage_changed:
+            self.stage = stage
+            Session.objects.filter(pk=self.session_id).update(
+                processing_stage=stage,
+                processing_progress=percent
+            )
+        elif now - self.last_published_at < PUBLISH_INTERVAL:
+            return
+
+        self.last_published_at = now
+
+        message = {
+            'type': 'processing.progress',
+            'session_id': self.session_id,
+            'stage': stage,
+            'percent': percent,
+            'eta': self.eta(percent),
+            **extra,
+        }
+
+        try:
+            async_to_sync(self.channel_layer.group_send)(session_group_name(self.session_id), message)
+        except Exception as e:
+            # Прогресс вспомогательный - обработка не должна падать из-за Redis
+            logger.warning(f"Could not publish progress for session {self.session_id}: {e}")
@@ -0,0 +1,73 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from app.recordings.models import Session
+
+logger = logging.getLogger(__name__)
+
+RTF_CACHE_KEY = 'processing:rtf'
+
+# Вес нового замера в скользящем среднем RTF
+RTF_SMOOTHING = 0.3
+
+
+def recent_rtf():
+    # Реальный RTF воркеров (время обработки / длительность аудио), EWMA по последним задачам
+    return cache.get(RTF_CACHE_KEY) or settings.PROCESSING_DEFAULT_RTF
+
+
+def record_rtf(audio_seconds, processing_seconds):
+    if audio_seconds <= 0:
+        return
+
+    rtf = processing_seconds / audio_seconds
+    previous = cache.get(RTF_CACHE_KEY)
+    smoothed = rtf if previous is None else previous + RTF_SMOOTHING * (rtf - previous)
+    cache.set(RTF_CACHE_KEY, smoothed, timeout=None)
+
+    logger.info(f"Processing RTF: {rtf:.3f} (smoothed: {smoothed:.3f})")
+
+
+def estimate_time_limits(duration):
+    """
+    Возвращает (soft, hard) лимиты в секундах для обработки аудио длительностью duration:
+    накладные расходы (загрузка моделей, склейка) + duration * RTF с запасом.
+    """
+    expected = settings.PROCESSING_OVERHEAD + duration * recent_rtf()
+    soft = max(int(expected * settings.PROCESSING_TIME_LIMIT_MARGIN), settings.PROCESSING_MIN_TIME_LIMIT)
+    hard = soft + settings.PROCESSING_HARD_LIMIT_GRACE
+    return soft, hard
+
+
+def dispatch_processing(session_id, force_long=False):
+    """
+    Ставит process_audio_task в очередь с лимитами по длительности записи.
+    Задачи, которые не укладываются в лимит обычной очереди, уходят в
+    очередь длинных задач вместо того, чтобы падать по таймауту и ретраиться.
+    """
+    from app.recordings.tasks.processing import process_audio_task
+
+    duration = Session.objects.filter(id=session_id).values_list('total_duration', flat=True).first() or 0.0
+    soft, hard = estimate_time_limits(duration)
+
+    if force_long or hard > settings.PROCESSING_MAX_TIME_LIMIT:
+        queue = settings.PROCESSING_LONG_QUEUE
+        # В длинной очереди минимум - лимит обычной очереди, иначе эскалация бессмысленна
+        soft = min(max(soft * 2 if force_long else soft, settings.PROCESSING_MAX_TIME_LIMIT), settings.PROCESSING_LONG_MAX_TIME_LIMIT)
+        hard = soft + settings.PROCESSING_HARD_LIMIT_GRACE
+    else:
+        queue = settings.PROCESSING_QUEUE
+
+    logger.info(
+        f"Dispatching session {session_id}: {duration:.1f}s audio, RTF {recent_rtf():.3f}, "
+        f"limits {soft}/{hard}s, queue '{queue}'"
+    )
+
+    return process_audio_task.apply_async(
+        args=[str(session_id)],
+        queue=queue,
+        soft_time_limit=soft,
+        time_limit=hard
+    )
@@ -0,0 +1,117 @@
+import logging
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Value
+from django.db.models.expressions import RawSQL
+
+from app.recordings.models import Utterance
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'recordings_utterance_fts'
+
+# Язык транскрипта -> конфигурация текстового поиска Postgres
+SEARCH_CONFIGS = {
+    'ru': 'russian',
+    'en': 'english',
+    'de': 'german',
+    'fr': 'french',
+    'es': 'spanish',
+    'it': 'italian',
+    'pt': 'portuguese',
+    'nl': 'dutch',
+}
+
+
+def search_config(language):
+    return SEARCH_CONFIGS.get(language, 'simple')
+
+
+def fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def fts5_query(query):
+    # Каждое слово в кавычках: пользовательский ввод не интерпретируется как синтаксис FTS5
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+def index_transcript(transcript):
+    """
+    Обновляет полнотекстовый индекс для реплик транскрипта:
+    tsvector (стемминг по языку + 'simple' для точных слов) в Postgres,
+    FTS5-таблица в SQLite.
+    """
+    if connection.vendor == 'postgresql':
+        Utterance.objects.filter(transcript=transcript).update(
+            search_vector=(
+                SearchVector('text', config=Value(search_config(transcript.language)))
+                + SearchVector('text', config=Value('simple'))
+            )
+        )
+
+    elif fts5_available():
+        utterance_table = Utterance._meta.db_table
+        transcript_id = Utterance._meta.get_field('transcript').get_db_prep_value(transcript.pk, connection)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE utterance_id IN "
+                f"(SELECT id FROM {utterance_table} WHERE transcript_id = %s)",
+                [transcript_id]
+            )
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (text, utterance_id) "
+                f"SELECT text, id FROM {utterance_table} WHERE transcript_id = %s",
+                [transcript_id]
+            )
+
+    else:
+        return
+
+    logger.info(f"Search index updated for transcript {transcript.pk}")
+
+
+def clear_transcript_index(transcript):
+    # Перед удалением реплик: строки FTS5 не удаляются каскадом (в Postgres tsvector хранится в самой строке)
+    if connection.vendor != 'postgresql' and fts5_available():
+        utterance_table = Utterance._meta.db_table
+        transcript_id = Utterance._meta.get_field('transcript').get_db_prep_value(transcript.pk, connection)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE utterance_id IN "
+                f"(SELECT id FROM {utterance_table} WHERE transcript_id = %s)",
+                [transcript_id]
+            )
+
+
+def filter_utterances(queryset, query, language=None):
+    """
+    Ограничивает queryset реплик совпадениями с запросом и добавляет
+    аннотацию rank (больше - релевантнее).
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, config=search_config(language), search_type='websearch')
+        return (
+            queryset
+            .filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+        )
+
+    if fts5_available():
+        match = fts5_query(query)
+        utterance_table = Utterance._meta.db_table
+        return (
+            queryset
+            .filter(id__in=RawSQL(f"SELECT utterance_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+            .annotate(rank=RawSQL(
+                f"(SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND utterance_id = {utterance_table}.id)",
+                [match]
+            ))
+        )
+
+    # Без индекса: последовательный поиск, только для нестандартных БД
+    return queryset.filter(text__icontains=query).annotate(rank=Value(0.0))
@@ -0,0 +1,140 @@
+"""
+Жизненный цикл записи через WebSocket с возобновлением после обрыва.
+
+Клиент получает resume_token в session_started и при переподключении
+передает ?session_id=&token=&last_chunk=. Обрыв (код != 1000) переводит
+сессию в 'interrupted' и откладывает обработку на SESSION_RESUME_GRACE
+секунд; явное сообщение 'stop' или истечение grace-периода запускают
+обработку. resume_count служит номером поколения соединения: устаревший
+консьюмер (полуоткрытый TCP) не может прервать или завершить сессию,
+которую уже подхватило новое соединение.
+"""
+import logging
+import secrets
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from app.recordings.models import Session, AudioChunk
+from app.recordings.services.chunks import recover_unflushed_chunks
+from app.recordings.services.progress import session_group_name
+from app.recordings.services.scheduling import dispatch_processing
+
+logger = logging.getLogger(__name__)
+
+RESUMABLE_STATUSES = ('active', 'interrupted')
+
+# Коды закрытия WebSocket при неудачном возобновлении
+CLOSE_SESSION_NOT_FOUND = 4404
+CLOSE_INVALID_TOKEN = 4403
+CLOSE_NOT_RESUMABLE = 4409
+
+
+class ResumeError(Exception):
+    def __init__(self, message, close_code):
+        super().__init__(message)
+        self.close_code = close_code
+
+
+def create_session():
+    return Session.objects.create(
+        status='active',
+        started_at=timezone.now(),
+        resume_token=secrets.token_urlsafe(32)
+    )
+
+
+def last_chunk_number(session):
+    return AudioChunk.objects.filter(session=session).aggregate(last=Max('chunk_number'))['last'] or 0
+
+
+def resume_session(session_id, token):
+    """
+    Возобновляет сессию: возвращает (session, last_chunk), где last_chunk —
+    последний сохраненный на сервере чанк; клиент досылает все, что после него.
+    """
+    try:
+        session_id = uuid.UUID(str(session_id))
+    except ValueError:
+        raise ResumeError("Unknown session", CLOSE_SESSION_NOT_FOUND)
+
+    with transaction.atomic():
+        session = Session.objects.select_for_update().filter(pk=session_id).first()
+        if session is None:
+            raise ResumeError("Unknown session", CLOSE_SESSION_NOT_FOUND)
+        if not session.resume_token or not secrets.compare_digest(session.resume_token, str(token or '')):
+            raise ResumeError("Invalid resume token", CLOSE_INVALID_TOKEN)
+        if session.status not in RESUMABLE_STATUSES:
+            raise ResumeError(f"Session is {session.status}", CLOSE_NOT_RESUMABLE)
+
+        Session.objects.filter(pk=session.pk).update(
+            status='active',
+            interrupted_at=None,
+            resume_count=F('resume_count') + 1
+        )
+
+    # Чанки, записанные на диск, но не сброшенные в БД до обрыва
+    recover_unflushed_chunks(session)
+    session.refresh_from_db()
+
+    logger.info(f"Session {session.id} resumed (#{session.resume_count})")
+    return session, last_chunk_number(session)
+
+
+def interrupt_session(session_id, generation):
+    # Обрыв соединения: обработка откладывается до переподключения или grace-таймаута
+    updated = Session.objects.filter(pk=session_id, status='active', resume_count=generation).update(
+        status='interrupted',
+        interrupted_at=timezone.now()
+    )
+    if not updated:
+        return False
+
+    from app.recordings.tasks.sessions import finalize_interrupted_session_task
+    finalize_interrupted_session_task.apply_async((str(session_id), generation), countdown=settings.SESSION_RESUME_GRACE)
+
+    logger.info(f"Session {session_id} interrupted, waiting {settings.SESSION_RESUME_GRACE}s for resume")
+    return True
+
+
+def finish_recording(session_id, generation, statuses=RESUMABLE_STATUSES):
+    """
+    Завершает запись и ставит ее в очередь обработки. Возвращает False,
+    если сессию уже завершили или подхватило более новое соединение.
+    """
+    updated = Session.objects.filter(pk=session_id, status__in=statuses, resume_count=generation).update(
+        status='completed',
+        # После обрыва запись закончилась в момент разрыва, а не по таймауту
+        ended_at=Coalesce(F('interrupted_at'), Value(timezone.now()))
+    )
+    if not updated:
+        return False
+
+    queue_processing(session_id)
+    return True
+
+
+def queue_processing(session_id):
+    session_id = str(session_id)
+
+    # Лимиты и очередь по длительности записи
+    dispatch_processing(session_id)
+
+    # Подписчики StatusConsumer узнают, что сессия встала в очередь
+    try:
+        async_to_sync(get_channel_layer().group_send)(session_group_name(session_id), {
+            'type': 'processing.progress',
+            'session_id': session_id,
+            'stage': 'queued',
+            'percent': 0.0,
+            'eta': None,
+        })
+    except Exception as e:
+        # Задача уже в очереди: недоступный Redis каналов не должен превращать это в ошибку
+        logger.warning(f"Could not publish queued status for session {session_id}: {e}")
@@ -0,0 +1,62 @@
+from urllib.parse import urlsplit
+
+HINT_FIELDS = ('num_speakers', 'min_speakers', 'max_speakers')
+
+# Больше спикеров в подсказке — вероятнее ошибка, чем реальная встреча
+MAX_SPEAKER_HINT = 20
+
+# Видеозвонки: в записи заведомо больше одного собеседника
+CONFERENCING_DOMAINS = (
+    'meet.google.com',
+    'zoom.us',
+    'teams.microsoft.com',
+    'teams.live.com',
+    'whereby.com',
+    'meet.jit.si',
+    'webex.com',
+    'telemost.yandex.ru',
+    'discord.com',
+)
+
+
+def parse_speaker_count(value):
+    try:
+        count = int(value)
+    except (TypeError, ValueError):
+        return None
+    return count if 1 <= count <= MAX_SPEAKER_HINT else None
+
+
+def is_conferencing_url(url):
+    host = (urlsplit(url).hostname or '') if url else ''
+    return any(host == domain or host.endswith('.' + domain) for domain in CONFERENCING_DOMAINS)
+
+
+def speaker_hints_from_metadata(metadata, tab_url=None):
+    """
+    Подсказки числа спикеров для pyannote. Явные значения из метаданных
+    расширения (num_speakers/min_speakers/max_speakers) важнее выведенных:
+    participants — число участников звонка (2 — разговор один на один),
+    домен видеоконференции — минимум два спикера.
+    """
+    hints = {name: parse_speaker_count(metadata.get(name)) for name in HINT_FIELDS}
+
+    if not any(hints.values()):
+        participants = parse_speaker_count(metadata.get('participants'))
+        conferencing = is_conferencing_url(tab_url)
+
+        if participants and participants <= 2:
+            hints['num_speakers'] = participants
+        else:
+            if conferencing:
+                hints['min_speakers'] = 2
+            if participants:
+                hints['max_speakers'] = participants
+
+    # Точное число перекрывает границы, противоречивые границы отбрасываем
+    if hints['num_speakers']:
+        hints['min_speakers'] = hints['max_speakers'] = None
+    elif hints['min_speakers'] and hints['max_speakers'] and hints['min_speakers'] > hints['max_speakers']:
+        hints['min_speakers'] = hints['max_speakers'] = None
+
+    return hints
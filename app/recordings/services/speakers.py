@@ -0,0 +1,274 @@
+import base64
+import logging
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from app.recordings.models import Speaker, Transcript, Utterance
+
+logger = logging.getLogger(__name__)
+
+# Эмбеддинги хранятся в БД в float16, поиск идет в float32 (BLAS)
+EMBEDDING_STORAGE_DTYPE = np.float16
+
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def encode_embedding(vector):
+    return np.asarray(vector, dtype=EMBEDDING_STORAGE_DTYPE).tobytes()
+
+
+def decode_embedding(data):
+    return np.frombuffer(bytes(data), dtype=EMBEDDING_STORAGE_DTYPE).astype(np.float32)
+
+
+def speech_durations(segments):
+    # Суммарная длительность речи каждого локального спикера по сегментам диаризации
+    durations = {}
+    for segment in segments:
+        durations[segment['speaker']] = durations.get(segment['speaker'], 0.0) + segment['end'] - segment['start']
+    return durations
+
+
+class SpeakerIndex:
+    """
+    Матрица всех известных эмбеддингов в памяти воркера. Поиск ближайших —
+    одно матричное умножение (косинусная близость нормированных векторов),
+    на десятках тысяч спикеров это миллисекунды.
+    """
+
+    def __init__(self, ids, matrix, version):
+        self.ids = ids
+        self.matrix = matrix
+        self.version = version
+        self.positions = {speaker_id: i for i, speaker_id in enumerate(ids)}
+
+    @classmethod
+    def load(cls, version):
+        ids = []
+        vectors = []
+        skipped = 0
+        # Размерность берем у последнего обновленного спикера: после смены модели
+        # эмбеддингов старые векторы другой длины в поиске не участвуют
+        speakers = Speaker.objects.order_by('-updated_at').values_list('id', 'embedding')
+        for speaker_id, embedding in speakers.iterator(chunk_size=2000):
+            vector = decode_embedding(embedding)
+            if vectors and len(vector) != len(vectors[0]):
+                skipped += 1
+                continue
+            ids.append(speaker_id)
+            vectors.append(vector)
+
+        if skipped:
+            logger.warning(f"Speaker index: skipped {skipped} embeddings of another dimension")
+
+        matrix = np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+        return cls(ids, matrix, version)
+
+    def update(self, updates):
+        # updates: [(speaker_id, вектор)]; False, если размерность не совпала и нужна перезагрузка
+        for speaker_id, vector in updates:
+            if self.ids and len(vector) != self.matrix.shape[1]:
+                return False
+            if speaker_id in self.positions:
+                self.matrix[self.positions[speaker_id]] = vector
+                continue
+            # Сначала id, потом строка матрицы: параллельный поиск не получит индекс за пределами ids
+            self.positions[speaker_id] = len(self.ids)
+            self.ids.append(speaker_id)
+            self.matrix = np.vstack([self.matrix, vector]) if self.matrix.size else vector[np.newaxis, :]
+        return True
+
+    def similarities(self, vectors):
+        if not self.ids or vectors.shape[1] != self.matrix.shape[1]:
+            return np.empty((len(vectors), 0), dtype=np.float32)
+        return vectors @ self.matrix.T
+
+
+# Версия таблицы спикеров в общем кеше: воркер перезагружает индекс, только
+# если спикеров менял кто-то другой, свои изменения применяет на месте
+SPEAKER_INDEX_VERSION_KEY = 'speaker-index-version'
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def speaker_index_version():
+    version = cache.get(SPEAKER_INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(SPEAKER_INDEX_VERSION_KEY, 1, timeout=None)
+        version = cache.get(SPEAKER_INDEX_VERSION_KEY, 1)
+    return version
+
+
+def get_speaker_index():
+    global _index
+    version = speaker_index_version()
+
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = SpeakerIndex.load(version)
+            logger.info(f"Loaded speaker index: {len(_index.ids)} speakers")
+        return _index
+
+
+def publish_speaker_updates(updates):
+    # После коммита: новая версия для других процессов, свой индекс — инкрементально
+    global _index
+    if not updates:
+        return
+
+    try:
+        version = cache.incr(SPEAKER_INDEX_VERSION_KEY)
+    except ValueError:
+        cache.set(SPEAKER_INDEX_VERSION_KEY, 1, timeout=None)
+        version = None
+
+    with _index_lock:
+        if _index is None:
+            return
+        # Между загрузкой и этим изменением спикеров менял другой процесс
+        if version is None or _index.version != version - 1 or not _index.update(updates):
+            _index = None
+            return
+        _index.version = version
+
+
+def match_speakers(scores, threshold):
+    # Жадное сопоставление один-к-одному: два спикера одной записи не могут быть одним человеком
+    candidates = sorted(
+        ((scores[i, j], i, j) for i, j in zip(*np.nonzero(scores >= threshold))),
+        reverse=True
+    )
+
+    matches = {}
+    used = set()
+    for score, i, j in candidates:
+        if i in matches or j in used:
+            continue
+        matches[i] = (j, float(score))
+        used.add(j)
+
+    return matches
+
+
+def release_global_speakers(transcript):
+    """
+    Вычитает прошлый вклад записи (Transcript.speaker_contributions) из
+    глобальных спикеров: счетчики и центроид возвращаются к состоянию до
+    assign_global_speakers. Центроид хранится нормированным, поэтому
+    восстанавливается с весом total_speech — так же, как и усреднялся.
+    """
+    contributions = transcript.speaker_contributions or {}
+    if not contributions:
+        return
+
+    updates = {}
+    with transaction.atomic():
+        for label, contribution in contributions.items():
+            speaker = Speaker.objects.select_for_update().filter(id=contribution['speaker']).first()
+            if speaker is None:
+                continue
+
+            duration = contribution['duration']
+            vector = decode_embedding(base64.b64decode(contribution['embedding']))
+
+            if speaker.total_sessions <= 1 or speaker.total_speech <= duration:
+                # Голос известен только по этой записи: эмбеддинг остается (имя
+                # сохранится, если запись снова сопоставится), вес обнуляется
+                speaker.total_sessions = 0
+                speaker.total_speech = 0.0
+            elif vector.shape == decode_embedding(speaker.embedding).shape:
+                centroid = decode_embedding(speaker.embedding) * speaker.total_speech - vector * duration
+                speaker.embedding = encode_embedding(normalize(centroid))
+                speaker.total_sessions -= 1
+                speaker.total_speech -= duration
+            else:
+                speaker.total_sessions -= 1
+                speaker.total_speech -= duration
+
+            speaker.save(update_fields=['embedding', 'total_sessions', 'total_speech', 'updated_at'])
+            updates[speaker.id] = decode_embedding(speaker.embedding)
+
+        Transcript.objects.filter(pk=transcript.pk).update(speaker_contributions={})
+        transaction.on_commit(lambda: publish_speaker_updates(list(updates.items())))
+        transcript.speaker_contributions = {}
+
+    logger.info(f"Released {len(contributions)} global speakers of transcript {transcript.pk}")
+
+
+def assign_global_speakers(transcript, embeddings, durations):
+    """
+    Связывает локальных спикеров записи (SPEAKER_00, ...) с глобальными Speaker:
+    находит ближайшего известного по косинусной близости или создает нового,
+    затем проставляет Utterance.global_speaker. Возвращает {метка: Speaker.id}.
+    Прошлый вклад этой же записи (перекластеризация, повтор задачи) сначала
+    вычитается, чтобы запись не учитывалась в спикерах дважды.
+    """
+    labels = [
+        label for label, vector in embeddings.items()
+        if vector is not None
+        and np.all(np.isfinite(vector))
+        and durations.get(label, 0.0) >= settings.SPEAKER_MIN_SPEECH
+    ]
+
+    assignment = {}
+    contributions = {}
+    updates = {}
+    with transaction.atomic():
+        release_global_speakers(transcript)
+        if not labels:
+            return {}
+
+        vectors = normalize(np.vstack([np.asarray(embeddings[label], dtype=np.float32) for label in labels]))
+
+        index = get_speaker_index()
+        matches = match_speakers(index.similarities(vectors), settings.SPEAKER_MATCH_THRESHOLD)
+
+        for i, label in enumerate(labels):
+            duration = durations[label]
+
+            speaker = None
+            if i in matches:
+                j, score = matches[i]
+                # Спикера могли удалить в админке после загрузки индекса
+                speaker = Speaker.objects.select_for_update().filter(id=index.ids[j]).first()
+
+            if speaker is not None:
+                # Центроид голоса: среднее, взвешенное по длительности речи
+                centroid = decode_embedding(speaker.embedding) * speaker.total_speech + vectors[i] * duration
+                speaker.embedding = encode_embedding(normalize(centroid))
+                speaker.total_sessions += 1
+                speaker.total_speech += duration
+                speaker.save(update_fields=['embedding', 'total_sessions', 'total_speech', 'updated_at'])
+
+                logger.info(f"{label} matched speaker {speaker.id} (similarity {score:.3f})")
+            else:
+                speaker = Speaker.objects.create(
+                    embedding=encode_embedding(vectors[i]),
+                    embedding_dim=vectors.shape[1],
+                    total_sessions=1,
+                    total_speech=duration
+                )
+                logger.info(f"{label} registered as new speaker {speaker.id}")
+
+            Utterance.objects.filter(transcript=transcript, speaker=label).update(global_speaker=speaker)
+            updates[speaker.id] = decode_embedding(speaker.embedding)
+            assignment[label] = speaker.id
+            contributions[label] = {
+                'speaker': str(speaker.id),
+                'duration': duration,
+                'embedding': base64.b64encode(encode_embedding(vectors[i])).decode('ascii'),
+            }
+
+        Transcript.objects.filter(pk=transcript.pk).update(speaker_contributions=contributions)
+        transcript.speaker_contributions = contributions
+        transaction.on_commit(lambda: publish_speaker_updates(list(updates.items())))
+
+    return assignment
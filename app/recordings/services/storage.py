@@ -0,0 +1,485 @@
+"""
+Хранилище чанков и итоговых записей: локальная ФС (MEDIA_ROOT) или
+S3-совместимый бакет (AWS, MinIO). Выбирается STORAGE_BACKEND.
+
+Код оперирует ключами ('chunks/<session>/chunk_0001.wav',
+'recordings/<file>.wav'), а в БД (AudioChunk.file_path, Session.audio_file)
+хранится имя объекта, которое вернуло хранилище: для локального — полный
+путь (как и раньше, поэтому старые записи читаются без миграции данных),
+для S3 — ключ объекта с префиксом.
+"""
+import io
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.http import quote_etag
+
+logger = logging.getLogger(__name__)
+
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# Ограничения S3 multipart: все части, кроме последней, не меньше 5 MiB
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+S3_MAX_COPY_PART_SIZE = 1024 * 1024 * 1024
+
+
+class StorageError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class StoredObject:
+    size: int
+    modified: float  # unix timestamp
+    etag: str
+
+
+class FileWindow:
+    """
+    Read-only view over the [start, start + length) window of an open file.
+
+    fileno() is exposed and the underlying file is positioned at `start`, so a
+    WSGI server with sendfile support (gunicorn's wsgi.file_wrapper) sends the
+    window straight from the page cache, bounded by Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        self._file = file
+        self._remaining = length
+        self._file.seek(start)
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+class LocalStorage:
+    is_local = True
+
+    @property
+    def root(self):
+        return os.fspath(settings.MEDIA_ROOT)
+
+    def path(self, name):
+        # Абсолютные имена (старые записи и все, что вернул save) остаются как есть
+        return os.path.join(self.root, name)
+
+    def name_for(self, key):
+        return self.path(key)
+
+    def key(self, name):
+        return os.path.relpath(self.path(name), self.root).replace(os.sep, '/')
+
+    def save(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def save_file(self, key, local_path):
+        # Забирает файл: переносит его на место ключа
+        path = self.path(key)
+        if os.path.abspath(local_path) != os.path.abspath(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.move(local_path, path)
+        return path
+
+    def exists(self, name):
+        return os.path.isfile(self.path(name))
+
+    def stat(self, name):
+        stat = os.stat(self.path(name))
+        return StoredObject(
+            size=stat.st_size,
+            modified=stat.st_mtime,
+            etag=quote_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+        )
+
+    def size(self, name):
+        return os.path.getsize(self.path(name))
+
+    def open_range(self, name, start, length):
+        return FileWindow(open(self.path(name), 'rb'), start, length)
+
+    def read(self, name, start=0, length=None):
+        with open(self.path(name), 'rb') as f:
+            f.seek(start)
+            return f.read() if length is None else f.read(length)
+
+    def list(self, prefix):
+        # [(name, size)] файлов "каталога" prefix
+        directory = self.path(prefix)
+        if not os.path.isdir(directory):
+            return []
+        with os.scandir(directory) as entries:
+            return [(entry.path, entry.stat().st_size) for entry in entries if entry.is_file()]
+
+    def walk(self, prefix):
+        # (name, size, mtime) всех файлов под prefix, рекурсивно
+        directories = [self.path(prefix)]
+        while directories:
+            try:
+                entries = os.scandir(directories.pop())
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        yield entry.path, stat.st_size, stat.st_mtime
+
+    def delete(self, name):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def delete_prefix(self, prefix):
+        shutil.rmtree(self.path(prefix), ignore_errors=True)
+
+    def compose(self, key, parts, header=b''):
+        """
+        Склеивает header и диапазоны (name, offset, length) других объектов
+        в новый объект key. Пишет во временный файл и атомарно переименовывает.
+        """
+        path = self.path(key)
+        tmp_path = path + '.part'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        try:
+            with open(tmp_path, 'wb') as out:
+                out.write(header)
+                for name, offset, length in parts:
+                    window = self.open_range(name, offset, length)
+                    try:
+                        shutil.copyfileobj(window, out, COPY_BLOCK_SIZE)
+                    finally:
+                        window.close()
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return path
+
+    @contextmanager
+    def local_copy(self, name):
+        # ffmpeg/Whisper/pyannote читают файл напрямую
+        yield self.path(name)
+
+
+class S3Storage:
+    """
+    S3-совместимое хранилище (boto3 импортируется лениво, только при выборе
+    этого бэкенда). Загрузка больших файлов — потоковый multipart, чтение для
+    плеера — ranged GET, склейка — multipart upload, где диапазоны от 5 MiB
+    копируются на стороне сервера (UploadPartCopy), а мелкие куски (1-секундные
+    чанки) собираются в части по STORAGE_S3_PART_SIZE_MB и проходят через
+    воркер потоком: S3 не принимает части меньше 5 MiB, кроме последней.
+    """
+
+    is_local = False
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None, part_size=8 * 1024 * 1024):
+        if not bucket:
+            raise StorageError("STORAGE_S3_BUCKET is not set")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.endpoint_url = endpoint_url or None
+        self.region = region or None
+        self.part_size = max(part_size, S3_MIN_PART_SIZE)
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            try:
+                import boto3
+                from botocore.config import Config
+            except ImportError:
+                raise StorageError("STORAGE_BACKEND=s3 requires boto3: pip install boto3")
+
+            self._client = boto3.client(
+                's3',
+                endpoint_url=self.endpoint_url,
+                region_name=self.region,
+                config=Config(signature_version='s3v4', retries={'max_attempts': 5, 'mode': 'standard'})
+            )
+        return self._client
+
+    @property
+    def transfer_config(self):
+        from boto3.s3.transfer import TransferConfig
+        return TransferConfig(multipart_threshold=self.part_size, multipart_chunksize=self.part_size)
+
+    def name_for(self, key):
+        return self.prefix + key
+
+    def key(self, name):
+        return name[len(self.prefix):] if name.startswith(self.prefix) else name
+
+    def save(self, key, data):
+        name = self.name_for(key)
+        self.client.put_object(Bucket=self.bucket, Key=name, Body=data)
+        return name
+
+    def save_file(self, key, local_path):
+        # Потоковая multipart-загрузка с диска, локальный файл удаляется
+        name = self.name_for(key)
+        self.client.upload_file(local_path, self.bucket, name, Config=self.transfer_config)
+        os.remove(local_path)
+        return name
+
+    def _is_missing(self, error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def stat(self, name):
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=name)
+        except ClientError as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(name)
+            raise
+
+        return StoredObject(
+            size=head['ContentLength'],
+            modified=head['LastModified'].timestamp(),
+            etag=head['ETag']
+        )
+
+    def exists(self, name):
+        try:
+            self.stat(name)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def size(self, name):
+        return self.stat(name).size
+
+    def open_range(self, name, start, length):
+        if length <= 0:
+            return io.BytesIO(b'')
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=name, Range=f'bytes={start}-{start + length - 1}'
+        )
+        return response['Body']
+
+    def read(self, name, start=0, length=None):
+        if length is None:
+            return self.client.get_object(Bucket=self.bucket, Key=name, Range=f'bytes={start}-')['Body'].read()
+        body = self.open_range(name, start, length)
+        try:
+            return body.read()
+        finally:
+            body.close()
+
+    def list(self, prefix):
+        objects = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.name_for(prefix)):
+            objects.extend((item['Key'], item['Size']) for item in page.get('Contents', []))
+        return objects
+
+    def walk(self, prefix):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.name_for(prefix)):
+            for item in page.get('Contents', []):
+                yield item['Key'], item['Size'], item['LastModified'].timestamp()
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=name)
+
+    def delete_prefix(self, prefix):
+        names = [name for name, _ in self.list(prefix)]
+        for start in range(0, len(names), 1000):
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={'Objects': [{'Key': name} for name in names[start:start + 1000]], 'Quiet': True}
+            )
+
+    def compose(self, key, parts, header=b''):
+        name = self.name_for(key)
+        upload = ComposeUpload(self, name)
+
+        try:
+            upload.write(header)
+            for source, offset, length in parts:
+                upload.append_range(source, offset, length)
+            upload.complete()
+        except BaseException:
+            upload.abort()
+            raise
+
+        return name
+
+    @contextmanager
+    def local_copy(self, name):
+        # ML и ffmpeg нужен файл: скачиваем во временный (ranged GET частями)
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(name)[1], prefix='storage_')
+        os.close(fd)
+        try:
+            self.client.download_file(self.bucket, name, path, Config=self.transfer_config)
+            yield path
+        finally:
+            os.remove(path)
+
+
+class ComposeUpload:
+    """
+    Multipart upload для S3Storage.compose: мелкие куски копятся в буфере
+    до части part_size, диапазоны от S3_MIN_PART_SIZE при пустом буфере
+    копируются сервером без передачи данных через воркер.
+    """
+
+    def __init__(self, storage, name):
+        self.storage = storage
+        self.client = storage.client
+        self.name = name
+        self.buffer = bytearray()
+        self.parts = []
+        self.upload_id = None
+
+    def start(self):
+        if self.upload_id is None:
+            response = self.client.create_multipart_upload(Bucket=self.storage.bucket, Key=self.name)
+            self.upload_id = response['UploadId']
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.storage.part_size:
+            self.flush(self.storage.part_size)
+
+    def flush(self, size=None):
+        size = len(self.buffer) if size is None else size
+        if not size:
+            return
+        self.start()
+        part_number = len(self.parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.storage.bucket, Key=self.name, UploadId=self.upload_id,
+            PartNumber=part_number, Body=bytes(self.buffer[:size])
+        )
+        self.parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+        del self.buffer[:size]
+
+    def copy(self, source, offset, length):
+        self.start()
+        part_number = len(self.parts) + 1
+        response = self.client.upload_part_copy(
+            Bucket=self.storage.bucket, Key=self.name, UploadId=self.upload_id, PartNumber=part_number,
+            CopySource={'Bucket': self.storage.bucket, 'Key': source},
+            CopySourceRange=f'bytes={offset}-{offset + length - 1}'
+        )
+        self.parts.append({'PartNumber': part_number, 'ETag': response['CopyPartResult']['ETag']})
+
+    def append_range(self, source, offset, length):
+        # Неполная часть в буфере не может стоять перед копией на сервере - дочитываем ее до 5 MiB
+        if self.buffer and len(self.buffer) < S3_MIN_PART_SIZE:
+            take = min(length, S3_MIN_PART_SIZE - len(self.buffer))
+            self.stream(source, offset, take)
+            offset, length = offset + take, length - take
+            if len(self.buffer) < S3_MIN_PART_SIZE:
+                return
+
+        if length >= S3_MIN_PART_SIZE:
+            self.flush()
+            while length:
+                if length <= S3_MAX_COPY_PART_SIZE:
+                    size = length
+                else:
+                    # Хвост меньше 5 MiB не может быть отдельной частью
+                    size = S3_MAX_COPY_PART_SIZE if length - S3_MAX_COPY_PART_SIZE >= S3_MIN_PART_SIZE \
+                        else length - S3_MIN_PART_SIZE
+                self.copy(source, offset, size)
+                offset, length = offset + size, length - size
+
+        if length:
+            self.stream(source, offset, length)
+
+    def stream(self, source, offset, length):
+        body = self.storage.open_range(source, offset, length)
+        try:
+            for block in iter(lambda: body.read(COPY_BLOCK_SIZE), b''):
+                self.write(block)
+        finally:
+            body.close()
+
+    def complete(self):
+        if self.upload_id is None:
+            # Все уместилось в одну часть - обычный PUT
+            self.client.put_object(Bucket=self.storage.bucket, Key=self.name, Body=bytes(self.buffer))
+            return
+        self.flush()
+        self.client.complete_multipart_upload(
+            Bucket=self.storage.bucket, Key=self.name, UploadId=self.upload_id,
+            MultipartUpload={'Parts': self.parts}
+        )
+
+    def abort(self):
+        if self.upload_id is not None:
+            try:
+                self.client.abort_multipart_upload(Bucket=self.storage.bucket, Key=self.name, UploadId=self.upload_id)
+            except Exception as e:
+                logger.warning(f"Could not abort multipart upload of {self.name}: {e}")
+
+
+@lru_cache(maxsize=None)
+def get_storage():
+    backend = settings.STORAGE_BACKEND
+    if backend == 's3':
+        return S3Storage(
+            bucket=settings.STORAGE_S3_BUCKET,
+            prefix=settings.STORAGE_S3_PREFIX,
+            endpoint_url=settings.STORAGE_S3_ENDPOINT_URL,
+            region=settings.STORAGE_S3_REGION,
+            part_size=settings.STORAGE_S3_PART_SIZE_MB * 1024 * 1024
+        )
+    if backend == 'local':
+        return LocalStorage()
+    raise StorageError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+def session_chunks_prefix(session_id):
+    return f"chunks/{session_id}/"
+
+
+def chunk_key(session_id, chunk_number):
+    return f"{session_chunks_prefix(session_id)}chunk_{chunk_number:04d}.wav"
+
+
+def chunk_batch_key(session_id, first_chunk, last_chunk):
+    # Номер первого нового чанка уникален в сессии, поэтому и имя пакета тоже
+    return f"{session_chunks_prefix(session_id)}batch_{first_chunk:04d}_{last_chunk:04d}.bin"
+
+
+def recording_key(filename):
+    return f"recordings/{filename}"
+
+
+def recording_filename(session):
+    return f"recording_{session.started_at:%Y%m%d_%H%M%S}_{str(session.id)[:8]}.wav"
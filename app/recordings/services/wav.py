@@ -0,0 +1,91 @@
+import struct
+from dataclasses import dataclass
+
+RIFF_HEADER_SIZE = 12
+CHUNK_HEADER_SIZE = 8
+
+
+class WavHeaderError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class WavInfo:
+    sample_rate: int
+    channels: int
+    bits_per_sample: int
+    data_offset: int
+    data_size: int
+
+    @property
+    def block_align(self):
+        return self.channels * self.bits_per_sample // 8
+
+    @property
+    def frames(self):
+        return self.data_size // self.block_align if self.block_align else 0
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate if self.sample_rate else 0.0
+
+
+def parse_wav_header(data, total_size=None):
+    """
+    Разбирает RIFF/WAVE заголовок: проходит по чанкам до 'data', не читая PCM.
+
+    data — начало файла (достаточно заголовка), total_size — полный размер
+    файла, если data содержит не весь файл. Размер data-чанка ограничивается
+    фактическим размером: браузеры при стриминге пишут туда 0 или 0xFFFFFFFF.
+    """
+    if total_size is None:
+        total_size = len(data)
+
+    if len(data) < RIFF_HEADER_SIZE or data[0:4] != b'RIFF' or data[8:12] != b'WAVE':
+        raise WavHeaderError("Not a RIFF/WAVE file")
+
+    fmt = None
+    offset = RIFF_HEADER_SIZE
+
+    while offset + CHUNK_HEADER_SIZE <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack_from('<I', data, offset + 4)[0]
+        body_offset = offset + CHUNK_HEADER_SIZE
+
+        if chunk_id == b'fmt ':
+            if body_offset + 16 > len(data):
+                break
+            _, channels, sample_rate, _, _, bits_per_sample = struct.unpack_from('<HHIIHH', data, body_offset)
+            fmt = (sample_rate, channels, bits_per_sample)
+
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise WavHeaderError("'data' chunk before 'fmt ' chunk")
+
+            available = max(0, total_size - body_offset)
+            data_size = min(chunk_size, available) if chunk_size else available
+
+            sample_rate, channels, bits_per_sample = fmt
+            return WavInfo(
+                sample_rate=sample_rate,
+                channels=channels,
+                bits_per_sample=bits_per_sample,
+                data_offset=body_offset,
+                data_size=data_size,
+            )
+
+        # Чанки выровнены по 2 байта
+        offset = body_offset + chunk_size + (chunk_size & 1)
+
+    raise WavHeaderError("'data' chunk not found in header")
+
+
+def build_wav_header(wav_info, data_size):
+    # Канонический 44-байтный заголовок PCM WAV для data_size байт PCM
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, wav_info.channels, wav_info.sample_rate,
+        wav_info.sample_rate * wav_info.block_align, wav_info.block_align, wav_info.bits_per_sample,
+        b'data', data_size
+    )
@@ -0,0 +1,78 @@
+import time
+import types
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Whisper: 100 mel-кадров в секунду (HOP_LENGTH=160 при 16 кГц), 1501 timestamp-токен в конце словаря
+MEL_FRAMES_PER_SECOND = 100
+TIMESTAMP_TOKENS = 1501
+
+
+class TranscriptionAborted(Exception):
+    """Прерывание распознавания из progress-колбэка (например, прогноз превышает лимит времени)"""
+
+
+@contextmanager
+def whisper_progress(model, callback):
+    """
+    Подключает колбэк к model.transcribe() на время вызова.
+
+    Whisper обновляет свой tqdm-бар после каждого декодированного 30-секундного
+    окна, поэтому подменяем tqdm в whisper.transcribe, а model.decode
+    оборачиваем, чтобы знать текст и число сегментов в окне. callback получает
+    dict: window, segments, audio_seconds, total_seconds, elapsed, rtf, partial_text.
+    """
+    import tqdm
+    import whisper.transcribe as whisper_transcribe
+
+    timestamp_begin = model.dims.n_vocab - TIMESTAMP_TOKENS
+    started_at = time.monotonic()
+    state = {'window': 0, 'segments': 0, 'frames': 0, 'last_result': None}
+
+    original_decode = model.decode
+
+    def decode(segment, options):
+        result = original_decode(segment, options)
+        # При fallback по температуре decode вызывается повторно - берем последний результат
+        state['last_result'] = result
+        return result
+
+    class ProgressBar(tqdm.tqdm):
+        def update(self, n=1):
+            displayed = super().update(n)
+            # Считаем кадры сами: отключенный (disable=True) tqdm не ведет self.n
+            state['frames'] += n or 0
+
+            result = state['last_result']
+            state['last_result'] = None
+            state['window'] += 1
+            if result is not None:
+                timestamps = sum(1 for token in result.tokens if token >= timestamp_begin)
+                state['segments'] += max(timestamps // 2, 1 if result.text.strip() else 0)
+
+            audio_seconds = state['frames'] / MEL_FRAMES_PER_SECOND
+            elapsed = time.monotonic() - started_at
+
+            callback({
+                'window': state['window'],
+                'segments': state['segments'],
+                'audio_seconds': round(audio_seconds, 2),
+                'total_seconds': round((self.total or 0) / MEL_FRAMES_PER_SECOND, 2),
+                'elapsed': round(elapsed, 2),
+                'rtf': round(elapsed / audio_seconds, 3) if audio_seconds else None,
+                'partial_text': result.text.strip()[:200] if result is not None else '',
+            })
+
+            return displayed
+
+    original_tqdm = whisper_transcribe.tqdm
+    whisper_transcribe.tqdm = types.SimpleNamespace(tqdm=ProgressBar)
+    model.decode = decode
+
+    try:
+        yield
+    finally:
+        whisper_transcribe.tqdm = original_tqdm
+        del model.decode
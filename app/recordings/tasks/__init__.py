@@ -1,3 +1,8 @@
 from .processing import process_audio_task
+from .archive import archive_recording_task
+from .diarization import recluster_session_task
+from .janitor import sweep_media_task, maintain_partitions_task
+from .sessions import finalize_interrupted_session_task
 
-__all__ = ['process_audio_task']
+__all__ = ['process_audio_task', 'archive_recording_task', 'recluster_session_task', 'sweep_media_task',
+           'maintain_partitions_task', 'finalize_interrupted_session_task']
@@ -0,0 +1,63 @@
+import os
+import logging
+
+from celery import shared_task
+from django.conf import settings
+
+from app.recordings.models import Session
+from app.recordings.services.archive import ArchiveError, transcode_recording
+from app.recordings.services.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=2)
+def archive_recording_task(self, session_id):
+    try:
+        session = Session.objects.get(id=session_id)
+    except Session.DoesNotExist:
+        logger.error(f"Session not found: {session_id}")
+        return {'error': 'Session not found'}
+
+    archive_format = settings.AUDIO_ARCHIVE_FORMAT
+    source = session.audio_file
+    storage = get_storage()
+
+    if not archive_format or not source or not source.endswith('.wav'):
+        logger.info(f"Nothing to archive for session {session_id}")
+        return {'session_id': session_id, 'status': 'skipped'}
+
+    if not storage.exists(source):
+        logger.warning(f"Recording not found for session {session_id}: {source}")
+        return {'session_id': session_id, 'status': 'missing'}
+
+    try:
+        # Локально архив сразу пишется рядом с WAV, из S3 — рядом с временной копией
+        with storage.local_copy(source) as source_path:
+            archive_path = transcode_recording(
+                source_path,
+                archive_format,
+                opus_bitrate=settings.AUDIO_ARCHIVE_OPUS_BITRATE
+            )
+    except ArchiveError as e:
+        # WAV остается на месте, запись продолжает проигрываться
+        logger.error(f"Error archiving session {session_id}: {e}")
+        raise self.retry(exc=e, countdown=300)
+
+    archive_key = os.path.splitext(storage.key(source))[0] + os.path.splitext(archive_path)[1]
+    archive_path = storage.save_file(archive_key, archive_path)
+
+    session.audio_file = archive_path
+    session.file_size = storage.size(archive_path)
+    session.save(update_fields=['audio_file', 'file_size'])
+
+    storage.delete(source)
+
+    logger.info(f"Session {session_id} archived as {archive_format}: {archive_path} ({session.file_size} bytes)")
+
+    return {
+        'session_id': session_id,
+        'status': 'archived',
+        'audio_file': archive_path,
+        'file_size': session.file_size
+    }
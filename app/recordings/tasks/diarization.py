@@ -0,0 +1,92 @@
+import time
+import logging
+
+from celery import shared_task
+from django.db import transaction
+from django.db.models import F
+
+from app.recordings.models import Transcript, Utterance
+from app.recordings.services.diarization_cache import has_cache, load_transcription
+from app.recordings.services.progress import ProgressReporter
+from app.recordings.services.search import clear_transcript_index, index_transcript
+from app.recordings.services.speakers import assign_global_speakers, speech_durations
+from app.recordings.tasks.processing import create_utterances, get_ml_processor_for_task, transcript_stats
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True)
+def recluster_session_task(self, session_id, num_speakers=None, min_speakers=None, max_speakers=None,
+                           clustering_threshold=None):
+    """
+    Пересчитывает спикеров записи с новыми параметрами кластеризации по
+    сохраненным сегментации и эмбеддингам pyannote, заменяет реплики транскрипта.
+    """
+    try:
+        transcript = Transcript.objects.select_related('session').get(session_id=session_id)
+    except Transcript.DoesNotExist:
+        logger.error(f"Transcript not found: {session_id}")
+        return {'error': 'Transcript not found'}
+
+    session = transcript.session
+    if not has_cache(session_id):
+        logger.error(f"Diarization cache missing for session {session_id}")
+        return {'session_id': session_id, 'status': 'failed', 'error': 'Diarization cache not available'}
+
+    progress = ProgressReporter(session_id)
+    started_at = time.monotonic()
+
+    speaker_hints = {
+        name: value for name, value in (
+            ('num_speakers', num_speakers),
+            ('min_speakers', min_speakers),
+            ('max_speakers', max_speakers),
+        ) if value is not None
+    }
+
+    try:
+        progress.publish('reclustering', 0)
+        processor = get_ml_processor_for_task()
+
+        # Нейросети не запускаются, поэтому запись из хранилища не нужна
+        segments, speaker_embeddings = processor.recluster_audio(
+            session_id,
+            clustering_threshold=clustering_threshold,
+            **speaker_hints
+        )
+
+        progress.publish('merging', 60)
+        utterances = processor.merge_transcription_and_diarization(load_transcription(session_id), segments)
+
+        # Заменяем реплики; version инвалидирует кеш экспортов
+        progress.publish('saving', 80)
+        with transaction.atomic():
+            clear_transcript_index(transcript)
+            Utterance.objects.filter(transcript=transcript).delete()
+            create_utterances(transcript, utterances)
+            Transcript.objects.filter(pk=transcript.pk).update(version=F('version') + 1, **transcript_stats(utterances))
+            index_transcript(transcript)
+
+        try:
+            assign_global_speakers(transcript, speaker_embeddings, speech_durations(segments))
+        except Exception as e:
+            logger.warning(f"Could not assign global speakers for session {session_id}: {e}", exc_info=True)
+
+        progress.publish('completed', 100, status=session.status)
+
+        elapsed = time.monotonic() - started_at
+        logger.info(f"Reclustered session {session_id} in {elapsed:.1f}s: {len(utterances)} utterances")
+
+        return {
+            'session_id': session_id,
+            'status': 'completed',
+            'total_speakers': len(set(s['speaker'] for s in segments)),
+            'total_utterances': len(utterances),
+            'elapsed': elapsed
+        }
+
+    except Exception as e:
+        # Исходный транскрипт остается нетронутым, повтор с теми же параметрами не поможет
+        logger.error(f"Error reclustering session {session_id}: {e}", exc_info=True)
+        progress.publish('failed', 0, status=session.status, error=str(e))
+        return {'session_id': session_id, 'status': 'failed', 'error': str(e)}
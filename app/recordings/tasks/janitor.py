@@ -0,0 +1,23 @@
+import logging
+
+from celery import shared_task
+
+from app.recordings.services.janitor import sweep_media
+from app.recordings.services.partitioning import maintain_partitions
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=False)
+def sweep_media_task(dry_run=False):
+    # Периодическая задача (CELERY_BEAT_SCHEDULE): сверка MEDIA_ROOT с БД и квоты
+    report = sweep_media(dry_run=dry_run)
+    if report is None:
+        return {'status': 'skipped'}
+    return report.as_dict()
+
+
+@shared_task(ignore_result=False)
+def maintain_partitions_task():
+    # Будущие секции и удаление устаревших; без партиционирования возвращает {}
+    return maintain_partitions()
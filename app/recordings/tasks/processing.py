@@ -1,13 +1,24 @@
-import os
-import shutil
-import struct
+import time
 import logging
 
 from celery import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 
 from app.recordings.models import Session, AudioChunk, Transcript, Utterance
+from app.recordings.services.chunks import WAV_HEADER_READ_SIZE, recover_unflushed_chunks
+from app.recordings.services.diarization_cache import save_transcription
+from app.recordings.services.language import resolve_session_language
+from app.recordings.services.progress import ProgressReporter
+from app.recordings.services.scheduling import dispatch_processing, record_rtf
+from app.recordings.services.speakers import assign_global_speakers, speech_durations
+from app.recordings.services.search import clear_transcript_index, index_transcript
+from app.recordings.services.storage import get_storage, recording_filename, recording_key, session_chunks_prefix
+from app.recordings.services.wav import build_wav_header, parse_wav_header
+from app.recordings.services.whisper_progress import TranscriptionAborted
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +38,20 @@ def get_ml_processor_for_task():
 
 @shared_task(bind=True, max_retries=3)
 def process_audio_task(self, session_id):
+    progress = ProgressReporter(session_id)
+    task_started_at = time.monotonic()
+
+    # Лимит задачи (мягкий, если задан dispatch_processing) или глобальный из настроек
+    hard_limit, soft_limit = self.request.timelimit or (None, None)
+    time_limit = soft_limit or hard_limit or settings.CELERY_TASK_TIME_LIMIT
+
+    def on_asr_progress(info):
+        # Вызывается после каждого декодированного 30-секундного окна Whisper
+        percent = 10 + 50 * info['audio_seconds'] / info['total_seconds'] if info['total_seconds'] else 10
+        progress.publish('transcribing', percent, **info)
+        self.update_state(state='PROGRESS', meta={'session_id': session_id, 'stage': 'transcribing', **info})
+        check_transcription_budget(info, time_limit - (time.monotonic() - task_started_at))
+
     try:
         logger.info(f"Starting audio processing for session: {session_id}")
 
@@ -34,51 +59,91 @@ def process_audio_task(self, session_id):
         session = Session.objects.get(id=session_id)
         session.status = 'processing'
         session.processing_started_at = timezone.now()
-        session.save()
+        session.save(update_fields=['status', 'processing_started_at'])
 
         # 1. Склеиваем чанки
-        logger.info(f"Step 1: Concatenating audio chunks...")
-        audio_file_path = concatenate_audio_chunks(session)
+        if session.audio_file and get_storage().exists(session.audio_file):
+            # Повторный запуск (retry, эскалация в длинную очередь): чанки уже склеены и удалены
+            logger.info(f"Step 1: Reusing concatenated audio {session.audio_file}")
+            audio_file = session.audio_file
+        else:
+            logger.info(f"Step 1: Concatenating audio chunks...")
+            progress.publish('concatenating', 0)
+            audio_file = concatenate_audio_chunks(session)
 
-        if not audio_file_path or not os.path.exists(audio_file_path):
+        if not audio_file or not get_storage().exists(audio_file):
             raise Exception("Failed to concatenate audio chunks")
 
         # Обновляем информацию о файле
-        session.audio_file = audio_file_path
-        session.file_size = os.path.getsize(audio_file_path)
-        session.save()
+        session.audio_file = audio_file
+        session.file_size = get_storage().size(audio_file)
+        session.save(update_fields=['audio_file', 'file_size'])
 
-        logger.info(f"Audio file created: {audio_file_path} ({session.file_size} bytes)")
+        logger.info(f"Audio file created: {audio_file} ({session.file_size} bytes)")
 
         # 2. Получаем ML процессор (создаётся внутри worker'а, не при импорте)
+        progress.publish('loading_models', 5)
         processor = get_ml_processor_for_task()
 
-        # 3. Распознавание речи
-        logger.info(f"Step 2: Speech recognition with Whisper...")
-        transcription_result = processor.transcribe_audio(audio_file_path, language='ru')
-
-        # 4. Диаризация
-        logger.info(f"Step 3: Speaker diarization with pyannote...")
-        diarization_result = processor.diarize_audio(audio_file_path)
+        # Whisper и pyannote читают локальный файл: из S3 запись скачивается во временный
+        with get_storage().local_copy(audio_file) as audio_file_path:
+            # 3. Определяем язык по первой речи (кешируется на сессии)
+            progress.publish('detecting_language', 8)
+            language = resolve_session_language(session, lambda: processor.detect_language(audio_file_path))
+
+            # 4. Распознавание речи
+            logger.info(f"Step 2: Speech recognition with Whisper...")
+            progress.publish('transcribing', 10, language=language)
+            transcription_result = processor.transcribe_audio(
+                audio_file_path,
+                language=language,
+                progress_callback=on_asr_progress
+            )
+            save_transcription(session_id, transcription_result)
+
+            # 5. Диаризация
+            logger.info(f"Step 3: Speaker diarization with pyannote...")
+            progress.publish('diarizing', 60)
+            diarization_result, speaker_embeddings = processor.diarize_audio(
+                audio_file_path,
+                return_embeddings=True,
+                cache_session_id=session_id,  # для recluster_session_task
+                **session.speaker_hints
+            )
 
-        # 5. Объединяем результаты
+        # 6. Объединяем результаты
         logger.info(f"Step 4: Merging transcription and diarization...")
+        progress.publish('merging', 85)
         utterances = processor.merge_transcription_and_diarization(
             transcription_result,
             diarization_result
         )
 
-        # 6. Сохраняем в БД
+        # 7. Сохраняем в БД
         logger.info(f"Step 5: Saving results to database...")
-        save_transcription_results(session, transcription_result, utterances)
+        progress.publish('saving', 90)
+        transcript = save_transcription_results(session, transcription_result, utterances)
+
+        # Связываем спикеров записи с известными по другим сессиям
+        try:
+            assign_global_speakers(transcript, speaker_embeddings, speech_durations(diarization_result))
+        except Exception as e:
+            logger.warning(f"Could not assign global speakers for session {session_id}: {e}", exc_info=True)
 
-        # 7. Финализация
+        # 8. Финализация
         session.status = 'completed'
         session.processing_completed_at = timezone.now()
-        session.save()
+        session.save(update_fields=['status', 'processing_completed_at'])
 
+        progress.publish('completed', 100, status='completed')
+        record_rtf(session.total_duration, time.monotonic() - task_started_at)
         logger.info(f"Audio processing completed for session: {session_id}")
 
+        # 9. Архивация WAV в FLAC/Opus (отдельной задачей, после ML-этапов)
+        if settings.AUDIO_ARCHIVE_FORMAT:
+            from app.recordings.tasks.archive import archive_recording_task
+            archive_recording_task.delay(session_id)
+
         return {
             'session_id': session_id,
             'status': 'completed',
@@ -93,27 +158,54 @@ def process_audio_task(self, session_id):
     except Exception as e:
         logger.error(f"Error processing audio: {str(e)}", exc_info=True)
 
+        # Повтор с теми же лимитами не поможет: переносим в очередь длинных задач
+        time_exceeded = isinstance(e, (TranscriptionAborted, SoftTimeLimitExceeded))
+        routing_key = (self.request.delivery_info or {}).get('routing_key')
+        if time_exceeded and routing_key != settings.PROCESSING_LONG_QUEUE:
+            logger.warning(f"Session {session_id} exceeded its time budget, escalating to long queue")
+            progress.publish('queued', 0, queue=settings.PROCESSING_LONG_QUEUE)
+            dispatch_processing(session_id, force_long=True)
+            return {'session_id': session_id, 'status': 'escalated', 'error': str(e)}
+
         # Сохраняем ошибку
         try:
             session = Session.objects.get(id=session_id)
             session.status = 'failed'
             session.processing_error = str(e)
             session.processing_completed_at = timezone.now()
-            session.save()
+            session.save(update_fields=['status', 'processing_error', 'processing_completed_at'])
+            progress.publish('failed', 0, status='failed', error=str(e), retries=self.request.retries)
         except:
             pass
 
+        if time_exceeded:
+            return {'session_id': session_id, 'status': 'failed', 'error': str(e)}
+
         # Повторяем попытку если возможно
         raise self.retry(exc=e, countdown=60)
 
 
+def check_transcription_budget(info, remaining_seconds):
+    # После нескольких окон RTF уже стабилен: если прогноз не влезает в
+    # оставшееся время, прерываем сразу, а не ждем убийства по time limit
+    if info['window'] < settings.WHISPER_PROGRESS_MIN_WINDOWS or not info['rtf']:
+        return
+
+    projected = info['rtf'] * (info['total_seconds'] - info['audio_seconds'])
+    if projected > remaining_seconds:
+        raise TranscriptionAborted(
+            f"Transcription would not finish in time: {projected:.0f}s projected "
+            f"(RTF {info['rtf']}), {remaining_seconds:.0f}s left"
+        )
+
+
 def concatenate_audio_chunks(session):
     try:
-        chunks_dir = os.path.join(settings.MEDIA_ROOT, "chunks", str(session.id))
+        storage = get_storage()
 
-        if not os.path.exists(chunks_dir):
-            logger.warning(f"Chunks directory not found: {chunks_dir}")
-            return None
+        # Дописываем чанки из последнего несброшенного окна консьюмера
+        if recover_unflushed_chunks(session):
+            session.refresh_from_db(fields=['total_chunks', 'total_duration'])
 
         # Получаем все чанки из БД отсортированные по номеру
         chunks = AudioChunk.objects.filter(session=session).order_by('chunk_number')
@@ -122,92 +214,100 @@ def concatenate_audio_chunks(session):
             logger.warning(f"No chunks found for session")
             return None
 
-        chunk_files = [chunk.file_path for chunk in chunks]
+        parts, wav_info = wav_chunk_parts(storage, chunks)
+        data_size = sum(length for _, _, length in parts)
 
-        # Создаем директорию для итоговых файлов
-        recordings_dir = os.path.join(settings.MEDIA_ROOT, "recordings")
-        os.makedirs(recordings_dir, exist_ok=True)
-
-        # Имя итогового файла
-        timestamp = session.started_at.strftime("%Y%m%d_%H%M%S")
-        final_filename = f"recording_{timestamp}_{str(session.id)[:8]}.wav"
-        final_filepath = os.path.join(recordings_dir, final_filename)
-
-        if len(chunk_files) == 1:
-            # Один чанк - просто копируем
-            shutil.copy2(chunk_files[0], final_filepath)
-            logger.info(f"Single chunk copied to: {final_filepath}")
-        else:
-            # Несколько чанков - склеиваем
-            concatenate_wav_files(chunk_files, final_filepath)
-            logger.info(f"{len(chunk_files)} chunks concatenated to: {final_filepath}")
+        # PCM копируется диапазонами без буферизации в памяти (в S3 — серверным копированием)
+        final_name = storage.compose(recording_key(recording_filename(session)), parts, build_wav_header(wav_info, data_size))
+        logger.info(f"{len(parts)} chunks concatenated to: {final_name}")
 
         # Удаляем временные чанки
-        shutil.rmtree(chunks_dir)
-        logger.info(f"Temporary chunks directory deleted")
+        storage.delete_prefix(session_chunks_prefix(session.id))
+        logger.info(f"Temporary chunks deleted")
 
-        return final_filepath
+        return final_name
 
     except Exception as e:
         logger.error(f"Error concatenating chunks: {e}", exc_info=True)
         raise
 
 
-def concatenate_wav_files(input_files, output_file):
-
-    with open(input_files[0], 'rb') as f:
-        header = bytearray(f.read(44))
-
-    # Собираем все PCM данные
-    pcm_data = bytearray()
-    for wav_file in input_files:
-        with open(wav_file, 'rb') as f:
-            f.read(44)  # Пропускаем заголовок
-            pcm_data.extend(f.read())
-
-    # Обновляем размеры в заголовке
-    total_size = 36 + len(pcm_data)
-    struct.pack_into('<I', header, 4, total_size)
-    struct.pack_into('<I', header, 40, len(pcm_data))
-
-    # Записываем итоговый файл
-    with open(output_file, 'wb') as f:
-        f.write(header)
-        f.write(pcm_data)
-
-    logger.debug(f"WAV file created: {len(pcm_data)} bytes PCM data")
+def wav_chunk_parts(storage, chunks):
+    # Заголовок читаем только у первого чанка: чанки записи пишет один кодировщик
+    # (расширение — канонические 44 байта), так что формат и длина заголовка у
+    # всех одинаковые, а чтение каждого заголовка в S3 — GET на секунду записи.
+    # Для каждого чанка — диапазон его PCM-данных (пакетная загрузка хранит
+    # несколько чанков в одном файле со смещениями)
+    wav_info = None
+    parts = []
+
+    for chunk in chunks:
+        if wav_info is None:
+            header = storage.read(chunk.file_path, chunk.file_offset, min(WAV_HEADER_READ_SIZE, chunk.chunk_size))
+            wav_info = parse_wav_header(header, chunk.chunk_size)
+        data_size = max(0, chunk.chunk_size - wav_info.data_offset)
+        parts.append((chunk.file_path, chunk.file_offset + wav_info.data_offset, data_size))
+
+    return parts, wav_info
+
+
+def transcript_stats(utterances):
+    return {
+        'full_text': " ".join([u['text'] for u in utterances]),
+        'total_speakers': len(set(u['speaker'] for u in utterances)),
+        'total_utterances': len(utterances),
+        'confidence_avg': sum(u.get('confidence', 0) for u in utterances) / len(utterances) if utterances else 0,
+    }
+
+
+def create_utterances(transcript, utterances):
+    # Создаем реплики одним запросом
+    Utterance.objects.bulk_create([
+        Utterance(
+            transcript=transcript,
+            speaker=utterance_data['speaker'],
+            text=utterance_data['text'],
+            start_time=utterance_data['start'],
+            end_time=utterance_data['end'],
+            confidence=utterance_data.get('confidence', 0.0),
+            sequence_number=idx
+        )
+        for idx, utterance_data in enumerate(utterances)
+    ], batch_size=1000)
 
 
 def save_transcription_results(session, transcription_result, utterances):
     try:
-        # Создаем транскрипт
-        full_text = " ".join([u['text'] for u in utterances])
-
-        transcript = Transcript.objects.create(
-            session=session,
-            full_text=full_text,
+        fields = dict(
             language=transcription_result.get('language', 'ru'),
-            total_speakers=len(set(u['speaker'] for u in utterances)),
-            total_utterances=len(utterances),
-            confidence_avg=sum(u.get('confidence', 0) for u in utterances) / len(utterances) if utterances else 0,
             whisper_model='medium',
-            diarization_model='pyannote/speaker-diarization-3.1'
+            diarization_model='pyannote/speaker-diarization-3.1',
+            **transcript_stats(utterances)
         )
 
-        # Создаем реплики
-        for idx, utterance_data in enumerate(utterances):
-            Utterance.objects.create(
-                transcript=transcript,
-                speaker=utterance_data['speaker'],
-                text=utterance_data['text'],
-                start_time=utterance_data['start'],
-                end_time=utterance_data['end'],
-                confidence=utterance_data.get('confidence', 0.0),
-                sequence_number=idx
-            )
+        with transaction.atomic():
+            transcript = Transcript.objects.filter(session=session).first()
+
+            if transcript is None:
+                # Создаем транскрипт
+                transcript = Transcript.objects.create(session=session, **fields)
+            else:
+                # Повторный запуск после сохранения (например, лимит сработал на спикерах):
+                # заменяем реплики прошлой попытки; version инвалидирует кеш экспортов
+                clear_transcript_index(transcript)
+                Utterance.objects.filter(transcript=transcript).delete()
+                Transcript.objects.filter(pk=transcript.pk).update(version=F('version') + 1, **fields)
+                transcript.refresh_from_db()
+
+            create_utterances(transcript, utterances)
+
+            # Полнотекстовый индекс (tsvector/FTS5) для /search
+            index_transcript(transcript)
 
         logger.info(f"Saved {len(utterances)} utterances to database")
 
+        return transcript
+
     except Exception as e:
         logger.error(f"Error saving transcription results: {e}", exc_info=True)
-        raise
\ No newline at end of file
+        raise
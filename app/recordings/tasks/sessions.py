@@ -0,0 +1,18 @@
+import logging
+
+from celery import shared_task
+
+from app.recordings.services.sessions import finish_recording
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=False)
+def finalize_interrupted_session_task(session_id, generation):
+    # Grace-период истек: клиент не переподключился, обрабатываем то, что успели получить
+    if not finish_recording(session_id, generation, statuses=('interrupted',)):
+        logger.info(f"Session {session_id} was resumed or finished, skipping finalize")
+        return {'session_id': session_id, 'status': 'skipped'}
+
+    logger.info(f"Session {session_id} not resumed within grace period, queued for processing")
+    return {'session_id': session_id, 'status': 'queued'}
@@ -10,6 +10,20 @@ let recordingBuffers = [];
 let websocket = null;
 let recordingMetadata = null;
 
+// Resume after network drops: the server keeps the session for a grace period
+let resumeToken = null;
+let lastAckedChunk = 0;
+let unackedChunks = new Map(); // chunkNumber -> JSON message
+let stopping = false;
+let reconnectAttempts = 0;
+let reconnectTimer = null;
+let stopResolver = null;
+
+const MAX_UNACKED_CHUNKS = 300; // ~5 min of 1s chunks kept for resending
+const MAX_RECONNECT_DELAY = 10000;
+// Close codes meaning the session can't be resumed - start a new one
+const RESUME_REJECTED_CODES = [4403, 4404, 4409];
+
 chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
   if (message.type === 'start-recording') {
     recordingMetadata = message.metadata || null;
@@ -34,6 +48,7 @@ async function startRecording(streamId, sid) {
     console.log('[Offscreen] Starting WAV recording with stream ID:', streamId);
     chunkCounter = 0;
     recordingBuffers = [];
+    stopping = false;
 
     await connectWebSocket();
 
@@ -86,14 +101,28 @@ async function startRecording(streamId, sid) {
   }
 }
 
+function buildWebSocketUrl() {
+  if (!sessionId || !resumeToken) {
+    return WS_URL;
+  }
+  const params = new URLSearchParams({
+    session_id: sessionId,
+    token: resumeToken,
+    last_chunk: String(lastAckedChunk)
+  });
+  return `${WS_URL}?${params}`;
+}
+
 async function connectWebSocket() {
   return new Promise((resolve, reject) => {
-    console.log('[Offscreen] Connecting to WebSocket:', WS_URL);
+    const url = buildWebSocketUrl();
+    console.log('[Offscreen] Connecting to WebSocket:', url);
 
-    websocket = new WebSocket(WS_URL);
+    websocket = new WebSocket(url);
 
     websocket.onopen = () => {
       console.log('[Offscreen] ✅ WebSocket connected');
+      reconnectAttempts = 0;
       resolve();
     };
 
@@ -104,8 +133,13 @@ async function connectWebSocket() {
 
         if (data.type === 'session_started') {
           sessionId = data.session_id;
+          resumeToken = data.resume_token || null;
+          lastAckedChunk = 0;
           console.log('[Offscreen] Session ID:', sessionId);
 
+          // Chunks recorded while reconnecting go to the new session
+          resendUnackedChunks(0);
+
           // Send metadata to server after session is started
           if (recordingMetadata) {
             console.log('[Offscreen] 📤 Sending metadata to server:', recordingMetadata);
@@ -116,8 +150,16 @@ async function connectWebSocket() {
           } else {
             console.warn('[Offscreen] ⚠️ No metadata to send');
           }
+        } else if (data.type === 'session_resumed') {
+          console.log(`[Offscreen] 🔁 Session ${data.session_id} resumed, server has chunks up to ${data.last_chunk}`);
+          resendUnackedChunks(data.last_chunk);
         } else if (data.type === 'chunk_received') {
           console.log(`[Offscreen] ✅ Chunk ${data.chunk_number} confirmed by server`);
+          unackedChunks.delete(data.chunk_number);
+          lastAckedChunk = Math.max(lastAckedChunk, data.chunk_number);
+        } else if (data.type === 'session_stopped') {
+          console.log('[Offscreen] Session stopped, processing:', data.status);
+          if (stopResolver) stopResolver();
         } else if (data.type === 'error') {
           console.error('[Offscreen] Server error:', data.message);
         }
@@ -133,6 +175,23 @@ async function connectWebSocket() {
 
     websocket.onclose = (event) => {
       console.log('[Offscreen] WebSocket closed:', event.code, event.reason);
+
+      if (stopResolver) {
+        stopResolver();
+        return;
+      }
+
+      if (RESUME_REJECTED_CODES.includes(event.code)) {
+        console.warn('[Offscreen] Session cannot be resumed, starting a new one');
+        sessionId = null;
+        resumeToken = null;
+        lastAckedChunk = 0;
+      }
+
+      // Still recording: the drop was not requested, reconnect and resume
+      if (audioStream && !stopping && event.code !== 1000) {
+        scheduleReconnect();
+      }
     };
 
     // Таймаут на подключение
@@ -144,12 +203,37 @@ async function connectWebSocket() {
   });
 }
 
+function scheduleReconnect() {
+  if (reconnectTimer) return;
+
+  const delay = Math.min(1000 * 2 ** reconnectAttempts, MAX_RECONNECT_DELAY);
+  reconnectAttempts++;
+  console.log(`[Offscreen] Reconnecting in ${delay} ms (attempt ${reconnectAttempts})`);
+
+  reconnectTimer = setTimeout(async () => {
+    reconnectTimer = null;
+    if (!audioStream || stopping) return;
+    try {
+      await connectWebSocket();
+    } catch (error) {
+      console.warn('[Offscreen] Reconnect failed:', error);
+      scheduleReconnect();
+    }
+  }, delay);
+}
+
+function resendUnackedChunks(serverLastChunk) {
+  for (const [chunkNumber, message] of unackedChunks) {
+    if (chunkNumber <= serverLastChunk) {
+      unackedChunks.delete(chunkNumber);
+    } else if (websocket && websocket.readyState === WebSocket.OPEN) {
+      websocket.send(message);
+    }
+  }
+}
+
 async function sendBuffersAsChunk() {
   if (recordingBuffers.length === 0) return;
-  if (!websocket || websocket.readyState !== WebSocket.OPEN) {
-    console.warn('[Offscreen] WebSocket not ready, skipping chunk');
-    return;
-  }
 
   chunkCounter++;
   console.log(`[Offscreen] Creating WAV chunk #${chunkCounter}...`);
@@ -234,13 +318,23 @@ async function sendChunkViaWebSocket(chunkData, chunkNumber) {
   // Можно также отправлять напрямую бинарные данные через websocket.send(arrayBuffer)
   const base64Data = arrayBufferToBase64(arrayBuffer);
 
-  const message = {
+  const message = JSON.stringify({
     type: 'audio_chunk',
     chunk_number: chunkNumber,
     audio_data: base64Data
-  };
+  });
 
-  websocket.send(JSON.stringify(message));
+  // Kept until acked so it can be resent after a reconnect
+  unackedChunks.set(chunkNumber, message);
+  if (unackedChunks.size > MAX_UNACKED_CHUNKS) {
+    unackedChunks.delete(unackedChunks.keys().next().value);
+  }
+
+  if (websocket && websocket.readyState === WebSocket.OPEN) {
+    websocket.send(message);
+  } else {
+    console.warn(`[Offscreen] WebSocket not ready, chunk #${chunkNumber} queued for resend`);
+  }
 
   // Notify background script about new chunk
   try {
@@ -274,10 +368,16 @@ async function stopRecording() {
     }
 
     console.log(`[Offscreen] Recording stopped, total chunks sent: ${chunkCounter}`);
+    stopping = true;
 
-    // Close WebSocket gracefully
+    // Explicit stop starts processing; the server closes the socket after session_stopped
     if (websocket && websocket.readyState === WebSocket.OPEN) {
-      websocket.close(1000, 'Recording completed');
+      await new Promise(resolve => {
+        stopResolver = resolve;
+        websocket.send(JSON.stringify({ type: 'stop' }));
+        setTimeout(resolve, 5000);
+      });
+      stopResolver = null;
       console.log('[Offscreen] WebSocket closed');
     }
 
@@ -290,6 +390,11 @@ async function stopRecording() {
 }
 
 function cleanup() {
+  if (reconnectTimer) {
+    clearTimeout(reconnectTimer);
+    reconnectTimer = null;
+  }
+
   if (scriptProcessor) {
     scriptProcessor.disconnect();
     scriptProcessor = null;
@@ -313,6 +418,11 @@ function cleanup() {
   }
 
   sessionId = null;
+  resumeToken = null;
+  lastAckedChunk = 0;
+  unackedChunks = new Map();
+  reconnectAttempts = 0;
+  stopping = false;
   chunkCounter = 0;
   recordingBuffers = [];
 }
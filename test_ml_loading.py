@@ -33,6 +33,10 @@ print(f"   Whisper Device: {processor.whisper_device}")
 print(f"   Torch Device: {processor.torch_device}")
 print(f"   Whisper: {'✅ Loaded' if processor.whisper_model else '❌ Not loaded'}")
 print(f"   Diarization: {'✅ Loaded' if processor.diarization_pipeline else '❌ Not loaded'}")
+registry = processor.model_registry
+print(f"   Model registry: {registry.path + ' (offline)' if registry else '❌ Not used (HuggingFace Hub)'}")
+for name, seconds in processor.load_times.items():
+    print(f"   ⏱️  {name}: {seconds:.2f}s")
 if processor.diarization_pipeline:
     print(f"   🎉 Diarization is working! No segmentation fault!")
 else: